@@ -1,29 +1,327 @@
 # db middleware
-from db2fs.connectors.rdb import RDBMiddleware
+from db2fs.connectors.rdb import RDBMiddleware, SQLFunctions, LOAD_FILE_TYPES, get_file_type
 # gcp middleware
 from db2fs.connectors.gcp import GCPStorageMiddleware
 # common io functions
 from db2fs.shared import IOFunctions
+# file writers
+from db2fs.writers import (
+    CSVBatchWriter,
+    ArrowBatchConverter,
+    ParquetBatchWriter,
+    FeatherBatchWriter,
+    NDJSONBatchWriter
+)
+# postgres binary COPY decoding
+from db2fs.pgbinary import BinaryCopyDecoder, is_binary_supported
+# compressed output
+from db2fs.compression import open_compressed, wrap_compressed, COMPRESSION_EXTENSIONS
+# extraction state
+from db2fs.state import StateStore, to_state_value
+# rolling output
+from db2fs.rolling import RollingFileWriter
+# partitioned output
+from db2fs.partitioned import PartitionedDatasetWriter
+# pipelined uploads
+from db2fs.pipeline import UploadPipeline
+# worker process helpers
+from db2fs.workers import init_worker, run_indexed_task
 # multi processing / batch processing
 import multiprocessing as mp
+import threading
 # path
 from pathlib import Path
 # pandas
 import pandas as pd
+# mysql dbapi (error types)
+import pymysql
+# json
+import json
+# partial writer classes
+import functools
+# pooled connection checkouts
+from contextlib import contextmanager
 # io
+import io
 import os
+import sys
+import shutil
+# cursor names
+import uuid
+# part file names
+import re
+# sampling
+import random
+# stats
+import time
+# peak memory (not available on windows)
+try:
+    import resource
+except ImportError:
+    resource = None
+# logging
+import logging
+# config logger
+logger = logging.getLogger(__name__)
 
-class DatabaseExtractor(IOFunctions, RDBMiddleware, GCPStorageMiddleware):
+# upper bound of adaptive fetch sizes
+MAX_FETCH_SIZE = 1000000
+# seconds workers get to start their snapshot transactions
+SNAPSHOT_TIMEOUT = 300
+# files db2fs keeps next to extracted files (part indexes, checkpoints,
+# extraction state & unfinished files). they are never loaded as tables
+BOOKKEEPING_SUFFIXES = (".index.json", ".checkpoint.json", ".db2fs_state.json", ".tmp")
+# rows read by the first fetch when sizing fetches from a memory
+# budget (the measured width of these rows sizes the next fetches)
+PROBE_FETCH_SIZE = 1000
+
+
+class ExtractorFunctions(IOFunctions, SQLFunctions):
+    """
+        connection free parts of an extractor (download paths, run
+        stats & select statements) shared by DatabaseExtractor &
+        AsyncDatabaseExtractor. needs connection_info,
+        download_dir_name, download_dir_path & stats attributes
+    """
+    def get_peak_memory(self):
+        """
+            get memory high-water mark (peak rss) of the current
+            process in bytes (None if not supported by the os)
+        """
+        # resource module missing
+        if resource is None:
+            return None
+        # peak rss (kilobytes on linux, bytes on mac)
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # return bytes
+        return peak_rss if sys.platform == "darwin" else peak_rss * 1024
+
+    def record_stats(self, local_file_path, start_memory=None, **stats):
+        """
+            record run stats for a written file. peak_memory_bytes is
+            the high-water mark of the whole process (it includes
+            earlier, larger files), peak_memory_increase_bytes is how
+            much the file raised it (0 if it stayed below an earlier
+            peak)
+
+            params:
+                - local_file_path: file the stats belong to
+                - start_memory: get_peak_memory() before the file
+                - stats: stats to record e.g. rows, seconds
+        """
+        # add memory high-water mark of the process
+        stats["peak_memory_bytes"] = self.get_peak_memory()
+        # & how much this file raised it
+        if start_memory is not None and stats["peak_memory_bytes"] is not None:
+            stats["peak_memory_increase_bytes"] = stats["peak_memory_bytes"] - start_memory
+        # save stats
+        self.stats[local_file_path] = stats
+        # log
+        logger.info("wrote: %s stats: %s" % (local_file_path, stats))
+
+    def get_download_dir(self):
+        """
+            get (& create if needed) directory tables are downloaded to
+        """
+        # create download dir
+        if self.download_dir_path is None:
+            # use current file's dir as download dir
+            download_dir = os.path.dirname(os.path.realpath(__file__))
+            # create dir using download dir name
+            self.download_dir_path = self.create_dir(os.path.join(download_dir, self.download_dir_name))
+        # return download dir
+        return self.download_dir_path
+
+    def get_local_file_path(self, table_name, file_name=None, extension=".csv"):
+        """
+            build path a table is downloaded to
+
+            params:
+                - table_name: name of table being downloaded
+                - file_name: local file name (defaults to table name)
+                - extension: file extension
+        """
+        # use table name if file name not specified
+        if file_name is None:
+            file_name = table_name
+        # add file name to download dir
+        return os.path.join(self.get_download_dir(), file_name + extension)
+
+    def build_select(self, table_name, where=None, columns=None, order_by=None, table_sample=None, limit=None):
+        """
+            build select statement for a table. the statement is
+            always run with a (possibly empty) params tuple so
+            literal % signs are escaped as %%
+
+            params:
+                - table_name: name of table
+                - where: list of sql conditions joined with AND
+                - columns: list of columns to select (default all)
+                - order_by: list of (column, "ASC" / "DESC")
+                - table_sample: TABLESAMPLE clause (postgres)
+                - limit: max number of rows
+        """
+        # selected columns
+        if columns:
+            select_list = ", ".join(self.quote_param_identifier(column) for column in columns)
+        else:
+            select_list = "*"
+        # get rows in table
+        select_query = "SELECT %s FROM %s" % (
+            select_list,
+            self.quote_param_identifier(table_name)
+        )
+        # sample table pages / rows
+        if table_sample:
+            select_query += " " + table_sample
+        # add filters
+        if where:
+            select_query += " WHERE " + " AND ".join("(%s)" % condition for condition in where)
+        # add sort order
+        if order_by:
+            select_query += " ORDER BY " + ", ".join(
+                "%s %s" % (self.quote_param_identifier(column), direction)
+                for column, direction in order_by
+            )
+        # limit number of rows
+        if limit is not None:
+            select_query += " LIMIT %d" % limit
+        # return select statement
+        return select_query
+
+    def check_columns(self, table_name, columns, table_columns=None):
+        """
+            make sure columns exist in a table (raises ValueError)
+
+            params:
+                - table_name: name of table
+                - columns: list of column names
+                - table_columns: columns of table (read from the
+                                 catalog if not given)
+        """
+        # nothing to check
+        if not columns:
+            return
+        # get columns from catalog
+        if table_columns is None:
+            table_columns = self.get_columns(table_name)
+        # table doesn't exist
+        if not table_columns:
+            raise ValueError("table: %s not found" % table_name)
+        # unknown columns
+        unknown_columns = [column for column in columns if column not in table_columns]
+        if unknown_columns:
+            raise ValueError(
+                "table: %s has no column(s): %s (columns: %s)" % (
+                    table_name,
+                    unknown_columns,
+                    table_columns
+                )
+            )
+
+    def parse_filters(self, columns=None, where=None, order_by=None):
+        """
+            convert a column projection / filters / sort order into
+            build_select arguments (without checking the catalog)
+
+            params:
+                - columns: list of columns to select
+                - where: condition or list of conditions joined with AND.
+                         a condition is either raw sql e.g. "price > 10"
+                         or a tuple (column, operator, value) e.g.
+                         ("id", ">", 100), ("tag", "IN", ["a", "b"]) or
+                         ("deleted_at", "IS NULL") (values are bound)
+                - order_by: column or list of columns / (column, "DESC")
+            returns:
+                - (columns, where, params, order_by, referenced columns)
+        """
+        # single condition / sort column
+        if isinstance(where, (str, tuple)):
+            where = [where]
+        if isinstance(order_by, (str, tuple)):
+            order_by = [order_by]
+        # build conditions & collect column names to validate
+        conditions, params, used_columns = [], [], list(columns or [])
+        for condition in (where or []):
+            # raw sql (escape % so bind params can be used)
+            if isinstance(condition, str):
+                conditions.append(condition.replace("%", "%%"))
+                continue
+            # (column, operator[, value])
+            column, operator, *value = condition
+            operator = operator.strip().upper()
+            column = self.quote_param_identifier(column)
+            used_columns.append(condition[0])
+            if operator in ("IS NULL", "IS NOT NULL") and not value:
+                conditions.append("%s %s" % (column, operator))
+            elif operator in ("IN", "NOT IN") and len(value) == 1:
+                # one placeholder per value
+                conditions.append("%s %s (%s)" % (column, operator, ", ".join(["%s"] * len(value[0]))))
+                params.extend(value[0])
+            elif operator in ("=", "!=", "<>", "<", "<=", ">", ">=", "LIKE", "NOT LIKE") and len(value) == 1:
+                conditions.append("%s %s %%s" % (column, operator))
+                params.append(value[0])
+            else:
+                raise ValueError("invalid condition: %s" % (condition,))
+        # sort order
+        sort_order = []
+        for sort_column in (order_by or []):
+            # default direction
+            if isinstance(sort_column, str):
+                sort_column = (sort_column, "ASC")
+            column, direction = sort_column
+            direction = direction.strip().upper()
+            if direction not in ("ASC", "DESC"):
+                raise ValueError("invalid sort direction: %s" % direction)
+            used_columns.append(column)
+            sort_order.append((column, direction))
+        # return build_select arguments & columns to validate
+        return list(columns) if columns else None, conditions, tuple(params), sort_order, used_columns
+
+    def build_binary_select(self, select_query, query_description):
+        """
+            wrap a select statement so its result can be decoded from
+            a binary COPY. types that can't be decoded are cast to text
+
+            params:
+                - select_query: select statement
+                - query_description: cursor description of select_query
+            returns:
+                - (description of copied columns, select statement to copy)
+        """
+        # columns to copy (exotic types as text)
+        description, select_list = [], []
+        for column in query_description:
+            # column reference
+            column_ref = "db2fs_query." + self.quote_identifier(column[0])
+            if is_binary_supported(column[1]):
+                description.append(column)
+                select_list.append(column_ref)
+            else:
+                # copied as text
+                description.append((column[0], 25, None, None, None, None, None))
+                select_list.append(column_ref + "::text")
+        # select decodable columns
+        copy_select = "SELECT {0} FROM ({1}) AS db2fs_query".format(
+            ", ".join(select_list),
+            select_query
+        )
+        return description, copy_select
+
+
+class DatabaseExtractor(ExtractorFunctions, RDBMiddleware, GCPStorageMiddleware):
     """
         database extractor class to download tables
         in a database into csv files. currently supports
         mysql & postgres
     """
-    def __init__(self, connection_info, auth_file_path=None, download_dir_name="downloaded", download_dir_path=None):
-        # init db middleware
+    def __init__(self, connection_info, auth_file_path=None, download_dir_name="downloaded", download_dir_path=None, workers=None, fetch_size=10000, state_file_path=None, max_batch_bytes=None, pool_options=None):
+        # init db middleware (connections come from a pool shared
+        # by all extractors of the process, see RDBConnector.checkout)
         RDBMiddleware.__init__(
             self,
-            connection_info=connection_info
+            connection_info=connection_info,
+            pool_options=pool_options
         )
         # init gcp middleware if auth file specified
         if auth_file_path is not None:
@@ -32,86 +330,1471 @@ class DatabaseExtractor(IOFunctions, RDBMiddleware, GCPStorageMiddleware):
         # specify download dir info
         self.download_dir_name = download_dir_name
         self.download_dir_path = download_dir_path
-    
-    def table2csv(self, table_name, file_name=None):
+        # number of worker processes used by db2csv / db2other
+        # (defaults to number of cpus)
+        self.workers = workers
+        # rows fetched per round trip when streaming rows
+        self.fetch_size = fetch_size
+        # memory budget per batch. if set the fetch size is derived
+        # from the (measured) row width instead of fetch_size
+        self.max_batch_bytes = max_batch_bytes
+        # pooled connection pinned by a snapshot transaction that
+        # must stay open across queries
+        self.conn = None
+        self.in_snapshot = False
+        # run stats per written file (rows, seconds, peak memory)
+        self.stats = {}
+        # extraction state (watermarks) file & store (loaded on first use)
+        self.state_file_path = state_file_path
+        self.state_store = None
+
+    @contextmanager
+    def read_connection(self):
+        """
+            check out a connection for a read. inside a snapshot the
+            snapshot's connection (& transaction) is used, otherwise a
+            pooled connection whose read transaction ends with the block
+        """
+        # share snapshot transaction
+        if self.in_snapshot:
+            yield self.conn
+        else:
+            with self.checkout() as conn:
+                yield conn
+
+    def start_snapshot(self, snapshot_id=None):
+        """
+            start a read only repeatable read transaction on the
+            persistent connection. every query until end_snapshot
+            sees the same snapshot of the db
+
+            params:
+                - snapshot_id: snapshot exported by another postgres
+                               transaction (pg_export_snapshot) to share
+        """
+        # pin a pooled connection until end_snapshot
+        conn = self.get_pool().acquire()
+        try:
+            if self.connection_info["engine"] == "pg":
+                # next statement starts the transaction with:
+                # BEGIN ISOLATION LEVEL REPEATABLE READ READ ONLY DEFERRABLE
+                conn.set_session(isolation_level="REPEATABLE READ", readonly=True, deferrable=True)
+                cursor = conn.cursor()
+                if snapshot_id is not None:
+                    # use snapshot of exporting transaction
+                    cursor.execute("SET TRANSACTION SNAPSHOT %s", (snapshot_id,))
+                else:
+                    # take snapshot now
+                    cursor.execute("SELECT 1")
+                cursor.close()
+            elif self.connection_info["engine"] == "mysql":
+                # take (innodb) snapshot now
+                cursor = conn.cursor()
+                cursor.execute("START TRANSACTION WITH CONSISTENT SNAPSHOT, READ ONLY")
+                cursor.close()
+        except BaseException:
+            # don't return a connection in an unknown session state
+            self.get_pool().release(conn, discard=True)
+            raise
+        # keep transaction open across queries
+        self.conn = conn
+        self.in_snapshot = True
+
+    def end_snapshot(self):
+        """
+            end the snapshot transaction of the persistent connection
+        """
+        # nothing to end
+        if not self.in_snapshot:
+            return
+        self.in_snapshot = False
+        # unpin connection
+        conn, self.conn = self.conn, None
+        try:
+            # end transaction
+            conn.commit()
+            # back to default transactions
+            if self.connection_info["engine"] == "pg":
+                conn.set_session(isolation_level="DEFAULT", readonly="DEFAULT", deferrable="DEFAULT")
+        except BaseException:
+            self.get_pool().release(conn, discard=True)
+            raise
+        # hand connection back
+        self.get_pool().release(conn)
+
+    def export_snapshot(self):
+        """
+            freeze a snapshot other connections can start transactions
+            on. postgres exports the snapshot of a repeatable read
+            transaction (pg_export_snapshot). mysql blocks writes with
+            a global read lock so the snapshots workers take while it
+            is held are all the same (needs the RELOAD privilege)
+
+            returns:
+                - (connection holding the snapshot / lock, snapshot id
+                  for postgres or None for mysql). release the snapshot
+                  with release_snapshot once every worker started its
+                  transaction
+        """
+        # pooled connection (held while workers start)
+        conn = self.get_pool().acquire()
+        try:
+            cursor = conn.cursor()
+            if self.connection_info["engine"] == "pg":
+                # snapshot of a read only repeatable read transaction
+                conn.set_session(isolation_level="REPEATABLE READ", readonly=True)
+                cursor.execute("SELECT pg_export_snapshot()")
+                snapshot_id = cursor.fetchone()[0]
+            elif self.connection_info["engine"] == "mysql":
+                # block writes until workers took their snapshots
+                cursor.execute("FLUSH TABLES WITH READ LOCK")
+                snapshot_id = None
+            cursor.close()
+        except BaseException:
+            # closing the connection drops snapshot / lock
+            self.get_pool().release(conn, discard=True)
+            raise
+        # log
+        logger.info("exported snapshot: %s" % snapshot_id)
+        # return connection & snapshot
+        return conn, snapshot_id
+
+    def release_snapshot(self, conn):
+        """
+            release a snapshot / read lock taken by export_snapshot
+
+            params:
+                - conn: connection returned by export_snapshot
+        """
+        try:
+            # mysql: allow writes again
+            if self.connection_info["engine"] == "mysql":
+                cursor = conn.cursor()
+                cursor.execute("UNLOCK TABLES")
+                cursor.close()
+            # postgres: end exporting transaction
+            conn.commit()
+            if self.connection_info["engine"] == "pg":
+                conn.set_session(isolation_level="DEFAULT", readonly="DEFAULT")
+        except BaseException:
+            # closing the connection drops snapshot / lock
+            self.get_pool().release(conn, discard=True)
+            raise
+        # hand connection back
+        self.get_pool().release(conn)
+
+    def get_worker_kwargs(self):
+        """
+            get info needed to rebuild this extractor in a
+            worker process
+        """
+        return {
+            "connection_info": self.connection_info,
+            "download_dir_path": self.get_download_dir(),
+            "fetch_size": self.fetch_size,
+            "max_batch_bytes": self.max_batch_bytes,
+            "pool_options": self.pool_options
+        }
+
+    def build_filters(self, table_name, columns=None, where=None, order_by=None):
+        """
+            validate a column projection / filters / sort order against
+            the catalog & convert them into build_select arguments
+            (see parse_filters)
+
+            params:
+                - table_name: name of table
+                - columns: list of columns to select
+                - where: condition or list of conditions
+                - order_by: column or list of columns / (column, "DESC")
+            returns:
+                - (columns, where, params, order_by)
+        """
+        # convert filters
+        columns, conditions, params, sort_order, used_columns = self.parse_filters(columns, where, order_by)
+        # validate columns against catalog
+        self.check_columns(table_name, used_columns)
+        # return build_select arguments
+        return columns, conditions, params, sort_order
+
+    def estimate_row_width(self, table_name):
+        """
+            estimate average row size of a table (in bytes) from the
+            catalog (None if the table has no statistics yet)
+
+            params:
+                - table_name: name of table
+        """
+        # estimated (rows, bytes)
+        num_rows, num_bytes = self.get_table_sizes().get(table_name, (0, 0))
+        # never analyzed / empty
+        if num_rows <= 0 or num_bytes <= 0:
+            return None
+        # average row size
+        return max(1, num_bytes // num_rows)
+
+    def measure_row_width(self, rows):
+        """
+            measure average memory used per fetched row (tuple &
+            values) on an evenly spaced sample of rows
+
+            params:
+                - rows: list of row tuples
+        """
+        # sample at most 100 rows
+        sample = rows[::max(1, len(rows) // 100)]
+        # memory of row tuples & their values
+        sample_bytes = sum(
+            sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row)
+            for row in sample
+        )
+        # average row size
+        return max(1, sample_bytes // len(sample))
+
+    def get_fetch_size(self, row_width):
+        """
+            get number of rows per fetch keeping a batch close to
+            max_batch_bytes
+
+            params:
+                - row_width: (estimated) bytes per row
+        """
+        return max(1, min(MAX_FETCH_SIZE, self.max_batch_bytes // row_width))
+
+    def query2csv(self, select_query, local_file_path, params=None, header=True, compression=None, row_width=None, max_rows_per_file=None, max_bytes_per_file=None, on_part_complete=None, sink=None):
+        """
+            write result of a select statement to a csv file
+
+            params:
+                - select_query: select statement to run
+                - local_file_path: location on disk to write csv to
+                - params: values to format into select_query
+                - header: whether to write column names
+                - compression: None, "gzip", "bz2", "zstd" or "lz4"
+                               (compressed in a background thread)
+                - row_width: catalog estimate of the row size (sizes the
+                             first fetch when max_batch_bytes is set)
+                - max_rows_per_file: roll over to a new part file after
+                                     this many rows
+                - max_bytes_per_file: roll over to a new part file before
+                                      exceeding this many (uncompressed) bytes
+                - on_part_complete: function called with (path, rows, bytes)
+                                    of every finished part
+                - sink: function returning a writable binary stream for a
+                        file name (e.g. partial(s3.open_bucket_stream,
+                        bucket_name)). the csv is streamed there under the
+                        file name of local_file_path instead of to disk
+            returns:
+                - local_file_path or list of part files (rolling output,
+                  parts are listed in <local_file_path>.index.json). file
+                  names when streamed to a sink
+        """
+        # start time & memory high-water mark
+        start_time = time.time()
+        start_memory = self.get_peak_memory()
+        # fetch sizes used (mysql)
+        batch_stats = {}
+        # spread rows over part files
+        rolling = max_rows_per_file is not None or max_bytes_per_file is not None
+        if rolling:
+            # <name>.part-00000.csv, <name>.part-00001.csv, ...
+            output = RollingFileWriter(
+                lambda part_index: self.get_part_path(local_file_path, part_index),
+                compression=compression,
+                max_rows=max_rows_per_file,
+                max_bytes=max_bytes_per_file,
+                header=header,
+                on_part_complete=on_part_complete,
+                sink=sink
+            )
+        elif sink is not None:
+            # stream (compressed) csv
+            output = wrap_compressed(sink(os.path.basename(local_file_path)), compression)
+        else:
+            # write to a temp file & rename it once complete so a
+            # partially written csv is never visible
+            tmp_file_path = local_file_path + ".tmp"
+            # open (compressed) csv
+            output = open_compressed(tmp_file_path, compression)
+        try:
+            with output as out_file:
+                # raw sql copy differs by dialect
+                # postgres
+                if self.connection_info["engine"] == "pg":
+                    # get db connection (read ends with the block)
+                    with self.read_connection() as conn:
+                        # get cursor
+                        cursor = conn.cursor()
+                        # COPY doesn't accept bind params so inline them
+                        if params is not None:
+                            select_query = cursor.mogrify(select_query, params).decode()
+                        # define copy query (use postgres native csv functions)
+                        copy_query = "COPY ({0}) TO STDOUT WITH CSV{1}".format(
+                            select_query,
+                            " HEADER" if header else ""
+                        )
+                        # execute copy query
+                        cursor.copy_expert(copy_query, out_file)
+                        # number of rows copied
+                        num_rows = cursor.rowcount
+                        # release cursor
+                        cursor.close()
+                elif self.connection_info["engine"] == "mysql":
+                    # batch write using select statements to
+                    # avoid issues with using INTO OUTFILE
+                    csv_writer = None
+                    # text layer on top of binary output (rolling output
+                    # needs every row passed on as its own write)
+                    text_file = io.TextIOWrapper(out_file, encoding="utf-8", newline="", write_through=rolling)
+                    # stream rows from the server in batches
+                    for description, rows in self.query2batches(select_query, params, row_width, batch_stats):
+                        # write cursor rows straight to csv (same format
+                        # as postgres COPY incl. header)
+                        if csv_writer is None:
+                            csv_writer = CSVBatchWriter(
+                                text_file,
+                                columns=[column[0] for column in description] if header else None,
+                                row_writes=rolling
+                            )
+                        # Let's write to the file
+                        csv_writer.write_rows(rows)
+                    # flush text layer (output closed below)
+                    text_file.flush()
+                    text_file.detach()
+                    # number of rows written
+                    num_rows = csv_writer.num_rows
+        except BaseException:
+            # remove partial output (rolling / streamed output drops its own)
+            if not rolling and sink is None and os.path.exists(tmp_file_path):
+                os.remove(tmp_file_path)
+            raise
+        # rolling output
+        if rolling:
+            # list parts for downstream readers
+            self.write_part_index(local_file_path + ".index.json", output.parts, sink)
+            # save stats
+            self.record_stats(
+                local_file_path,
+                rows=num_rows,
+                seconds=time.time() - start_time,
+                start_memory=start_memory,
+                parts=len(output.parts),
+                **batch_stats
+            )
+            # return part paths
+            return [part["path"] for part in output.parts]
+        # streamed csv is published by closing the stream
+        if sink is not None:
+            local_file_path = os.path.basename(local_file_path)
+        else:
+            # publish csv
+            os.replace(tmp_file_path, local_file_path)
+        # save stats
+        self.record_stats(
+            local_file_path,
+            rows=num_rows,
+            seconds=time.time() - start_time,
+            start_memory=start_memory,
+            **batch_stats
+        )
+        # return path of written file
+        return local_file_path
+
+    def get_part_path(self, local_file_path, part_index):
+        """
+            build path of a part of a file by adding .part-<index>
+            before the extension e.g. big.csv.gz -> big.part-00001.csv.gz
+
+            params:
+                - local_file_path: path of the (whole) file
+                - part_index: number of part
+        """
+        # split off extension (.csv + compression extension)
+        extension_start = local_file_path.rfind(".csv")
+        if extension_start == -1:
+            extension_start = len(local_file_path)
+        # add part number
+        return "%s.part-%05d%s" % (
+            local_file_path[:extension_start],
+            part_index,
+            local_file_path[extension_start:]
+        )
+
+    def write_part_index(self, index_file_path, parts, sink=None):
+        """
+            atomically write a json index of part files
+
+            params:
+                - index_file_path: location of index
+                - parts: list of dicts (path, rows, bytes)
+                - sink: stream the index to a sink instead (see query2csv)
+        """
+        # index content (paths relative to index)
+        index = {
+            "rows": sum(part["rows"] for part in parts),
+            "parts": [
+                dict(part, path=os.path.basename(part["path"]))
+                for part in parts
+            ]
+        }
+        # stream index next to parts
+        if sink is not None:
+            with sink(os.path.basename(index_file_path)) as index_file:
+                index_file.write(json.dumps(index, indent=2).encode("utf-8"))
+            return
+        # write to temp file & swap
+        with open(index_file_path + ".tmp", "w") as index_file:
+            json.dump(index, index_file, indent=2)
+        os.replace(index_file_path + ".tmp", index_file_path)
+
+    def query2batches(self, select_query, params=None, row_width=None, batch_stats=None):
+        """
+            stream result of a select statement in batches of
+            fetch_size rows using a server side (postgres) /
+            unbuffered (mysql) cursor so memory use only depends
+            on the batch size.
+
+            if max_batch_bytes is set the first fetch is sized from
+            the catalog row width (at most PROBE_FETCH_SIZE rows) &
+            every following fetch from the measured width of the
+            previous batch, so narrow tables get large fetches &
+            wide (text / json) tables small ones
+
+            params:
+                - select_query: select statement to run
+                - params: values to format into select_query
+                - row_width: catalog estimate of the row size
+                - batch_stats: dict receiving the fetch sizes used
+            yields:
+                - (cursor description, list of rows). the first batch
+                  is always yielded (even if empty) so callers get the
+                  description of empty results
+        """
+        # rows per fetch
+        fetch_size = self.fetch_size
+        if self.max_batch_bytes is not None:
+            # small probe unless the catalog says rows are wide
+            if row_width is None:
+                fetch_size = PROBE_FETCH_SIZE
+            else:
+                fetch_size = min(PROBE_FETCH_SIZE, self.get_fetch_size(row_width))
+        # fetch sizes chosen
+        fetch_sizes = [fetch_size]
+        try:
+            # get db connection (read ends once the rows are read)
+            with self.read_connection() as conn:
+                # postgres
+                if self.connection_info["engine"] == "pg":
+                    # named cursor = server side cursor
+                    cursor = conn.cursor(name="db2fs_%s" % uuid.uuid4().hex)
+                # mysql
+                elif self.connection_info["engine"] == "mysql":
+                    # unbuffered cursor streams rows from the server
+                    # instead of loading the whole result in memory
+                    cursor = conn.cursor(pymysql.cursors.SSCursor)
+                try:
+                    # execute select query
+                    cursor.execute(select_query, params)
+                    # read first batch
+                    rows = cursor.fetchmany(fetch_size)
+                    yield cursor.description, rows
+                    # read remaining batches
+                    while rows:
+                        # resize fetches to stay near the memory budget
+                        if self.max_batch_bytes is not None:
+                            new_fetch_size = self.get_fetch_size(self.measure_row_width(rows))
+                            # ignore small changes
+                            if abs(new_fetch_size - fetch_size) > fetch_size // 5:
+                                fetch_size = new_fetch_size
+                                fetch_sizes.append(fetch_size)
+                        # read the data using select statement
+                        rows = cursor.fetchmany(fetch_size)
+                        # We are done if there are no data
+                        if rows:
+                            yield cursor.description, rows
+                finally:
+                    # release cursor (unbuffered cursors hold the connection)
+                    cursor.close()
+        finally:
+            # report fetch sizes
+            if batch_stats is not None:
+                batch_stats["fetch_sizes"] = fetch_sizes
+
+    def query2arrow(self, select_query, local_file_path, writer_cls=ParquetBatchWriter, params=None, row_width=None, sink=None):
+        """
+            write result of a select statement to an arrow based file
+            (parquet / feather) batch by batch. postgres results are
+            read with binary COPY & decoded straight into arrow
+            columns. mysql rows are streamed with an unbuffered cursor
+            & converted using the column types of the query
+
+            params:
+                - select_query: select statement to run
+                - local_file_path: location on disk to write to
+                - writer_cls: ParquetBatchWriter, FeatherBatchWriter or a
+                              partial PartitionedDatasetWriter
+                - params: values to format into select_query
+                - row_width: catalog estimate of the row size (mysql)
+                - sink: stream the file to a sink instead (see query2csv)
+        """
+        # start time & memory high-water mark
+        start_time = time.time()
+        start_memory = self.get_peak_memory()
+        # batch sizes used
+        batch_stats = {}
+        # arrow writers accept paths & writable streams
+        output = local_file_path
+        if sink is not None:
+            local_file_path = os.path.basename(local_file_path)
+            output = sink(local_file_path)
+        # partitioned datasets are written to a temp dir & swapped in
+        # by their writer, files to a temp file renamed once complete
+        tmp_file_path = None
+        if sink is None and getattr(writer_cls, "func", writer_cls) is not PartitionedDatasetWriter:
+            tmp_file_path = local_file_path + ".tmp"
+            output = tmp_file_path
+        try:
+            # postgres
+            if self.connection_info["engine"] == "pg":
+                # decode binary COPY
+                file_writer = self.query2binary(select_query, output, writer_cls, params, batch_stats)
+            # mysql
+            elif self.connection_info["engine"] == "mysql":
+                # file writer (created from the first batch)
+                file_writer = None
+                # stream rows in batches
+                for description, rows in self.query2batches(select_query, params, row_width, batch_stats):
+                    # init writer using db column types
+                    if file_writer is None:
+                        file_writer = writer_cls(
+                            output,
+                            ArrowBatchConverter(self.connection_info["engine"], description)
+                        )
+                    # add rows
+                    file_writer.write_rows(rows)
+            # write remaining rows
+            file_writer.close()
+        except BaseException:
+            # drop partial upload
+            if sink is not None:
+                output.abort()
+            # remove partial output
+            if tmp_file_path is not None and os.path.exists(tmp_file_path):
+                os.remove(tmp_file_path)
+            raise
+        # publish streamed file
+        if sink is not None:
+            output.close()
+        # publish file
+        if tmp_file_path is not None:
+            os.replace(tmp_file_path, local_file_path)
+        # save stats
+        self.record_stats(
+            local_file_path,
+            rows=file_writer.num_rows,
+            seconds=time.time() - start_time,
+            start_memory=start_memory,
+            **batch_stats
+        )
+        # return path of written file
+        return local_file_path
+
+    def query2binary(self, select_query, local_file_path, writer_cls, params=None, batch_stats=None):
+        """
+            run a postgres select statement with binary COPY & decode
+            the stream into arrow batches. types that can't be decoded
+            (intervals, arrays, ranges ...) are cast to text in the query
+
+            params:
+                - select_query: select statement to run
+                - local_file_path: location on disk to write to
+                - writer_cls: ParquetBatchWriter, FeatherBatchWriter or a
+                              partial PartitionedDatasetWriter
+                - params: values to format into select_query
+                - batch_stats: dict receiving the number of batches
+            returns:
+                - file writer (not closed)
+        """
+        # get db connection (read ends with the block)
+        with self.read_connection() as conn:
+            # get cursor
+            cursor = conn.cursor()
+            # COPY doesn't accept bind params so inline them
+            if params is not None:
+                select_query = cursor.mogrify(select_query, params).decode()
+            # get column types without running the query
+            cursor.execute("SELECT * FROM ({0}) AS db2fs_query LIMIT 0".format(select_query))
+            # columns to copy (exotic types as text)
+            description, copy_select = self.build_binary_select(select_query, cursor.description)
+            # binary copy query
+            copy_query = "COPY ({0}) TO STDOUT WITH (FORMAT binary)".format(copy_select)
+            # decoder used as copy output (batches are cut by size
+            # instead of row count if a memory budget is set)
+            decoder = BinaryCopyDecoder(
+                description,
+                on_batch=None,
+                batch_rows=self.fetch_size if self.max_batch_bytes is None else MAX_FETCH_SIZE,
+                max_batch_bytes=self.max_batch_bytes
+            )
+            # write decoded batches to file
+            file_writer = writer_cls(local_file_path, decoder)
+            decoder.on_batch = file_writer.write_batch
+            # execute copy query
+            cursor.copy_expert(copy_query, decoder)
+            # convert remaining rows
+            decoder.flush()
+            # release cursor
+            cursor.close()
+        # report batches
+        if batch_stats is not None:
+            batch_stats["batches"] = decoder.num_batches
+        # return writer
+        return file_writer
+
+    def query2ndjson(self, select_query, local_file_path, params=None, compression=None, row_width=None, sink=None):
+        """
+            write result of a select statement to a newline delimited
+            json file, one batch at a time
+
+            params:
+                - select_query: select statement to run
+                - local_file_path: location on disk to write json to
+                - params: values to format into select_query
+                - compression: None, "gzip", "bz2", "zstd" or "lz4"
+                - row_width: catalog estimate of the row size
+                - sink: stream the file to a sink instead (see query2csv)
+        """
+        # start time & memory high-water mark
+        start_time = time.time()
+        start_memory = self.get_peak_memory()
+        # fetch sizes used
+        batch_stats = {}
+        # open (compressed) output
+        if sink is not None:
+            local_file_path = os.path.basename(local_file_path)
+            output = wrap_compressed(sink(local_file_path), compression)
+        else:
+            output = open_compressed(local_file_path, compression)
+        with output as out_file:
+            # json writer (created from the first batch)
+            json_writer = None
+            # stream rows in batches
+            for description, rows in self.query2batches(select_query, params, row_width, batch_stats):
+                # init writer using column names
+                if json_writer is None:
+                    json_writer = NDJSONBatchWriter(out_file, [column[0] for column in description])
+                # add rows
+                json_writer.write_rows(rows)
+        # save stats
+        self.record_stats(
+            local_file_path,
+            rows=json_writer.num_rows,
+            seconds=time.time() - start_time,
+            start_memory=start_memory,
+            **batch_stats
+        )
+        # return path of written file
+        return local_file_path
+
+    def table2csv(self, table_name, file_name=None, chunks=None, merge_chunks=True, workers=None, compression=None, watermark_column=None, full_refresh=False, resumable=False, columns=None, where=None, order_by=None, sample=None, sample_method="system", seed=None, consistent=False, max_rows_per_file=None, max_bytes_per_file=None, on_part_complete=None, sink=None):
         """
             convert single table to csv
 
             params:
                 - table_name: name of table to download
                 - file_name: local file name to save table to
+                - chunks: split table into this many key ranges &
+                          extract each range on its own connection
+                - merge_chunks: concatenate chunk files into one csv
+                                (otherwise keep them as part files)
+                - workers: number of worker processes used for chunks
+                - compression: None, "gzip", "bz2", "zstd" or "lz4"
+                               (adds .gz, .bz2, .zst or .lz4 to file name)
+                - watermark_column: monotonic column (e.g. id or updated_at).
+                                    only rows past the watermark saved by the
+                                    previous run are extracted into a delta
+                                    file (<table>.delta-00001.csv, ...)
+                - full_refresh: ignore the saved watermark & export the
+                                whole table again
+                - resumable: record finished chunks in a checkpoint file
+                             (<csv>.checkpoint.json) so a rerun after a
+                             failure only extracts the missing chunks
+                             (needs chunks > 1 & a table that can be
+                             split, raises ValueError otherwise)
+                - columns: list of columns to export (default all)
+                - where: condition or list of conditions rows must match
+                         (raw sql or (column, operator, value) tuples,
+                         see build_filters)
+                - order_by: column or list of columns / (column, "DESC")
+                            (applied within each chunk when chunked)
+                - sample: export a sample of the table instead: a fraction
+                          of rows (float) or a number of rows (int)
+                - sample_method: "system" (random pages) or "bernoulli"
+                                 (random rows) on postgres. mysql reads
+                                 random key ranges (see plan_sample)
+                - seed: seed making the sample repeatable
+                - consistent: read all chunks from one snapshot
+                - max_rows_per_file: split output into part files of at
+                                     most this many rows (<table>.part-00000.csv,
+                                     ... listed in <table>.csv.index.json)
+                - max_bytes_per_file: split output into part files of at
+                                      most this many (uncompressed) bytes
+                - on_part_complete: function called with (path, rows, bytes)
+                                    as soon as a part is finished (e.g. to
+                                    start uploading it)
+                - sink: function returning a writable binary stream for a
+                        file name, e.g. partial(s3.open_bucket_stream,
+                        bucket_name). output is streamed straight into
+                        object storage instead of the download dir (not
+                        chunked, not resumable)
+            returns:
+                - local file path (or list of part file paths). file names
+                  when streamed to a sink
         """
-        print("downloading: %s" % table_name)
-        # get db connection
-        conn = self.connect(self.connection_info)
-        # get cursor
-        cursor = conn.cursor()
-        # create download dir
-        if self.download_dir_path is None:
-            # use current file's dir as download dir
-            download_dir = os.path.dirname(os.path.realpath(__file__))
-            # create dir using download dir name
-            self.download_dir_path = self.create_dir(os.path.join(download_dir, self.download_dir_name))
-        # if file name specified
-        if file_name is not None:
-            # create local file path just using file name
-            # / no extension
-            local_file_path = os.path.join(self.download_dir_path, file_name + ".csv")
-        # if file name not specified use name of table
+        # checkpoints need local output
+        if resumable and sink is not None:
+            raise ValueError("resumable exports can't be streamed to a sink")
+        # a single chunk would restart the whole table anyway
+        if resumable and (chunks is None or chunks < 2):
+            raise ValueError("resumable exports need chunks > 1 (got chunks: %s)" % chunks)
+        # plan extraction
+        tasks, part_paths, local_file_path, watermark_state = self.plan_table2csv(
+            table_name,
+            file_name=file_name,
+            chunks=chunks,
+            merge_chunks=merge_chunks,
+            compression=compression,
+            watermark_column=watermark_column,
+            full_refresh=full_refresh,
+            columns=columns,
+            where=where,
+            order_by=order_by,
+            sample=sample,
+            sample_method=sample_method,
+            seed=seed,
+            max_rows_per_file=max_rows_per_file,
+            max_bytes_per_file=max_bytes_per_file,
+            on_part_complete=on_part_complete,
+            sink=sink
+        )
+        # table couldn't be split (no usable key, sampled or rolling output)
+        if resumable and part_paths is None:
+            raise ValueError("table: %s can't be split into chunks so it can't be resumed" % table_name)
+        # tasks left to run (index in tasks -> task)
+        pending_tasks = dict(enumerate(tasks))
+        # function marking tasks as done
+        on_result = None
+        # checkpointed extraction
+        if resumable:
+            # options the checkpoint was created with
+            options = {
+                "chunks": chunks,
+                "merge_chunks": merge_chunks,
+                "compression": compression,
+                "watermark_column": watermark_column,
+                "columns": columns,
+                "where": where,
+                "order_by": order_by,
+                "sample": sample,
+                "sample_method": sample_method,
+                "seed": seed,
+                "max_rows_per_file": max_rows_per_file,
+                "max_bytes_per_file": max_bytes_per_file
+            }
+            # load checkpoint
+            checkpoint_store, checkpoint = self.load_checkpoint(table_name, local_file_path, options)
+            # continue previous run
+            if checkpoint is not None:
+                # use plan of previous run (bounds / watermarks may have moved since)
+                tasks = [tuple(task) for task in checkpoint["tasks"]]
+                # callbacks aren't saved: use the current one
+                for method_name, args, kwargs in tasks:
+                    if "on_part_complete" in kwargs:
+                        kwargs["on_part_complete"] = on_part_complete
+                part_paths = checkpoint["part_paths"]
+                watermark_state = checkpoint["watermark_state"]
+                # skip completed tasks whose output still exists
+                pending_tasks = {
+                    task_index: task
+                    for task_index, task in enumerate(tasks)
+                    if task_index not in checkpoint["completed"] or not os.path.exists(task[1][3])
+                }
+                # log
+                logger.info(
+                    "resuming table: %s (%s of %s chunks left)" % (
+                        table_name,
+                        len(pending_tasks),
+                        len(tasks)
+                    )
+                )
+            else:
+                # new checkpoint
+                checkpoint = {
+                    "options": options,
+                    "tasks": tasks,
+                    "part_paths": part_paths,
+                    "watermark_state": watermark_state,
+                    "completed": []
+                }
+                checkpoint_store.set(table_name, checkpoint)
+
+            def on_result(task_index, result):
+                # record finished chunk
+                checkpoint["completed"].append(pending_task_indexes[task_index])
+                checkpoint_store.set(table_name, checkpoint)
+        # task indexes of pending tasks (in run order)
+        pending_task_indexes = sorted(pending_tasks)
+        pending_tasks = [pending_tasks[task_index] for task_index in pending_task_indexes]
+        # daemonic pool workers can't start their own pool
+        if len(pending_tasks) <= 1 or mp.current_process().daemon:
+            # one transaction for all chunks (unless already in one)
+            own_snapshot = consistent and len(pending_tasks) > 1 and not self.in_snapshot
+            if own_snapshot:
+                self.start_snapshot()
+            try:
+                # extract one task after another
+                for task_index, (method_name, args, kwargs) in enumerate(pending_tasks):
+                    result = getattr(self, method_name)(*args, **(kwargs or {}))
+                    # single task output (csv, rolled parts or streamed file)
+                    if part_paths is None:
+                        local_file_path = result
+                    # report finished task
+                    if on_result is not None:
+                        on_result(task_index, result)
+            finally:
+                if own_snapshot:
+                    self.end_snapshot()
+        else:
+            # extract chunks in parallel
+            self.run_tasks(pending_tasks, workers=workers, on_result=on_result, consistent=consistent)
+        # concatenate part files
+        # (compressed streams can be concatenated as is)
+        if part_paths is not None and merge_chunks:
+            self.merge_parts(part_paths, local_file_path)
+        # export succeeded: move watermark forward
+        if watermark_state is not None:
+            self.get_state_store().set(table_name, watermark_state)
+        # export finished: drop checkpoint
+        if resumable:
+            self.remove_file(checkpoint_store.file_path)
+        # keep part files as a multi file dataset
+        if part_paths is not None and not merge_chunks:
+            return part_paths
+        # return csv path
+        return local_file_path
+
+    def plan_table2csv(self, table_name, file_name=None, chunks=None, merge_chunks=True, compression=None, watermark_column=None, full_refresh=False, columns=None, where=None, order_by=None, sample=None, sample_method="system", seed=None, max_rows_per_file=None, max_bytes_per_file=None, on_part_complete=None, sink=None):
+        """
+            build the tasks extracting a table to csv (see table2csv)
+
+            returns:
+                - tasks: list of (method name, args, kwargs)
+                - part_paths: part files (None if table isn't chunked)
+                - local_file_path: csv the table is written to
+                - watermark_state: state to save once tasks succeed
+                                   (None if not incremental)
+        """
+        # file extension
+        extension = ".csv" + COMPRESSION_EXTENSIONS.get(compression, "")
+        # use table name if file name not specified
+        if file_name is None:
+            file_name = table_name
+        # validated projection, conditions & sort order applied to every task
+        columns, where, params, order_by = self.build_filters(table_name, columns, where, order_by)
+        # no watermark
+        watermark_state = None
+        # incremental extraction
+        if watermark_column is not None:
+            # rows past the last watermark
+            watermark_where, watermark_params, watermark_state = self.plan_watermark(
+                table_name,
+                watermark_column,
+                full_refresh
+            )
+            where, params = where + watermark_where, params + watermark_params
+            # incremental runs are written to numbered delta files
+            if watermark_state["deltas"] > 0:
+                file_name = "%s.delta-%05d" % (file_name, watermark_state["deltas"])
+        # sampling clauses
+        table_sample, limit = None, None
+        if sample is not None:
+            table_sample, sample_where, sample_params, limit = self.plan_sample(table_name, sample, sample_method, seed)
+            where, params = where + sample_where, params + sample_params
+            # samples are extracted in one piece
+            if chunks is not None and chunks > 1:
+                logger.warning("table: %s is sampled, not chunking" % table_name)
+                chunks = None
+        # rolling output is written by a single stream
+        if (max_rows_per_file is not None or max_bytes_per_file is not None) and chunks is not None and chunks > 1:
+            logger.warning("table: %s is written to rolling parts, not chunking" % table_name)
+            chunks = None
+        # chunks are merged on disk
+        if sink is not None and chunks is not None and chunks > 1:
+            logger.warning("table: %s is streamed to a sink, not chunking" % table_name)
+            chunks = None
+        # build local file path
+        local_file_path = self.get_local_file_path(table_name, file_name, extension)
+        # chunked extraction
+        if chunks is not None and chunks > 1:
+            # split table into key ranges
+            table_chunks = self.plan_chunks(table_name, chunks)
+            # only possible if table has a usable key
+            if table_chunks is not None:
+                # restrict every range to the filters / watermark
+                table_chunks = [
+                    (where + chunk_where, params + chunk_params)
+                    for chunk_where, chunk_params in table_chunks
+                ]
+                # build one task per chunk
+                tasks, part_paths = self.chunk_tasks(
+                    table_name,
+                    file_name,
+                    table_chunks,
+                    merge_chunks,
+                    compression,
+                    columns=columns,
+                    order_by=order_by
+                )
+                return tasks, part_paths, local_file_path, watermark_state
+        # single task
+        task = (
+            "table_part2csv",
+            (table_name, where, params, local_file_path),
+            {
+                "compression": compression,
+                "columns": columns,
+                "order_by": order_by,
+                "table_sample": table_sample,
+                "limit": limit,
+                "max_rows_per_file": max_rows_per_file,
+                "max_bytes_per_file": max_bytes_per_file,
+                "on_part_complete": on_part_complete,
+                "sink": sink
+            }
+        )
+        return [task], None, local_file_path, watermark_state
+
+    def load_checkpoint(self, table_name, local_file_path, options):
+        """
+            load the checkpoint of an interrupted table extraction
+
+            params:
+                - table_name: name of table
+                - local_file_path: csv the table is written to
+                - options: extraction options (a checkpoint created
+                           with other options is ignored)
+            returns:
+                - (checkpoint store, checkpoint or None)
+        """
+        # compare options the way they are stored (as json)
+        options = json.loads(json.dumps(options, default=to_state_value))
+        # checkpoint is kept next to the output
+        checkpoint_store = StateStore(local_file_path + ".checkpoint.json")
+        # get checkpoint
+        checkpoint = checkpoint_store.get(table_name)
+        # previous run used different options: start over
+        if checkpoint is not None and checkpoint["options"] != options:
+            # log
+            logger.warning(
+                "ignoring checkpoint: %s (created with options: %s)" % (
+                    checkpoint_store.file_path,
+                    checkpoint["options"]
+                )
+            )
+            checkpoint = None
+        # return store & checkpoint
+        return checkpoint_store, checkpoint
+
+    def get_state_store(self):
+        """
+            get (& load if needed) the store keeping extraction state
+            (defaults to .db2fs_state.json in the download dir)
+        """
+        if self.state_store is None:
+            # default location
+            if self.state_file_path is None:
+                self.state_file_path = os.path.join(self.get_download_dir(), ".db2fs_state.json")
+            # load state
+            self.state_store = StateStore(self.state_file_path)
+        return self.state_store
+
+    def plan_watermark(self, table_name, column_name, full_refresh=False):
+        """
+            build conditions selecting the rows added / updated since
+            the last incremental export of a table. the new watermark
+            is read up front & used as upper bound so rows written
+            while the export runs are picked up by the next run
+
+            params:
+                - table_name: name of table
+                - column_name: watermark column
+                - full_refresh: ignore the saved watermark
+            returns:
+                - (where, params, state to save after the export)
+        """
+        # state saved by the last run
+        table_state = self.get_state_store().get(table_name)
+        # start over if there is no state, the column changed or a
+        # full refresh is requested
+        if table_state is None or table_state["column"] != column_name or full_refresh:
+            table_state = None
+        # get new watermark
+        with self.read_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT MAX(%s) FROM %s" % (self.quote_identifier(column_name), self.quote_identifier(table_name)))
+            high_watermark = cursor.fetchone()[0]
+            cursor.close()
+        # store watermark as json
+        high_watermark = to_state_value(high_watermark)
+        # quoted column name (conditions are run w/ bind params)
+        column = self.quote_param_identifier(column_name)
+        # build conditions
+        where, params = [], []
+        # full export
+        if table_state is None:
+            # everything up to the new watermark (incl. null values)
+            if high_watermark is not None:
+                where.append("%s <= %%s OR %s IS NULL" % (column, column))
+                params.append(high_watermark)
+            # state after export
+            new_state = {"column": column_name, "watermark": high_watermark, "deltas": 0}
+        # delta export
         else:
-            # create local file path just using file name
-            # / no extension
-            local_file_path = os.path.join(self.download_dir_path, table_name + ".csv")
-        # raw sql select statement for different engines
-        # postgres
+            # rows past the last watermark
+            low_watermark = table_state["watermark"]
+            if low_watermark is not None:
+                where.append(column + " > %s")
+                params.append(low_watermark)
+            # up to the new watermark
+            if high_watermark is not None:
+                where.append(column + " <= %s")
+                params.append(high_watermark)
+            # state after export (keep old watermark if table was emptied)
+            new_state = {
+                "column": column_name,
+                "watermark": low_watermark if high_watermark is None else high_watermark,
+                "deltas": table_state["deltas"] + 1
+            }
+        # log
+        logger.info(
+            "table: %s watermark: %s -> %s" % (
+                table_name,
+                None if table_state is None else table_state["watermark"],
+                high_watermark
+            )
+        )
+        # return conditions & new state
+        return where, tuple(params), new_state
+
+    def get_split_column(self, table_name):
+        """
+            find an indexed integer / date / timestamp column a table
+            can be split on. the primary key is preferred
+
+            params:
+                - table_name: name of table
+            returns:
+                - (column name, column type) or None
+        """
         if self.connection_info["engine"] == "pg":
-            # get all rows in table
-            select_query = "SELECT * FROM \"%s\"" % table_name
-        # mysql
+            # first column of an index with a rangeable type
+            sql_get_column = (
+                "SELECT a.attname, format_type(a.atttypid, a.atttypmod) "
+                "FROM pg_attribute a JOIN pg_index i "
+                "ON i.indrelid = a.attrelid AND i.indkey[0] = a.attnum "
+                "WHERE a.attrelid = to_regclass(%s) AND NOT a.attisdropped "
+                "AND a.atttypid IN ('int2'::regtype, 'int4'::regtype, 'int8'::regtype, "
+                "'date'::regtype, 'timestamp'::regtype, 'timestamptz'::regtype) "
+                "ORDER BY i.indisprimary DESC, a.attnum LIMIT 1;"
+            )
+            # regclass lookup needs a quoted name
+            values = (self.quote_identifier(table_name),)
         elif self.connection_info["engine"] == "mysql":
-            # get all rows in table
-            select_query = "SELECT * FROM `%s`" % table_name
-        # open csv
-        with open(local_file_path, "w") as out_file:
-            # raw sql copy differs by dialect
-            # postgres
-            if self.connection_info["engine"] == "pg":
-                # define copy query (use postgres native csv functions)
-                copy_query = "COPY ({0}) TO STDOUT WITH CSV HEADER".format(select_query)
-                # execute copy query
-                cursor.copy_expert(copy_query, out_file)
-            elif self.connection_info["engine"] == "mysql":
-                # batch write using select statements to
-                # avoid issues with using INTO OUTFILE
-                # execute select query
-                cursor.execute(select_query)
-                # read data in batches
-                while True:
-                    # read the data using select statement
-                    df = pd.DataFrame(cursor.fetchmany(10000))
-                    # We are done if there are no data
-                    if len(df) == 0:
-                        break
-                    # Let's write to the file
-                    else:
-                        df.to_csv(out_file, header=False)
-                    # free memory
-                    del df
-            return local_file_path
-    
-    def table2other(self, table_name, file_type=".json", file_name=None):
+            # first column of an index with a rangeable type
+            sql_get_column = (
+                "SELECT c.COLUMN_NAME, c.DATA_TYPE FROM information_schema.COLUMNS c "
+                "JOIN information_schema.STATISTICS s ON s.TABLE_SCHEMA = c.TABLE_SCHEMA "
+                "AND s.TABLE_NAME = c.TABLE_NAME AND s.COLUMN_NAME = c.COLUMN_NAME AND s.SEQ_IN_INDEX = 1 "
+                "WHERE c.TABLE_SCHEMA = %s AND c.TABLE_NAME = %s "
+                "AND c.DATA_TYPE IN ('tinyint', 'smallint', 'mediumint', 'int', 'bigint', "
+                "'date', 'datetime', 'timestamp') "
+                "ORDER BY s.INDEX_NAME = 'PRIMARY' DESC, c.ORDINAL_POSITION LIMIT 1;"
+            )
+            values = (self.connection_info["database"], table_name)
+        # execute column query
+        cursor = self.run_query(sql_get_column, values)
+        # return (name, type) or None
+        return cursor.fetchone()
+
+    def get_split_points(self, table_name, column_name, column_type, chunks):
+        """
+            get values splitting a column into (roughly) equal sized
+            ranges. uses the column histogram when the db has one
+            (handles skewed keys) & falls back to min / max
+
+            params:
+                - table_name: name of table
+                - column_name: column to split on
+                - column_type: type of column (from get_split_column)
+                - chunks: number of ranges wanted
+            returns:
+                - sorted list of at most chunks - 1 split values
+        """
+        # equal frequency bounds from db statistics
+        bounds = []
+        if self.connection_info["engine"] == "pg":
+            # histogram bounds (cast from anyarray to column type)
+            cursor = self.run_query(
+                "SELECT histogram_bounds::text::{0}[] FROM pg_stats "
+                "WHERE tablename = %s AND attname = %s LIMIT 1;".format(column_type),
+                (table_name, column_name)
+            )
+            row = cursor.fetchone()
+            # stats might not exist (table never analyzed)
+            if row is not None and row[0]:
+                bounds = row[0]
+        elif self.connection_info["engine"] == "mysql":
+            # histograms only exist on mysql 8+ after ANALYZE ... UPDATE HISTOGRAM
+            try:
+                cursor = self.run_query(
+                    "SELECT HISTOGRAM FROM information_schema.COLUMN_STATISTICS "
+                    "WHERE SCHEMA_NAME = %s AND TABLE_NAME = %s AND COLUMN_NAME = %s;",
+                    (self.connection_info["database"], table_name, column_name)
+                )
+                row = cursor.fetchone()
+            except pymysql.err.MySQLError:
+                row = None
+            if row is not None:
+                # buckets store (.., upper bound, cumulative frequency, ..)
+                histogram = json.loads(row[0])
+                for bucket in histogram.get("buckets", []):
+                    # equi-height buckets: [lower, upper, cum_freq, ndv]
+                    # singleton buckets: [value, cum_freq]
+                    bounds.append(bucket[1] if len(bucket) == 4 else bucket[0])
+        # pick chunks - 1 evenly spaced histogram bounds
+        if len(bounds) >= chunks:
+            # step through histogram
+            step = len(bounds) / chunks
+            split_points = [bounds[int(step * i)] for i in range(1, chunks)]
+        else:
+            # split [min, max] into equal width ranges
+            cursor = self.run_query(
+                "SELECT MIN({0}), MAX({0}) FROM {1};".format(
+                    self.quote_identifier(column_name),
+                    self.quote_identifier(table_name)
+                )
+            )
+            min_value, max_value = cursor.fetchone()
+            # empty table
+            if min_value is None:
+                return []
+            # width of each range
+            width = (max_value - min_value) / chunks
+            split_points = [min_value + width * i for i in range(1, chunks)]
+            # keep integer keys integers
+            if isinstance(min_value, int):
+                split_points = [int(split_point) for split_point in split_points]
+        # remove duplicates (heavily skewed / small tables)
+        return sorted(set(split_points))
+
+    def plan_chunks(self, table_name, chunks):
+        """
+            split a table into key ranges
+
+            params:
+                - table_name: name of table
+                - chunks: number of ranges wanted
+            returns:
+                - list of (where, params) or None if table has no
+                  usable key
+        """
+        # find column to split on
+        split_column = self.get_split_column(table_name)
+        # no indexed rangeable column: chunks would all be full scans
+        if split_column is None:
+            # log
+            logger.warning(
+                "table: %s has no indexed integer / timestamp column, not chunking" % table_name
+            )
+            return None
+        column_name, column_type = split_column
+        # get split values
+        split_points = self.get_split_points(table_name, column_name, column_type, chunks)
+        # quoted column name (conditions are run w/ bind params)
+        column = self.quote_param_identifier(column_name)
+        # range bounds (None for open ends)
+        lower_bounds = [None] + split_points
+        upper_bounds = split_points + [None]
+        # build conditions for each range
+        table_chunks = []
+        for lower_bound, upper_bound in zip(lower_bounds, upper_bounds):
+            where, params = [], []
+            # lower bound is inclusive
+            if lower_bound is not None:
+                where.append(column + " >= %s")
+                params.append(lower_bound)
+            # upper bound is exclusive
+            if upper_bound is not None:
+                where.append(column + " < %s")
+                params.append(upper_bound)
+            # null keys go into the first range
+            if lower_bound is None and upper_bound is not None:
+                where = ["%s OR %s IS NULL" % (where[0], column)]
+            table_chunks.append((where, tuple(params)))
+        # return range conditions
+        return table_chunks
+
+    def plan_sample(self, table_name, sample, sample_method="system", seed=None, sample_ranges=100):
+        """
+            build the clauses sampling a table without scanning all
+            of it (or sorting it like ORDER BY RAND()).
+
+            postgres uses TABLESAMPLE: SYSTEM reads a random subset of
+            pages, BERNOULLI reads every page but picks rows one by one.
+
+            mysql has no TABLESAMPLE so the key space of an indexed
+            integer key is split into sample_ranges equal strata & a
+            random slice (covering the sample fraction) of each stratum
+            is read through the index. assumes keys are spread evenly
+            (e.g. auto increment ids). tables without such a key fall
+            back to a full scan filtered with RAND(seed)
+
+            params:
+                - table_name: name of table
+                - sample: fraction of rows (float between 0 & 1) or
+                          number of rows (int)
+                - sample_method: "system" or "bernoulli" (postgres)
+                - seed: seed making the sample repeatable
+                - sample_ranges: number of key ranges read (mysql)
+            returns:
+                - (table sample clause, where, params, limit)
+        """
+        # number of rows wanted
+        limit = None
+        if isinstance(sample, int) and not isinstance(sample, bool):
+            # estimated table rows
+            num_rows = self.get_table_sizes().get(table_name, (0, 0))[0]
+            limit = sample
+            # fraction needed (+10% so the limit is usually reached)
+            fraction = min(1.0, 1.1 * sample / num_rows) if num_rows > 0 else 1.0
+        elif isinstance(sample, float) and 0 < sample <= 1:
+            fraction = sample
+        else:
+            raise ValueError("invalid sample: %s (expected a fraction or a number of rows)" % (sample,))
+        # log
+        logger.info("sampling table: %s fraction: %s limit: %s" % (table_name, fraction, limit))
+        if self.connection_info["engine"] == "pg":
+            # check method
+            sample_method = sample_method.upper()
+            if sample_method not in ("SYSTEM", "BERNOULLI"):
+                raise ValueError("invalid sample method: %s" % sample_method)
+            # sampling clause (percentage of pages / rows)
+            table_sample = "TABLESAMPLE %s (%r)" % (sample_method, fraction * 100)
+            # same seed returns the same sample
+            if seed is not None:
+                table_sample += " REPEATABLE (%d)" % seed
+            return table_sample, [], (), limit
+        elif self.connection_info["engine"] == "mysql":
+            # seeded random numbers
+            sample_random = random.Random(seed)
+            # integer key to sample ranges of
+            split_column = self.get_split_column(table_name)
+            if split_column is not None and "int" in split_column[1]:
+                # key space
+                cursor = self.run_query(
+                    "SELECT MIN({0}), MAX({0}) FROM {1};".format(
+                        self.quote_identifier(split_column[0]),
+                        self.quote_identifier(table_name)
+                    )
+                )
+                min_value, max_value = cursor.fetchone()
+                # empty table
+                if min_value is None:
+                    return None, [], (), limit
+                # split key space into strata
+                key_span = max_value - min_value + 1
+                num_ranges = max(1, min(sample_ranges, key_span))
+                stratum_width = key_span / num_ranges
+                # keys read per stratum
+                range_width = max(1, int(round(stratum_width * fraction)))
+                # quoted column name (conditions are run w/ bind params)
+                column = self.quote_param_identifier(split_column[0])
+                # random slice of each stratum
+                conditions, params = [], []
+                for stratum_index in range(num_ranges):
+                    stratum_start = min_value + int(stratum_width * stratum_index)
+                    stratum_end = min_value + int(stratum_width * (stratum_index + 1))
+                    range_start = stratum_start + sample_random.randint(0, max(0, stratum_end - stratum_start - range_width))
+                    conditions.append("%s >= %%s AND %s < %%s" % (column, column))
+                    params.extend([range_start, range_start + range_width])
+                # read ranges through the index
+                return None, [" OR ".join("(%s)" % condition for condition in conditions)], tuple(params), limit
+            # log
+            logger.warning(
+                "table: %s has no indexed integer column, sampling with a full scan" % table_name
+            )
+            # per row random filter
+            return None, ["RAND(%s) < %s"], (sample_random.randint(0, 2 ** 31 - 1), fraction), limit
+
+    def chunk_tasks(self, table_name, file_name, table_chunks, merge_chunks=True, compression=None, columns=None, order_by=None):
+        """
+            build one table_part2csv task per chunk
+
+            params:
+                - table_name: name of table
+                - file_name: local file name (defaults to table name)
+                - table_chunks: output of plan_chunks
+                - merge_chunks: whether parts are concatenated afterwards
+                                (only the first part gets a header)
+                - compression: compression codec of part files
+                - columns: columns to select (default all)
+                - order_by: sort order within each part
+            returns:
+                - (tasks, part file paths)
+        """
+        tasks, part_paths = [], []
+        # use table name if file name not specified
+        if file_name is None:
+            file_name = table_name
+        for part_index, (where, params) in enumerate(table_chunks):
+            # part file path
+            part_path = self.get_local_file_path(
+                table_name,
+                "%s.part-%05d" % (file_name, part_index),
+                ".csv" + COMPRESSION_EXTENSIONS.get(compression, "")
+            )
+            # header on every part unless parts are merged
+            header = part_index == 0 or not merge_chunks
+            # add task
+            tasks.append((
+                "table_part2csv",
+                (table_name, where, params, part_path, header),
+                {"compression": compression, "columns": columns, "order_by": order_by}
+            ))
+            part_paths.append(part_path)
+        # return tasks & part paths
+        return tasks, part_paths
+
+    def table_part2csv(self, table_name, where, params, local_file_path, header=True, compression=None, columns=None, order_by=None, table_sample=None, limit=None, max_rows_per_file=None, max_bytes_per_file=None, on_part_complete=None, sink=None):
+        """
+            convert the rows of a table matching a condition to csv
+
+            params:
+                - table_name: name of table to download
+                - where: list of sql conditions
+                - params: values to format into the conditions
+                - local_file_path: location on disk to write csv to
+                - header: whether to write column names
+                - compression: compression codec of csv
+                - columns: columns to select (default all)
+                - order_by: list of (column, "ASC" / "DESC")
+                - table_sample: TABLESAMPLE clause (postgres)
+                - limit: max number of rows
+                - max_rows_per_file / max_bytes_per_file / on_part_complete:
+                  rolling output (see query2csv)
+                - sink: stream csv to a sink instead (see query2csv)
+        """
+        # log
+        logger.info("downloading: %s (%s)" % (table_name, os.path.basename(local_file_path)))
+        # write matching rows to csv
+        return self.query2csv(
+            self.build_select(table_name, where, columns, order_by, table_sample, limit),
+            local_file_path,
+            params=params,
+            header=header,
+            compression=compression,
+            row_width=self.estimate_row_width(table_name) if self.max_batch_bytes is not None else None,
+            max_rows_per_file=max_rows_per_file,
+            max_bytes_per_file=max_bytes_per_file,
+            on_part_complete=on_part_complete,
+            sink=sink
+        )
+
+    def merge_parts(self, part_paths, local_file_path):
+        """
+            concatenate part files into a single file & remove parts
+
+            params:
+                - part_paths: ordered list of part files
+                - local_file_path: location of merged file
+        """
+        # write merged file under a temp name
+        tmp_file_path = local_file_path + ".tmp"
+        with open(tmp_file_path, "wb") as out_file:
+            for part_path in part_paths:
+                # append part
+                with open(part_path, "rb") as part_file:
+                    shutil.copyfileobj(part_file, out_file)
+        # publish merged file
+        os.replace(tmp_file_path, local_file_path)
+        # delete parts (only once the merged file is complete)
+        for part_path in part_paths:
+            self.remove_file(part_path)
+        # return merged file path
+        return local_file_path
+
+    def table2other(self, table_name, file_type=".json", file_name=None, compression=None, columns=None, where=None, order_by=None, sample=None, sample_method="system", seed=None, partition_by=None, max_open_files=64, sink=None):
         """
             convert a single table to a given file type
 
             params:
                 - table_name: name of table to download
-                - file_type: file to convert to table
+                - file_type: file to convert to table (".json",
+                             ".parquet", ".feather" or ".jsonl" /
+                             ".ndjson" for newline delimited json)
                 - file_name: name of file
+                - compression: None, "gzip", "bz2", "zstd" or "lz4"
+                               (".jsonl" only)
+                - columns: list of columns to export (default all)
+                - where: condition or list of conditions (see build_filters)
+                - order_by: column or list of columns / (column, "DESC")
+                - sample: fraction (float) or number (int) of rows to export
+                - sample_method: "system" or "bernoulli" (postgres)
+                - seed: seed making the sample repeatable
+                - partition_by: column or list of columns to write a hive
+                                style partitioned dataset on (".parquet" /
+                                ".feather" only) e.g. table/region=us/
+                                part-00000.parquet. the dataset dir path
+                                is returned
+                - max_open_files: max partition files open at a time.
+                                  a partition seen again after its file
+                                  was closed gets another part file
+                                  (order_by the partition columns to get
+                                  one file per partition)
+                - sink: stream the file to a sink instead of the download
+                        dir (".parquet", ".feather", ".jsonl" / ".ndjson",
+                        see table2csv)
         """
-        # download table 2 csv
-        local_csv_path = self.table2csv(table_name = table_name, file_name = file_name)
+        # streaming writes a single file
+        if sink is not None and (file_type == ".json" or partition_by is not None):
+            raise ValueError("only unpartitioned .parquet, .feather & .jsonl files can be streamed to a sink")
+        # partitioned datasets
+        if partition_by is not None:
+            # single column
+            if isinstance(partition_by, str):
+                partition_by = [partition_by]
+            # only arrow based files
+            if file_type not in (".parquet", ".feather"):
+                raise ValueError("partition_by is only supported for .parquet & .feather (got: %s)" % file_type)
+            # partition columns have to exist & be selected
+            self.check_columns(table_name, partition_by)
+            if columns:
+                unselected_columns = [column for column in partition_by if column not in columns]
+                if unselected_columns:
+                    raise ValueError("partition column(s): %s not in columns: %s" % (unselected_columns, columns))
         # convert csv to specified file type
         if file_type == ".json":
+            # download table 2 csv
+            local_csv_path = self.table2csv(
+                table_name=table_name,
+                file_name=file_name,
+                columns=columns,
+                where=where,
+                order_by=order_by,
+                sample=sample,
+                sample_method=sample_method,
+                seed=seed
+            )
             # read csv into df
             df = pd.read_csv(local_csv_path)
             # create json path
@@ -124,42 +1807,597 @@ class DatabaseExtractor(IOFunctions, RDBMiddleware, GCPStorageMiddleware):
             os.remove(local_csv_path)
             # return json file path
             return local_json_path
-        elif file_type == ".parquet":
-            # read csv into df
-            df = pd.read_csv(local_csv_path)
-            # create parquet path
-            local_parquet_path = Path(local_csv_path)
-            # update extension
-            local_parquet_path.rename(local_parquet_path.with_suffix(file_type))
-            # write to json
-            df.to_parquet(local_parquet_path)
-            # delete csv
-            os.remove(local_csv_path)
-            # return parquet file path
-            return local_parquet_path
-            
+        # validated projection, conditions & sort order
+        columns, where, params, order_by = self.build_filters(table_name, columns, where, order_by)
+        # sampling clauses
+        table_sample, limit = None, None
+        if sample is not None:
+            table_sample, sample_where, sample_params, limit = self.plan_sample(table_name, sample, sample_method, seed)
+            where, params = where + sample_where, params + sample_params
+        # select statement
+        select_query = self.build_select(table_name, where, columns, order_by, table_sample, limit)
+        # catalog row width (sizes first fetch)
+        row_width = self.estimate_row_width(table_name) if self.max_batch_bytes is not None else None
+        if file_type in (".parquet", ".feather"):
+            # file writer
+            writer_cls = ParquetBatchWriter if file_type == ".parquet" else FeatherBatchWriter
+            # partitioned dataset
+            if partition_by is not None:
+                # build local dir path
+                local_arrow_path = self.get_local_file_path(table_name, file_name, extension="")
+                # split batches over partition files
+                writer_cls = functools.partial(
+                    PartitionedDatasetWriter,
+                    partition_by=partition_by,
+                    writer_cls=writer_cls,
+                    extension=file_type,
+                    max_open_files=max_open_files
+                )
+            else:
+                # build local file path
+                local_arrow_path = self.get_local_file_path(table_name, file_name, extension=file_type)
+            # stream table straight into parquet / feather
+            return self.query2arrow(
+                select_query,
+                local_arrow_path,
+                writer_cls=writer_cls,
+                params=params,
+                row_width=row_width,
+                sink=sink
+            )
+        elif file_type in (".jsonl", ".ndjson"):
+            # build local file path (add compression extension)
+            local_json_path = self.get_local_file_path(
+                table_name,
+                file_name,
+                extension=file_type + COMPRESSION_EXTENSIONS.get(compression, "")
+            )
+            # stream table straight into json lines
+            return self.query2ndjson(
+                select_query,
+                local_json_path,
+                params=params,
+                compression=compression,
+                row_width=row_width,
+                sink=sink
+            )
 
-        
-    def db2csv(self):
-        # get all tables
-        all_tables = self.get_tables()
-        # get number of cpus available
-        pool_size = mp.cpu_count()
+    def run_tasks(self, tasks, workers=None, on_result=None, consistent=False, max_ahead=None):
+        """
+            run extractor methods in a pool of worker processes.
+            tasks are submitted in the order given without waiting
+            on each other. each worker opens a single db connection
+            & reuses it for all its tasks
+
+            params:
+                - tasks: list of (method name, args, kwargs)
+                - workers: number of worker processes (defaults to
+                           self.workers or number of cpus)
+                - on_result: function called with (task index, result)
+                             as soon as a task finishes
+                - consistent: run all tasks on one snapshot of the db.
+                              every worker starts a repeatable read
+                              transaction on the snapshot taken by
+                              export_snapshot before any task runs
+                - max_ahead: finished tasks allowed to wait for on_result
+                             before workers stop getting new tasks (lets a
+                             slow on_result e.g. a full upload queue hold
+                             back extraction). default: no limit
+            returns:
+                - list of method results (same order as tasks)
+        """
+        # nothing to do
+        if not tasks:
+            return []
+        # get number of workers
+        pool_size = workers or self.workers or mp.cpu_count()
+        # no point starting more workers than tasks
+        pool_size = max(1, min(pool_size, len(tasks)))
+        # info needed to rebuild the extractor in each worker
+        init_kwargs = self.get_worker_kwargs()
+        # results in task order
+        results = [None] * len(tasks)
+        # shared snapshot
+        snapshot_conn, snapshot_id, barrier = None, None, None
+        if consistent:
+            # freeze snapshot
+            snapshot_conn, snapshot_id = self.export_snapshot()
+            # workers + this process meet once all workers are on the snapshot
+            barrier = mp.Barrier(pool_size + 1)
         # create worker pool
-        pool = mp.Pool(processes=pool_size)
-        # start download function
-        download_status = [pool.apply(self.table2csv, args=(table_name,)) for table_name in all_tables]
-        # return
-        return download_status
+        with mp.Pool(
+            processes=pool_size,
+            initializer=init_worker,
+            initargs=(DatabaseExtractor, init_kwargs, snapshot_id, barrier)
+        ) as pool:
+            # release snapshot / read lock once all workers joined it
+            if consistent:
+                try:
+                    barrier.wait(timeout=SNAPSHOT_TIMEOUT)
+                finally:
+                    self.release_snapshot(snapshot_conn)
+            # tasks handed to workers but not reported yet
+            slots = threading.Semaphore(pool_size + max_ahead) if max_ahead is not None else None
+            stopped = threading.Event()
 
-    def db2other(self, file_type=".json"):
+            def feed_tasks():
+                for indexed_task in enumerate(tasks):
+                    # wait until enough results are reported
+                    if slots is not None:
+                        while not slots.acquire(timeout=1):
+                            if stopped.is_set():
+                                return
+                    yield indexed_task
+            try:
+                # submit tasks without waiting & collect
+                # results as tasks finish
+                for task_index, result, stats in pool.imap_unordered(run_indexed_task, feed_tasks()):
+                    # merge worker stats
+                    self.stats.update(stats)
+                    # save result
+                    results[task_index] = result
+                    # report finished task
+                    if on_result is not None:
+                        on_result(task_index, result)
+                    # let next task start
+                    if slots is not None:
+                        slots.release()
+            finally:
+                # unblock task feeder (pool is terminated on errors)
+                stopped.set()
+            # no more tasks
+            pool.close()
+            # wait for workers to exit
+            pool.join()
+        # return results
+        return results
+
+    def get_ordered_tables(self):
+        """
+            get all tables ordered largest first (using catalog
+            estimates) so the biggest tables don't end up running
+            alone at the end of a parallel export
+
+            returns:
+                - (all tables, tables ordered by size)
+        """
         # get all tables
         all_tables = self.get_tables()
-        # get number of cpus available
-        pool_size = mp.cpu_count()
-        # create worker pool
-        pool = mp.Pool(processes=pool_size)
-        # start download function
-        download_status = [pool.apply(self.table2other, args=(table_name, file_type,)) for table_name in all_tables]
-        # return
-        return download_status
+        # get estimated (rows, bytes) per table
+        table_sizes = self.get_table_sizes()
+        # order tables largest first (by bytes then rows)
+        ordered_tables = sorted(
+            all_tables,
+            key=lambda table_name: table_sizes.get(table_name, (0, 0))[::-1],
+            reverse=True
+        )
+        # return both orders
+        return all_tables, ordered_tables
+
+    def run_tables(self, method_name, args=(), kwargs=None, workers=None, table_kwargs=None, consistent=False, on_result=None, max_ahead=None):
+        """
+            run an extractor method for every table in db in parallel,
+            largest tables first
+
+            params:
+                - method_name: extractor method to run e.g. table2csv
+                - args: extra positional arguments passed after table name
+                - kwargs: keyword arguments passed to the method
+                - workers: number of worker processes
+                - table_kwargs: dict of table name -> extra keyword
+                                arguments for that table
+                - consistent: read all tables from one snapshot
+                - on_result: function called with (table name, result)
+                             as soon as a table is done
+                - max_ahead: see run_tasks
+            returns:
+                - list of method results (same order as get_tables)
+        """
+        # get tables
+        all_tables, ordered_tables = self.get_ordered_tables()
+        # use empty mapping if not specified
+        table_kwargs = table_kwargs or {}
+        # one task per table
+        tasks = [
+            (method_name, (table_name,) + tuple(args), dict(kwargs or {}, **table_kwargs.get(table_name, {})))
+            for table_name in ordered_tables
+        ]
+        # report tables as they finish
+        on_task_result = None
+        if on_result is not None:
+            def on_task_result(task_index, result):
+                on_result(ordered_tables[task_index], result)
+        # run tasks
+        results = dict(zip(ordered_tables, self.run_tasks(
+            tasks,
+            workers=workers,
+            on_result=on_task_result,
+            consistent=consistent,
+            max_ahead=max_ahead
+        )))
+        # return results in table order
+        return [results[table_name] for table_name in all_tables]
+
+    def db2csv(self, workers=None, chunks=None, compression=None, watermark_columns=None, full_refresh=False, table_options=None, consistent=False, max_rows_per_file=None, max_bytes_per_file=None, on_part_complete=None, sink=None, on_file=None):
+        """
+            convert all tables in db to csv in parallel
+
+            params:
+                - workers: number of worker processes
+                - chunks: split each table into this many key ranges
+                          so large tables are spread over workers too
+                - compression: None, "gzip", "bz2", "zstd" or "lz4"
+                - watermark_columns: dict of table name -> watermark column
+                                     for tables extracted incrementally
+                                     (see table2csv)
+                - full_refresh: ignore saved watermarks
+                - table_options: dict of table name -> dict of columns /
+                                 where / order_by (see table2csv)
+                - consistent: export all tables from one snapshot of the
+                              db so related tables line up (see run_tasks)
+                - max_rows_per_file / max_bytes_per_file: split tables
+                  into part files (see table2csv)
+                - on_part_complete: function called with (path, rows, bytes)
+                                    of every finished part (runs in the
+                                    worker process so it must be picklable)
+                - sink: stream tables to a sink instead of the download
+                        dir (see table2csv). sinks are sent to the worker
+                        processes so they must be picklable (e.g. a module
+                        level function creating the storage middleware)
+                - on_file: function called (in this process) with every
+                           file as soon as its table is done, e.g. to
+                           queue it for upload (see db2cloud). workers
+                           wait for new tables while on_file blocks
+        """
+        # output options
+        output_kwargs = {
+            "max_rows_per_file": max_rows_per_file,
+            "max_bytes_per_file": max_bytes_per_file,
+            "on_part_complete": on_part_complete,
+            "sink": sink
+        }
+        # use empty mappings if not specified
+        watermark_columns = watermark_columns or {}
+        table_options = table_options or {}
+        # hold back extraction while files wait for on_file
+        max_ahead = 0 if on_file is not None else None
+        # one task per table
+        if (chunks is None or chunks <= 1) and not watermark_columns and not table_options:
+            # report files of finished tables
+            on_table_result = None
+            if on_file is not None:
+                def on_table_result(table_name, result):
+                    self.report_files(result, on_file)
+            # run table2csv for all tables
+            return self.run_tables(
+                "table2csv",
+                kwargs=dict(output_kwargs, compression=compression),
+                workers=workers,
+                consistent=consistent,
+                on_result=on_table_result,
+                max_ahead=max_ahead
+            )
+        # get tables
+        all_tables, ordered_tables = self.get_ordered_tables()
+        # tasks for every table (chunks of largest tables first)
+        tasks, table_plans, task_tables = [], {}, []
+        for table_name in ordered_tables:
+            # plan table extraction
+            table_tasks, part_paths, local_file_path, watermark_state = self.plan_table2csv(
+                table_name,
+                chunks=chunks,
+                compression=compression,
+                watermark_column=watermark_columns.get(table_name),
+                full_refresh=full_refresh,
+                **output_kwargs,
+                **table_options.get(table_name, {})
+            )
+            table_plans[table_name] = (part_paths, local_file_path, watermark_state)
+            tasks.extend(table_tasks)
+            task_tables.extend([table_name] * len(table_tasks))
+        # tasks left per table
+        tasks_left = {table_name: task_tables.count(table_name) for table_name in table_plans}
+        # file paths of tables
+        table_paths = {}
+
+        def on_result(task_index, result):
+            # wait for all chunks of table
+            table_name = task_tables[task_index]
+            tasks_left[table_name] -= 1
+            if tasks_left[table_name] > 0:
+                return
+            part_paths, local_file_path, watermark_state = table_plans[table_name]
+            # concatenate chunked tables
+            if part_paths is not None:
+                table_paths[table_name] = self.merge_parts(part_paths, local_file_path)
+            # single task (csv path or list of rolled parts)
+            else:
+                table_paths[table_name] = result
+            # report finished table
+            if on_file is not None:
+                self.report_files(table_paths[table_name], on_file)
+        # run tasks
+        self.run_tasks(tasks, workers=workers, on_result=on_result, consistent=consistent, max_ahead=max_ahead)
+        # move watermarks forward once all tables are exported
+        for table_name, (part_paths, local_file_path, watermark_state) in table_plans.items():
+            if watermark_state is not None:
+                self.get_state_store().set(table_name, watermark_state)
+        # return file paths in table order
+        return [table_paths[table_name] for table_name in all_tables]
+
+    def db2other(self, file_type=".json", workers=None, compression=None, table_options=None, consistent=False, partition_by=None, max_open_files=64, sink=None, on_file=None):
+        """
+            convert all tables in db to a given file type in parallel
+
+            params:
+                - file_type: file type to convert tables to
+                - workers: number of worker processes
+                - compression: None, "gzip", "bz2", "zstd" or "lz4"
+                               (".jsonl" only)
+                - table_options: dict of table name -> dict of columns /
+                                 where / order_by / partition_by (see
+                                 table2other)
+                - consistent: export all tables from one snapshot of the db
+                - partition_by: partition columns used for all tables
+                                (override per table with table_options)
+                - max_open_files: max partition files open at a time
+                                  (per worker)
+                - sink: stream files to a sink instead of the download dir
+                        (must be picklable, see db2csv)
+                - on_file: function called with every file as soon as its
+                           table is done (see db2csv)
+        """
+        # report files of finished tables
+        on_table_result = None
+        if on_file is not None:
+            def on_table_result(table_name, result):
+                self.report_files(result, on_file)
+        # run table2other for all tables
+        return self.run_tables(
+            "table2other",
+            args=(file_type,),
+            kwargs={"compression": compression, "partition_by": partition_by, "max_open_files": max_open_files, "sink": sink},
+            workers=workers,
+            table_kwargs=table_options,
+            consistent=consistent,
+            on_result=on_table_result,
+            max_ahead=0 if on_file is not None else None
+        )
+
+    def report_files(self, result, on_file):
+        """
+            call a function with every file written for a table
+
+            params:
+                - result: file path, list of part files or dataset dir
+                - on_file: function called with each file path
+        """
+        # single file / dataset dir
+        if not isinstance(result, list):
+            result = [result]
+        for path in result:
+            path = str(path)
+            # all files of a (partitioned) dataset
+            if os.path.isdir(path):
+                for dir_path, dir_names, file_names in sorted(os.walk(path)):
+                    for file_name in sorted(file_names):
+                        on_file(os.path.join(dir_path, file_name))
+            else:
+                on_file(path)
+
+    def db2cloud(self, middleware, bucket_name, prefix=None, file_type=".csv", upload_workers=4, max_queued=8, delete_after_upload=False, **kwargs):
+        """
+            extract all tables & upload every file to cloud storage
+            as soon as it is written. uploads run on a pool of threads
+            while the remaining tables are extracted (see UploadPipeline)
+
+            params:
+                - middleware: AWSS3Middleware, GCPStorageMiddleware or
+                              AzureStorageMiddleware
+                - bucket_name: bucket / container to upload to
+                - prefix: prefix added to object keys
+                - file_type: ".csv" or a file type of db2other
+                - upload_workers: number of upload threads
+                - max_queued: files waiting for an upload before
+                              extraction is held back
+                - delete_after_upload: remove local files once the
+                                       upload is verified
+                - kwargs: options of db2csv / db2other (workers, chunks,
+                          compression, table_options ...)
+            returns:
+                - list of uploaded object keys
+        """
+        # upload files while extracting
+        with UploadPipeline(
+            middleware,
+            bucket_name,
+            self.get_download_dir(),
+            prefix=prefix,
+            workers=upload_workers,
+            max_queued=max_queued,
+            delete_after_upload=delete_after_upload
+        ) as upload_pipeline:
+            if file_type == ".csv":
+                self.db2csv(on_file=upload_pipeline.submit, **kwargs)
+            else:
+                self.db2other(file_type, on_file=upload_pipeline.submit, **kwargs)
+        # return uploaded keys
+        return upload_pipeline.uploaded
+
+    def get_load_table_name(self, file_path):
+        """
+            get the table a file is loaded into: the file name without
+            extensions, part or delta number e.g. big.part-00001.csv.gz
+            -> big & big.delta-00001.csv -> big (deltas of incremental
+            extractions are appended to their base table)
+
+            params:
+                - file_path: location of file on disk
+        """
+        # file name
+        file_name = os.path.basename(file_path)
+        # split off compression extension
+        file_type, compressed = get_file_type(file_name)
+        if compressed:
+            file_name = os.path.splitext(file_name)[0]
+        # split off file type, part & delta numbers (see get_part_path)
+        return re.sub(r"(\.(part|delta)-\d+)+$", "", os.path.splitext(file_name)[0])
+
+    def is_bookkeeping_file(self, file_path):
+        """
+            check if a file is one db2fs writes for its own use (part
+            indexes, checkpoints, extraction state, unfinished files)
+
+            params:
+                - file_path: location of file on disk
+        """
+        # extraction state (custom location)
+        if self.state_file_path is not None and os.path.abspath(file_path) == os.path.abspath(self.state_file_path):
+            return True
+        return os.path.basename(file_path).endswith(BOOKKEEPING_SUFFIXES)
+
+    def get_load_files(self, dir_path, file_types=None):
+        """
+            find the files of a directory that can be loaded (db2fs
+            bookkeeping files are left out, see is_bookkeeping_file).
+            sub directories (e.g. partitioned datasets) aren't loaded,
+            they are skipped w/ a warning
+
+            params:
+                - dir_path: path to directory
+                - file_types: file types to load (default: LOAD_FILE_TYPES)
+            returns:
+                - dict of table name -> sorted list of file paths
+        """
+        # file types
+        file_types = file_types or LOAD_FILE_TYPES
+        # partition values of datasets are only stored in dir names
+        for entry in sorted(os.scandir(dir_path), key=lambda entry: entry.name):
+            if entry.is_dir():
+                logger.warning("skipping directory: %s (partitioned datasets aren't loaded)" % entry.path)
+        # group files by table
+        table_files = {}
+        for file_path in sorted(self.get_dir_files(dir_path)):
+            # skip directories
+            if not os.path.isfile(file_path):
+                continue
+            # skip part indexes, checkpoints, state ...
+            if self.is_bookkeeping_file(file_path):
+                continue
+            # skip other files
+            if get_file_type(file_path)[0] not in file_types:
+                continue
+            table_files.setdefault(self.get_load_table_name(file_path), []).append(file_path)
+        return table_files
+
+    def file2table(self, file_path, table_name, metadata, **kwargs):
+        """
+            load a file into a table & record its stats (rows,
+            bytes, seconds)
+
+            params:
+                - file_path: location of file on disk
+                - table_name: table to load
+                - metadata: column (name, type) list of table
+                - kwargs: options of populate_table (batch_size ...)
+            returns:
+                - number of rows loaded
+        """
+        # load file
+        start_time = time.monotonic()
+        start_memory = self.get_peak_memory()
+        num_rows = self.populate_table(file_path, table_name, metadata, **kwargs)
+        # record stats
+        self.record_stats(
+            file_path,
+            table=table_name,
+            rows=num_rows,
+            bytes=os.path.getsize(file_path),
+            seconds=time.monotonic() - start_time,
+            start_memory=start_memory
+        )
+        return num_rows
+
+    def dir2db(self, dir_path=None, workers=None, schemas=None, file_types=None, batch_size=10000, commit_every=None, on_file=None):
+        """
+            load every file of a directory into the db (the reverse of
+            db2csv / db2other). files are grouped into tables by name
+            (parts & deltas of a table e.g. big.part-00001.csv &
+            big.delta-00001.csv all go to big, sub directories such
+            as partitioned datasets are skipped w/ a warning),
+            missing tables are created up front from the given or
+            inferred schemas, then files are loaded in parallel
+            (largest first) in a pool of worker processes. stats of
+            every file are recorded in self.stats
+
+            params:
+                - dir_path: directory to load (default: download dir)
+                - workers: number of worker processes
+                - schemas: dict of table name -> metadata (column name,
+                           type list). other tables get the schema
+                           inferred from their first file
+                - file_types: file types to load (default: .csv,
+                              .parquet, .feather, .arrow, .json,
+                              .jsonl & .ndjson)
+                - batch_size: rows sent per round trip
+                - commit_every: commit after this many rows (default: one
+                                transaction per file)
+                - on_file: function called (in this process) with every
+                           file path as soon as the file is loaded
+            returns:
+                - dict of table name -> number of rows loaded
+        """
+        # directory to load
+        dir_path = dir_path or self.get_download_dir()
+        # use empty mapping if not specified
+        schemas = schemas or {}
+        # files to load per table
+        table_files = self.get_load_files(dir_path, file_types)
+        # create tables before any file is loaded
+        table_metadata = {}
+        for table_name, file_paths in table_files.items():
+            metadata = schemas.get(table_name)
+            if metadata is None:
+                metadata = self.infer_metadata(file_paths[0])
+            self.create_table(table_name, metadata)
+            table_metadata[table_name] = metadata
+        # one task per file (largest first)
+        load_files = sorted(
+            (
+                (file_path, table_name)
+                for table_name, file_paths in table_files.items()
+                for file_path in file_paths
+            ),
+            key=lambda load_file: os.path.getsize(load_file[0]),
+            reverse=True
+        )
+        tasks = [
+            ("file2table", (file_path, table_name, table_metadata[table_name]), {"batch_size": batch_size, "commit_every": commit_every})
+            for file_path, table_name in load_files
+        ]
+        # rows loaded per table
+        table_rows = dict.fromkeys(table_files, 0)
+        loaded_files = []
+
+        def on_result(task_index, num_rows):
+            # count rows
+            file_path, table_name = load_files[task_index]
+            table_rows[table_name] += num_rows
+            loaded_files.append(file_path)
+            # log progress
+            logger.info(
+                "loaded file %s/%s: %s into table: %s (%s rows)" % (
+                    len(loaded_files),
+                    len(load_files),
+                    file_path,
+                    table_name,
+                    num_rows
+                )
+            )
+            # report file
+            if on_file is not None:
+                on_file(file_path)
+        # load files
+        self.run_tasks(tasks, workers=workers, on_result=on_result)
+        # return rows per table
+        return table_rows
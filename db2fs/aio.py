@@ -0,0 +1,617 @@
+# async db drivers (optional)
+try:
+    import asyncpg
+except ImportError:
+    asyncpg = None
+try:
+    import aiomysql
+except ImportError:
+    aiomysql = None
+# connection free sql building, paths & stats
+from db2fs import ExtractorFunctions
+# file writers
+from db2fs.writers import (
+    CSVBatchWriter,
+    NDJSONBatchWriter,
+    ArrowBatchConverter,
+    ParquetBatchWriter,
+    FeatherBatchWriter
+)
+# postgres binary COPY decoder
+from db2fs.pgbinary import BinaryCopyDecoder
+# compressed output
+from db2fs.compression import open_compressed, COMPRESSION_EXTENSIONS
+# event loop
+import asyncio
+import functools
+from contextlib import asynccontextmanager
+# io
+import io
+import os
+import json
+import re
+import time
+# logging
+import logging
+# config logger
+logger = logging.getLogger(__name__)
+
+# pyformat placeholders (%s) & escaped percent signs (%%)
+PYFORMAT_PATTERN = re.compile(r"%%|%s")
+
+
+def to_numbered_params(query):
+    """
+        convert a pyformat query (%s placeholders, %% for literal
+        percent signs) into a postgres query with numbered ($1, $2 ...)
+        placeholders as used by asyncpg
+
+        params:
+            - query: sql statement using %s placeholders
+    """
+    # placeholder counter
+    counter = iter(range(1, len(query) + 1))
+    # replace placeholders in order
+    return PYFORMAT_PATTERN.sub(
+        lambda match: "%" if match.group() == "%%" else "$%d" % next(counter),
+        query
+    )
+
+
+def get_copy_rows(status):
+    """
+        get number of rows copied from a COPY status ("COPY n")
+
+        params:
+            - status: status returned by asyncpg copy functions
+    """
+    return int(status.split()[-1])
+
+
+class AsyncDatabaseExtractor(ExtractorFunctions):
+    """
+        asyncio version of DatabaseExtractor table2csv / table2other /
+        db2csv / db2other for services running an event loop. postgres
+        is read with asyncpg (csv & binary COPY streamed chunk by chunk)
+        & mysql with aiomysql (unbuffered cursors). at most concurrency
+        queries run at a time: every query holds a semaphore slot & a
+        connection of a pool of the same size. file writes, compression
+        & arrow conversion run in the loop's default thread pool so
+        they don't block the event loop. sql is built & validated
+        by the ExtractorFunctions DatabaseExtractor uses so files match
+        the sync api (no sync connection is opened)
+
+        init params:
+            - connection_info: relational db connection info (see
+                               DatabaseExtractor)
+            - download_dir_name: name of download dir
+            - download_dir_path: path of download dir
+            - fetch_size: rows fetched per round trip
+            - concurrency: max queries (tables) running at a time
+    """
+    def __init__(self, connection_info, download_dir_name="downloaded", download_dir_path=None, fetch_size=10000, concurrency=4):
+        self.connection_info = connection_info
+        # specify download dir info
+        self.download_dir_name = download_dir_name
+        self.download_dir_path = download_dir_path
+        self.fetch_size = fetch_size
+        # run stats per written file
+        self.stats = {}
+        # concurrency limit
+        self.concurrency = concurrency
+        # connection pool, semaphore & pool lock (created in the
+        # running loop)
+        self.pool = None
+        self.semaphore = None
+        self.pool_lock = None
+
+    async def get_pool(self):
+        """
+            get (& create if needed) the connection pool. concurrent
+            first callers wait for a single pool to be created
+        """
+        if self.pool is not None:
+            return self.pool
+        # create lock in running loop
+        if self.pool_lock is None:
+            self.pool_lock = asyncio.Lock()
+        async with self.pool_lock:
+            # created while waiting for the lock
+            if self.pool is None:
+                self.pool = await self.create_pool()
+        return self.pool
+
+    async def create_pool(self):
+        """
+            create a connection pool of concurrency connections
+        """
+        # postgres
+        if self.connection_info["engine"] == "pg":
+            if asyncpg is None:
+                raise ImportError("asyncpg is required for async postgres extraction")
+
+            async def init_connection(conn):
+                # decode json like psycopg2 does
+                for type_name in ("json", "jsonb"):
+                    await conn.set_type_codec(type_name, encoder=json.dumps, decoder=json.loads, schema="pg_catalog")
+            # create pool
+            pool = await asyncpg.create_pool(
+                host=self.connection_info["host"],
+                port=self.connection_info["port"],
+                user=self.connection_info["user"],
+                password=self.connection_info.get("password"),
+                database=self.connection_info["database"],
+                min_size=1,
+                max_size=self.concurrency,
+                init=init_connection
+            )
+        # mysql
+        elif self.connection_info["engine"] == "mysql":
+            if aiomysql is None:
+                raise ImportError("aiomysql is required for async mysql extraction")
+            # create pool (autocommit so pooled connections never
+            # keep reading from an old snapshot)
+            pool = await aiomysql.create_pool(
+                host=self.connection_info["host"],
+                port=int(self.connection_info["port"]),
+                user=self.connection_info["user"],
+                password=self.connection_info.get("password") or "",
+                db=self.connection_info["database"],
+                minsize=1,
+                maxsize=self.concurrency,
+                autocommit=True
+            )
+        # log
+        logger.info("opened pool of %s connections" % self.concurrency)
+        return pool
+
+    async def run_blocking(self, func, *args):
+        """
+            run a blocking call (file writes, compression, arrow
+            conversion) in the default thread pool of the running loop
+
+            params:
+                - func: function to call
+                - args: arguments passed to func
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(func, *args))
+
+    @asynccontextmanager
+    async def acquire(self):
+        """
+            wait for a free slot & get a pooled connection. slots must
+            not be acquired while holding one (no nested acquires)
+        """
+        # create semaphore in running loop
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+        async with self.semaphore:
+            pool = await self.get_pool()
+            # postgres
+            if self.connection_info["engine"] == "pg":
+                async with pool.acquire() as conn:
+                    yield conn
+            # mysql
+            elif self.connection_info["engine"] == "mysql":
+                async with pool.acquire() as conn:
+                    yield conn
+
+    async def close(self):
+        """
+            close the connection pool
+        """
+        if self.pool is None:
+            return
+        # postgres
+        if self.connection_info["engine"] == "pg":
+            await self.pool.close()
+        # mysql
+        elif self.connection_info["engine"] == "mysql":
+            self.pool.close()
+            await self.pool.wait_closed()
+        self.pool = None
+        self.semaphore = None
+        self.pool_lock = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def fetch(self, query, params=None):
+        """
+            run a (catalog) query & return all rows
+
+            params:
+                - query: sql statement using %s placeholders
+                - params: values to format into query
+        """
+        async with self.acquire() as conn:
+            # postgres
+            if self.connection_info["engine"] == "pg":
+                return await conn.fetch(to_numbered_params(query), *(params or ()))
+            # mysql
+            elif self.connection_info["engine"] == "mysql":
+                async with conn.cursor() as cursor:
+                    await cursor.execute(query, params)
+                    return await cursor.fetchall()
+
+    async def get_tables(self):
+        """
+            get names of all tables in db
+        """
+        rows = await self.fetch(self.get_tables_query())
+        return [row[0] for row in rows]
+
+    async def get_columns(self, table_name):
+        """
+            get column names of a table from the catalog
+
+            params:
+                - table_name: name of table
+        """
+        rows = await self.fetch(*self.get_columns_query(table_name))
+        return [row[0] for row in rows]
+
+    async def build_filters(self, table_name, columns=None, where=None, order_by=None):
+        """
+            validate a column projection / filters / sort order
+            against the catalog (see DatabaseExtractor.build_filters)
+
+            params:
+                - table_name: name of table
+                - columns: list of columns to select
+                - where: condition or list of conditions
+                - order_by: column or list of columns / (column, "DESC")
+            returns:
+                - (columns, where, params, order_by)
+        """
+        # convert filters
+        columns, where, params, order_by, used_columns = self.parse_filters(columns, where, order_by)
+        # validate columns against catalog
+        if used_columns:
+            self.check_columns(table_name, used_columns, await self.get_columns(table_name))
+        return columns, where, params, order_by
+
+    async def build_table_select(self, table_name, columns=None, where=None, order_by=None):
+        """
+            build the (validated) select statement of a table
+
+            params:
+                - table_name: name of table
+                - columns / where / order_by: see build_filters
+            returns:
+                - (select statement, params)
+        """
+        # validated projection, conditions & sort order
+        columns, where, params, order_by = await self.build_filters(table_name, columns, where, order_by)
+        # select statement
+        return self.build_select(table_name, where, columns, order_by), params
+
+    async def get_binary_description(self, conn, table_name, select_query):
+        """
+            get the cursor style description of a postgres select
+            statement (without running it)
+
+            params:
+                - conn: asyncpg connection
+                - table_name: name of table selected from
+                - select_query: select statement ($n placeholders)
+        """
+        # column types of query
+        statement = await conn.prepare(select_query)
+        attributes = statement.get_attributes()
+        # precision & scale of numeric table columns (asyncpg
+        # doesn't report type modifiers of result columns)
+        modifiers = {}
+        if any(attribute.type.oid == 1700 for attribute in attributes):
+            modifiers = dict(await conn.fetch(
+                "SELECT attname, atttypmod FROM pg_attribute "
+                "WHERE attrelid = to_regclass($1) AND attnum > 0 AND NOT attisdropped;",
+                self.quote_identifier(table_name)
+            ))
+        # name, type code, display size, internal size, precision, scale, null ok
+        description = []
+        for attribute in attributes:
+            precision, scale = None, None
+            # numeric(precision, scale)
+            type_modifier = modifiers.get(attribute.name, -1)
+            if attribute.type.oid == 1700 and type_modifier >= 4:
+                precision = ((type_modifier - 4) >> 16) & 0xFFFF
+                scale = (type_modifier - 4) & 0xFFFF
+            description.append((attribute.name, attribute.type.oid, None, None, precision, scale, None))
+        return description
+
+    async def query2batches(self, conn, select_query, params):
+        """
+            stream result of a select statement in batches of
+            fetch_size rows
+
+            params:
+                - conn: pooled connection
+                - select_query: select statement using %s placeholders
+                - params: values to format into select_query
+            yields:
+                - (description, list of rows). the first batch is
+                  always yielded (even if empty)
+        """
+        # postgres
+        if self.connection_info["engine"] == "pg":
+            # cursors live in a transaction
+            async with conn.transaction(readonly=True):
+                statement = await conn.prepare(to_numbered_params(select_query))
+                # column names
+                description = [(attribute.name, attribute.type.oid) for attribute in statement.get_attributes()]
+                cursor = await statement.cursor(*params)
+                # read first batch
+                rows = await cursor.fetch(self.fetch_size)
+                yield description, rows
+                # read remaining batches
+                while len(rows) == self.fetch_size:
+                    rows = await cursor.fetch(self.fetch_size)
+                    if rows:
+                        yield description, rows
+        # mysql
+        elif self.connection_info["engine"] == "mysql":
+            # unbuffered cursor streams rows from the server
+            cursor = await conn.cursor(aiomysql.SSCursor)
+            try:
+                await cursor.execute(select_query, params)
+                # read first batch
+                rows = await cursor.fetchmany(self.fetch_size)
+                yield cursor.description, rows
+                # read remaining batches
+                while rows:
+                    rows = await cursor.fetchmany(self.fetch_size)
+                    if rows:
+                        yield cursor.description, rows
+            finally:
+                # read rest of result (frees the connection)
+                await cursor.close()
+
+    async def table2csv(self, table_name, file_name=None, compression=None, columns=None, where=None, order_by=None, header=True):
+        """
+            convert single table to csv (see DatabaseExtractor.table2csv)
+
+            params:
+                - table_name: name of table to download
+                - file_name: local file name to save table to
+                - compression: None, "gzip", "bz2", "zstd" or "lz4"
+                - columns: list of columns to export (default all)
+                - where: condition or list of conditions
+                - order_by: column or list of columns / (column, "DESC")
+                - header: whether to write column names
+            returns:
+                - local file path
+        """
+        # select statement
+        select_query, params = await self.build_table_select(table_name, columns, where, order_by)
+        # build local file path
+        local_file_path = self.get_local_file_path(
+            table_name,
+            file_name,
+            extension=".csv" + COMPRESSION_EXTENSIONS.get(compression, "")
+        )
+        # start time & memory high-water mark
+        start_time = time.time()
+        start_memory = self.get_peak_memory()
+        # write to a temp file & rename it once complete
+        tmp_file_path = local_file_path + ".tmp"
+        try:
+            async with self.acquire() as conn:
+                with open_compressed(tmp_file_path, compression) as out_file:
+                    # postgres
+                    if self.connection_info["engine"] == "pg":
+
+                        async def write_chunk(data):
+                            await self.run_blocking(out_file.write, data)
+                        # stream server side csv
+                        status = await conn.copy_from_query(
+                            to_numbered_params(select_query),
+                            *params,
+                            output=write_chunk,
+                            format="csv",
+                            header=header
+                        )
+                        # number of rows copied
+                        num_rows = get_copy_rows(status)
+                    # mysql
+                    elif self.connection_info["engine"] == "mysql":
+                        csv_writer = None
+                        # text layer on top of binary output
+                        text_file = io.TextIOWrapper(out_file, encoding="utf-8", newline="")
+                        async for description, rows in self.query2batches(conn, select_query, params):
+                            # same format as postgres COPY
+                            if csv_writer is None:
+                                csv_writer = CSVBatchWriter(
+                                    text_file,
+                                    columns=[column[0] for column in description] if header else None
+                                )
+                            await self.run_blocking(csv_writer.write_rows, rows)
+                        # flush text layer (output closed below)
+                        await self.run_blocking(text_file.flush)
+                        text_file.detach()
+                        num_rows = csv_writer.num_rows
+        except BaseException:
+            # remove partial output
+            if os.path.exists(tmp_file_path):
+                os.remove(tmp_file_path)
+            raise
+        # publish csv
+        os.replace(tmp_file_path, local_file_path)
+        # save stats
+        self.record_stats(local_file_path, rows=num_rows, seconds=time.time() - start_time, start_memory=start_memory)
+        return local_file_path
+
+    async def table2other(self, table_name, file_type=".parquet", file_name=None, compression=None, columns=None, where=None, order_by=None):
+        """
+            convert a single table to ".parquet", ".feather" or
+            ".jsonl" / ".ndjson" (see DatabaseExtractor.table2other)
+
+            params:
+                - table_name: name of table to download
+                - file_type: file type to convert table to
+                - file_name: name of file
+                - compression: None, "gzip", "bz2", "zstd" or "lz4"
+                               (".jsonl" only)
+                - columns: list of columns to export (default all)
+                - where: condition or list of conditions
+                - order_by: column or list of columns / (column, "DESC")
+            returns:
+                - local file path
+        """
+        # streamed formats only
+        if file_type not in (".parquet", ".feather", ".jsonl", ".ndjson"):
+            raise ValueError("unsupported file type: %s (use .parquet, .feather or .jsonl)" % file_type)
+        # select statement
+        select_query, params = await self.build_table_select(table_name, columns, where, order_by)
+        # start time & memory high-water mark
+        start_time = time.time()
+        start_memory = self.get_peak_memory()
+        if file_type in (".parquet", ".feather"):
+            # file writer
+            writer_cls = ParquetBatchWriter if file_type == ".parquet" else FeatherBatchWriter
+            # build local file path
+            local_file_path = self.get_local_file_path(table_name, file_name, extension=file_type)
+            # write to a temp file & rename it once complete
+            tmp_file_path = local_file_path + ".tmp"
+            try:
+                async with self.acquire() as conn:
+                    # postgres
+                    if self.connection_info["engine"] == "pg":
+                        select_query = to_numbered_params(select_query)
+                        # columns to copy (exotic types as text)
+                        description, copy_select = self.build_binary_select(
+                            select_query,
+                            await self.get_binary_description(conn, table_name, select_query)
+                        )
+                        # decode binary COPY into arrow batches
+                        decoder = BinaryCopyDecoder(description, on_batch=None, batch_rows=self.fetch_size)
+                        file_writer = writer_cls(tmp_file_path, decoder)
+                        decoder.on_batch = file_writer.write_batch
+
+                        async def write_chunk(data):
+                            await self.run_blocking(decoder.write, data)
+                        # stream binary COPY
+                        await conn.copy_from_query(copy_select, *params, output=write_chunk, format="binary")
+                        # convert remaining rows
+                        await self.run_blocking(decoder.flush)
+                    # mysql
+                    elif self.connection_info["engine"] == "mysql":
+                        file_writer = None
+                        async for description, rows in self.query2batches(conn, select_query, params):
+                            # init writer using db column types
+                            if file_writer is None:
+                                file_writer = writer_cls(
+                                    tmp_file_path,
+                                    ArrowBatchConverter(self.connection_info["engine"], description)
+                                )
+                            await self.run_blocking(file_writer.write_rows, rows)
+                    # write remaining rows
+                    await self.run_blocking(file_writer.close)
+            except BaseException:
+                # remove partial output
+                if os.path.exists(tmp_file_path):
+                    os.remove(tmp_file_path)
+                raise
+            # publish file
+            os.replace(tmp_file_path, local_file_path)
+            num_rows = file_writer.num_rows
+        else:
+            # build local file path (add compression extension)
+            local_file_path = self.get_local_file_path(
+                table_name,
+                file_name,
+                extension=file_type + COMPRESSION_EXTENSIONS.get(compression, "")
+            )
+            # write to a temp file & rename it once complete
+            tmp_file_path = local_file_path + ".tmp"
+            try:
+                async with self.acquire() as conn:
+                    with open_compressed(tmp_file_path, compression) as out_file:
+                        json_writer = None
+                        async for description, rows in self.query2batches(conn, select_query, params):
+                            # init writer using column names
+                            if json_writer is None:
+                                json_writer = NDJSONBatchWriter(out_file, [column[0] for column in description])
+                            await self.run_blocking(json_writer.write_rows, rows)
+            except BaseException:
+                # remove partial output
+                if os.path.exists(tmp_file_path):
+                    os.remove(tmp_file_path)
+                raise
+            # publish json
+            os.replace(tmp_file_path, local_file_path)
+            num_rows = json_writer.num_rows
+        # save stats
+        self.record_stats(local_file_path, rows=num_rows, seconds=time.time() - start_time, start_memory=start_memory)
+        return local_file_path
+
+    async def run_tables(self, method_name, kwargs=None, table_kwargs=None):
+        """
+            run an async extractor method for every table in db
+            (concurrency tables at a time). if one table fails the
+            others are cancelled
+
+            params:
+                - method_name: method to run e.g. table2csv
+                - kwargs: keyword arguments passed to the method
+                - table_kwargs: dict of table name -> extra keyword
+                                arguments for that table
+            returns:
+                - list of method results (same order as get_tables)
+        """
+        # get tables
+        all_tables = await self.get_tables()
+        # use empty mapping if not specified
+        table_kwargs = table_kwargs or {}
+        # one task per table
+        tasks = [
+            asyncio.ensure_future(getattr(self, method_name)(
+                table_name,
+                **dict(kwargs or {}, **table_kwargs.get(table_name, {}))
+            ))
+            for table_name in all_tables
+        ]
+        try:
+            return await asyncio.gather(*tasks)
+        except BaseException:
+            # stop remaining tables
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+    async def db2csv(self, compression=None, table_options=None):
+        """
+            convert all tables in db to csv
+
+            params:
+                - compression: None, "gzip", "bz2", "zstd" or "lz4"
+                - table_options: dict of table name -> dict of columns /
+                                 where / order_by (see table2csv)
+        """
+        return await self.run_tables(
+            "table2csv",
+            kwargs={"compression": compression},
+            table_kwargs=table_options
+        )
+
+    async def db2other(self, file_type=".parquet", compression=None, table_options=None):
+        """
+            convert all tables in db to a given file type
+
+            params:
+                - file_type: ".parquet", ".feather" or ".jsonl" / ".ndjson"
+                - compression: None, "gzip", "bz2", "zstd" or "lz4"
+                               (".jsonl" only)
+                - table_options: dict of table name -> dict of columns /
+                                 where / order_by (see table2other)
+        """
+        return await self.run_tables(
+            "table2other",
+            kwargs={"file_type": file_type, "compression": compression},
+            table_kwargs=table_options
+        )
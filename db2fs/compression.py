@@ -0,0 +1,238 @@
+# compression codecs (stdlib)
+import zlib
+import bz2
+# optional codecs
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+# io
+import io
+# background compression
+import queue
+import threading
+
+# file extension added for each codec
+COMPRESSION_EXTENSIONS = {
+    None: "",
+    "gzip": ".gz",
+    "bz2": ".bz2",
+    "zstd": ".zst",
+    "lz4": ".lz4",
+}
+
+
+def get_compressor(compression):
+    """
+        get a streaming compressor for a codec
+
+        params:
+            - compression: "gzip", "bz2", "zstd" or "lz4"
+        returns:
+            - (compress function, flush function)
+    """
+    # gzip (zlib with gzip header / trailer)
+    if compression == "gzip":
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        return compressor.compress, compressor.flush
+    # bzip2
+    elif compression == "bz2":
+        compressor = bz2.BZ2Compressor()
+        return compressor.compress, compressor.flush
+    # zstandard (optional dependency)
+    elif compression == "zstd":
+        if zstandard is None:
+            raise ImportError("zstd compression requires the zstandard package (pip install db2fs[zstd])")
+        compressor = zstandard.ZstdCompressor(threads=-1).compressobj()
+        return compressor.compress, compressor.flush
+    # lz4 (optional dependency)
+    elif compression == "lz4":
+        if lz4 is None:
+            raise ImportError("lz4 compression requires the lz4 package (pip install db2fs[lz4])")
+        compressor = lz4.frame.LZ4FrameCompressor()
+        # frame header goes before the first block
+        header = [compressor.begin()]
+        def compress(data):
+            return (header.pop() if header else b"") + compressor.compress(data)
+        def flush():
+            return (header.pop() if header else b"") + compressor.flush()
+        return compress, flush
+    # unknown codec
+    raise ValueError(
+        "unsupported compression: %s (expected one of %s)" % (
+            compression,
+            [codec for codec in COMPRESSION_EXTENSIONS if codec is not None]
+        )
+    )
+
+
+class CompressedFileWriter(io.RawIOBase):
+    """
+        binary file object compressing everything written to it
+        in a background thread so compression overlaps with reading
+        from the db. writes are collected into chunks of chunk_size
+        bytes & at most max_pending chunks wait for the compressor
+        (writers block when it falls behind)
+
+        init params:
+            - out_file: binary file object compressed data goes to
+            - compression: "gzip", "bz2", "zstd" or "lz4"
+            - chunk_size: bytes handed to the compressor at a time
+            - max_pending: chunks allowed to wait for the compressor
+    """
+    def __init__(self, out_file, compression, chunk_size=1 << 20, max_pending=8):
+        # file compressed data goes to
+        self.out_file = out_file
+        # compressor
+        self.compress, self.flush_compressor = get_compressor(compression)
+        # uncompressed bytes not handed over yet
+        self.chunk = bytearray()
+        self.chunk_size = chunk_size
+        # chunks waiting for the compressor (None = done)
+        self.pending = queue.Queue(maxsize=max_pending)
+        # error raised in compressor thread
+        self.error = None
+        # output is being dropped
+        self.aborted = False
+        # start compressor thread
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        """
+            compress chunks until None is received
+        """
+        while True:
+            # next chunk
+            chunk = self.pending.get()
+            # keep draining after errors so writers don't block
+            if self.error is not None or self.aborted:
+                if chunk is None:
+                    return
+                continue
+            try:
+                # end of data
+                if chunk is None:
+                    self.out_file.write(self.flush_compressor())
+                    return
+                # compress chunk
+                self.out_file.write(self.compress(chunk))
+            except Exception as err:
+                # raised in writer thread
+                self.error = err
+
+    def check_error(self):
+        """
+            re-raise errors of the compressor thread
+        """
+        if self.error is not None:
+            raise self.error
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        """
+            add data to be compressed
+
+            params:
+                - data: bytes (like) object
+        """
+        # fail early
+        self.check_error()
+        # collect data
+        self.chunk += data
+        # hand full chunks to the compressor
+        if len(self.chunk) >= self.chunk_size:
+            self.pending.put(bytes(self.chunk))
+            self.chunk = bytearray()
+        return len(data)
+
+    def close(self):
+        """
+            compress remaining data, wait for compressor & close file
+        """
+        if self.closed:
+            return
+        try:
+            # hand remaining data over
+            if self.chunk:
+                self.pending.put(bytes(self.chunk))
+                self.chunk = bytearray()
+            # tell compressor to finish
+            self.pending.put(None)
+            self.thread.join()
+            # close output
+            self.out_file.close()
+        finally:
+            super().close()
+        # report compressor errors
+        self.check_error()
+
+    def abort(self):
+        """
+            stop compressing & drop the output (aborts uploads)
+        """
+        if self.closed:
+            return
+        try:
+            # compressor skips remaining chunks
+            self.aborted = True
+            self.pending.put(None)
+            self.thread.join()
+            # drop output
+            if hasattr(self.out_file, "abort"):
+                self.out_file.abort()
+            else:
+                self.out_file.close()
+        finally:
+            super().close()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # only finish the output if no error occurred
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def wrap_compressed(out_file, compression=None):
+    """
+        compress everything written to a binary file object (e.g.
+        an upload stream) on the fly (in a background thread)
+
+        params:
+            - out_file: writable binary file object
+            - compression: None, "gzip", "bz2", "zstd" or "lz4"
+        returns:
+            - writable binary file object
+    """
+    # no compression
+    if compression is None:
+        return out_file
+    # compress in background
+    return CompressedFileWriter(out_file, compression)
+
+
+def open_compressed(file_path, compression=None):
+    """
+        open a binary file for writing, compressing everything
+        written to it on the fly (in a background thread)
+
+        params:
+            - file_path: location on disk to write to
+            - compression: None, "gzip", "bz2", "zstd" or "lz4"
+        returns:
+            - writable binary file object
+    """
+    # no compression
+    if compression is None:
+        return open(file_path, "wb")
+    # fail before creating the file for unknown codecs
+    get_compressor(compression)
+    # compress in background
+    return CompressedFileWriter(open(file_path, "wb"), compression)
@@ -8,9 +8,87 @@ import json
 # os
 import os
 import glob
+# streaming uploads
+from db2fs.connectors.stream import UploadStream
 # config logger
 logger = logging.getLogger(__name__)
 
+# multipart upload limits
+S3_MAX_PARTS = 10000
+S3_MAX_PART_SIZE = 5 << 30
+
+
+class S3UploadStream(UploadStream):
+    """
+        stream data into an S3 object with a multipart upload (parts
+        are uploaded in parallel, small objects with one put_object)
+
+        init params:
+            - s3_client: boto3 s3 client (thread safe)
+            - bucket_name: name of bucket
+            - key: object key
+            - part_size: bytes per first part (S3 needs at least 5 MiB
+                         & allows 10000 parts per object, so the part
+                         size grows as the upload gets large)
+            - max_in_flight: parts uploading at a time
+    """
+    def __init__(self, s3_client, bucket_name, key, part_size=8 << 20, max_in_flight=4):
+        # init buffers
+        super().__init__(
+            part_size=part_size,
+            max_in_flight=max_in_flight,
+            max_parts=S3_MAX_PARTS,
+            max_part_size=S3_MAX_PART_SIZE
+        )
+        # object info
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.key = key
+        # multipart upload id
+        self.upload_id = None
+
+    def upload_whole(self, data):
+        # single request
+        self.s3_client.put_object(Bucket=self.bucket_name, Key=self.key, Body=data)
+
+    def start_upload(self):
+        # create multipart upload
+        self.upload_id = self.s3_client.create_multipart_upload(
+            Bucket=self.bucket_name,
+            Key=self.key
+        )["UploadId"]
+
+    def upload_part(self, part_number, offset, data, last):
+        # upload part
+        response = self.s3_client.upload_part(
+            Bucket=self.bucket_name,
+            Key=self.key,
+            UploadId=self.upload_id,
+            PartNumber=part_number,
+            Body=data
+        )
+        # etag is needed to complete the upload
+        return {"ETag": response["ETag"], "PartNumber": part_number}
+
+    def complete_upload(self, parts):
+        # assemble object from parts
+        self.s3_client.complete_multipart_upload(
+            Bucket=self.bucket_name,
+            Key=self.key,
+            UploadId=self.upload_id,
+            MultipartUpload={"Parts": parts}
+        )
+
+    def abort_upload(self):
+        # log
+        logger.error("aborting upload of: s3://%s/%s" % (self.bucket_name, self.key))
+        # drop uploaded parts
+        self.s3_client.abort_multipart_upload(
+            Bucket=self.bucket_name,
+            Key=self.key,
+            UploadId=self.upload_id
+        )
+
 class AWSS3Middleware:
     """
         connect to an AWS S3 + provide general
@@ -124,8 +202,57 @@ class AWSS3Middleware:
             # exit
             return
         # upload file
-        bucket.upload_file(local_file_path, bucket_name, key)
+        bucket.upload_file(local_file_path, key)
+
+    def get_bucket_file_size(self, bucket_name, key):
+        """
+            get size of an object in a bucket
+
+            params:
+                - bucket_name: name of AWS S3 bucket
+                - key: object key
+            returns:
+                - size in bytes or None if the object doesn't exist
+        """
+        try:
+            # read object metadata
+            return self.s3_resource.meta.client.head_object(Bucket=bucket_name, Key=key)["ContentLength"]
+        except ClientError:
+            # log
+            logger.error(
+                "object: %s not found in bucket: %s" % (key, bucket_name)
+            )
+            # exit
+            return
     
+    def open_bucket_stream(self, bucket_name, key, prefix=None, part_size=8 << 20, max_in_flight=4):
+        """
+            open a writable binary stream uploading straight into a
+            bucket (no local file). the object is published when the
+            stream is closed & dropped if a with block raises
+
+            params:
+                - bucket_name: name of AWS S3 bucket
+                - key: object key
+                - prefix: prefix added to key
+                - part_size: bytes per multipart upload part
+                - max_in_flight: parts uploading at a time
+            returns:
+                - S3UploadStream
+        """
+        # if prefix is specified
+        if prefix is not None:
+            # update key
+            key = os.path.join(prefix, key)
+        # stream into object
+        return S3UploadStream(
+            self.s3_resource.meta.client,
+            bucket_name,
+            key,
+            part_size=part_size,
+            max_in_flight=max_in_flight
+        )
+
     def upload_bucket_dir(self, bucket_name, local_dir_path, prefix=None):
         # get all files in dir
         all_files = glob.glob(os.path.join(local_dir_path, "*.*"))
@@ -8,9 +8,61 @@ import os
 import glob
 # path
 from pathlib import Path
+# streaming uploads
+from db2fs.connectors.stream import UploadStream
 # config logger
 logger = logging.getLogger(__name__)
 
+# block blob limits
+AZURE_MAX_BLOCKS = 50000
+AZURE_MAX_BLOCK_SIZE = 4000 << 20
+
+
+class AzureUploadStream(UploadStream):
+    """
+        stream data into a block blob by staging blocks in parallel
+        & committing the block list on close (small blobs are
+        uploaded with one request). uncommitted blocks of an aborted
+        upload are discarded by azure
+
+        init params:
+            - blob_client: azure blob client
+            - block_size: bytes per block
+            - max_in_flight: blocks uploading at a time
+    """
+    def __init__(self, blob_client, block_size=8 << 20, max_in_flight=4):
+        # init buffers
+        super().__init__(
+            part_size=block_size,
+            max_in_flight=max_in_flight,
+            max_parts=AZURE_MAX_BLOCKS,
+            max_part_size=AZURE_MAX_BLOCK_SIZE
+        )
+        # blob info
+        self.blob_client = blob_client
+
+    def upload_whole(self, data):
+        # single request
+        self.blob_client.upload_blob(data, overwrite=True)
+
+    def start_upload(self):
+        # blocks are staged on the blob directly
+        pass
+
+    def upload_part(self, part_number, offset, data, last):
+        # block ids of a blob must have the same length
+        block_id = "%010d" % part_number
+        self.blob_client.stage_block(block_id, data)
+        return block_id
+
+    def complete_upload(self, parts):
+        # publish blob from blocks
+        self.blob_client.commit_block_list(parts)
+
+    def abort_upload(self):
+        # log (staged blocks expire on their own)
+        logger.error("aborting upload of: %s" % self.blob_client.url)
+
 
 class AzureStorageMiddleware:
     """
@@ -126,6 +178,52 @@ class AzureStorageMiddleware:
             # exit
             return
 
+    def get_container_file_size(self, container_name, key):
+        """
+            get size of a blob in a container
+
+            params:
+                - container_name: name of Azure Storage container
+                - key: blob name
+            returns:
+                - size in bytes or None if the blob doesn't exist
+        """
+        try:
+            # read blob properties
+            blob_client = self.blob_service_client.get_blob_client(container=container_name, blob=key)
+            return blob_client.get_blob_properties().size
+        except ResourceNotFoundError:
+            # log
+            logger.error(
+                "blob: %s not found in container: %s" % (key, container_name)
+            )
+            # exit
+            return
+
+    def open_container_stream(self, container_name, key, prefix=None, block_size=8 << 20, max_in_flight=4):
+        """
+            open a writable binary stream uploading straight into a
+            container (no local file). the blob is published when the
+            stream is closed & dropped if a with block raises
+
+            params:
+                - container_name: name of Azure Storage container
+                - key: blob name
+                - prefix: prefix added to key
+                - block_size: bytes per staged block
+                - max_in_flight: blocks uploading at a time
+            returns:
+                - AzureUploadStream
+        """
+        # if prefix is specified
+        if prefix is not None:
+            # update key
+            key = os.path.join(prefix, key)
+        # init blob client
+        blob_client = self.blob_service_client.get_blob_client(container=container_name, blob=key)
+        # stream into blob
+        return AzureUploadStream(blob_client, block_size=block_size, max_in_flight=max_in_flight)
+
     def upload_container_dir(self, bucket_name, local_dir_path, prefix=None):
         # get all files in dir
         all_files = glob.glob(os.path.join(local_dir_path, "*.*"))
@@ -4,14 +4,93 @@ import logging
 from google.cloud import storage
 from google.api_core import exceptions
 from google.oauth2 import service_account
+from google.auth.transport.requests import AuthorizedSession
 # json
 import json
 # os
 import os
 import glob
+# streaming uploads
+from db2fs.connectors.stream import UploadStream
 # config logger
 logger = logging.getLogger(__name__)
 
+# resumable upload chunks have to be a multiple of 256 KiB
+RESUMABLE_CHUNK_MULTIPLE = 256 << 10
+
+
+class GCSUploadStream(UploadStream):
+    """
+        stream data into a GCS object with a resumable upload. chunks
+        have to be sent in order so one chunk uploads while the next
+        one is filled (small objects are uploaded with one request)
+
+        init params:
+            - storage_client: gcp storage client
+            - credentials: credentials used to send the chunks
+            - bucket_name: name of bucket
+            - key: blob name
+            - chunk_size: bytes per chunk (multiple of 256 KiB)
+    """
+    def __init__(self, storage_client, credentials, bucket_name, key, chunk_size=8 << 20):
+        # gcs rejects other chunk sizes
+        if chunk_size % RESUMABLE_CHUNK_MULTIPLE:
+            raise ValueError("chunk_size must be a multiple of %s bytes" % RESUMABLE_CHUNK_MULTIPLE)
+        # init buffers (resumable uploads are sequential)
+        super().__init__(part_size=chunk_size, max_in_flight=1)
+        # blob info
+        self.storage_client = storage_client
+        self.blob = storage_client.bucket(bucket_name).blob(key)
+        # authorized http session for the chunk requests
+        self.session = AuthorizedSession(credentials)
+        # resumable upload session
+        self.session_url = None
+        self.finalized = False
+
+    def upload_whole(self, data):
+        # single request
+        self.blob.upload_from_string(data, client=self.storage_client)
+
+    def start_upload(self):
+        # create resumable upload session
+        self.session_url = self.blob.create_resumable_upload_session(client=self.storage_client)
+
+    def send_chunk(self, data, content_range):
+        """
+            send a chunk of the resumable upload
+
+            params:
+                - data: chunk bytes
+                - content_range: value of the Content-Range header
+        """
+        # send chunk to the upload session
+        response = self.session.put(
+            self.session_url,
+            data=data,
+            headers={"Content-Range": content_range}
+        )
+        # 308 = chunk received, 200 / 201 = upload complete
+        if response.status_code not in (200, 201, 308):
+            raise exceptions.from_http_response(response)
+
+    def upload_part(self, part_number, offset, data, last):
+        # final chunk carries the object size
+        total = str(offset + len(data)) if last else "*"
+        self.send_chunk(data, "bytes %s-%s/%s" % (offset, offset + len(data) - 1, total))
+        self.finalized = last
+
+    def complete_upload(self, parts):
+        # size wasn't known when the last chunk was sent
+        if not self.finalized:
+            self.send_chunk(b"", "bytes */%s" % self.offset)
+
+    def abort_upload(self):
+        # log
+        logger.error("aborting upload of: gs://%s/%s" % (self.blob.bucket.name, self.blob.name))
+        # cancel session (gcs answers 499)
+        if self.session_url is not None:
+            self.session.delete(self.session_url)
+
 class GCPStorageMiddleware:
     """
         connect to a GCP storage account using
@@ -35,6 +114,8 @@ class GCPStorageMiddleware:
                 auth_dict = json.load(auth_file)
                 # get credentials from auth dict
                 credentials = service_account.Credentials.from_service_account_info(auth_dict)
+                # keep credentials for streaming uploads
+                self.credentials = credentials
                 # init gcp storage client with auth
                 self.storage_client = storage.Client(
                                         project=auth_dict["project_id"],
@@ -142,6 +223,53 @@ class GCPStorageMiddleware:
             )
         )
     
+    def get_bucket_file_size(self, bucket_name, key):
+        """
+            get size of a blob in a bucket
+
+            params:
+                - bucket_name: name of GCP bucket
+                - key: blob name
+            returns:
+                - size in bytes or None if the blob doesn't exist
+        """
+        try:
+            # read blob metadata
+            blob = self.storage_client.bucket(bucket_name).get_blob(key)
+        except exceptions.NotFound:
+            blob = None
+        # blob not found
+        if blob is None:
+            # log
+            logger.error(
+                "blob: %s not found in bucket: %s" % (key, bucket_name)
+            )
+            # exit
+            return
+        # return size
+        return blob.size
+
+    def open_bucket_stream(self, bucket_name, key, prefix=None, chunk_size=8 << 20):
+        """
+            open a writable binary stream uploading straight into a
+            bucket (no local file). the blob is published when the
+            stream is closed & dropped if a with block raises
+
+            params:
+                - bucket_name: name of GCP bucket
+                - key: blob name
+                - prefix: prefix added to key
+                - chunk_size: bytes per resumable upload chunk
+            returns:
+                - GCSUploadStream
+        """
+        # if prefix is specified
+        if prefix is not None:
+            # update key
+            key = os.path.join(prefix, key)
+        # stream into blob
+        return GCSUploadStream(self.storage_client, self.credentials, bucket_name, key, chunk_size=chunk_size)
+
     def upload_bucket_dir(self, bucket_name, local_dir_path, prefix=None):
         # get all files in dir
         all_files = glob.glob(os.path.join(local_dir_path, "*.*"))
@@ -0,0 +1,269 @@
+# process id (fork detection)
+import os
+# thread safety
+import threading
+# idle / wait times
+import time
+# logging
+import logging
+# config logger
+logger = logging.getLogger(__name__)
+
+# pools shared by all connectors of a process (see get_pool)
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _after_fork():
+    """
+        replace the registry lock in a forked child (it might have
+        been held by another thread of the parent)
+    """
+    global _pools_lock
+    _pools_lock = threading.Lock()
+
+
+# fork hooks only exist on posix
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+class ConnectionPool:
+    """
+        thread safe pool of db connections. connections are opened on
+        demand up to max_size & handed back with release. callers wait
+        (at most timeout seconds) while max_size connections are in
+        use. connections idle for longer than idle_timeout are closed
+        (min_size of them are kept open) & connections idle for longer
+        than check_interval are pinged before being handed out, so
+        connections dropped by the server are replaced transparently.
+
+        pools are fork aware: a child process never uses (or closes)
+        connections opened by its parent, which would break the
+        parent's sessions. it opens its own instead
+
+        init params:
+            - connect: function opening a connection (None on failure)
+            - check: function returning whether a connection still works
+            - min_size: connections kept open when idle
+            - max_size: max connections open at a time
+            - idle_timeout: seconds after which idle connections are closed
+            - check_interval: seconds of idleness after which connections
+                              are checked before use
+            - timeout: max seconds to wait for a connection (None = forever)
+    """
+    def __init__(self, connect, check, min_size=1, max_size=10, idle_timeout=300, check_interval=30, timeout=60):
+        # connection handling
+        self.connect = connect
+        self.check = check
+        # limits
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.check_interval = check_interval
+        self.timeout = timeout
+        # init state owned by this process
+        self.reset()
+        # connections inherited from a parent process (kept referenced
+        # so they are never closed by the garbage collector)
+        self.inherited = []
+
+    def reset(self):
+        """
+            start over with no connections (in the current process)
+        """
+        # guards idle & size
+        self.lock = threading.Condition()
+        # idle connections (conn, release time), most recently used last
+        self.idle = []
+        # open connections (idle + in use)
+        self.size = 0
+        # process owning the connections
+        self.pid = os.getpid()
+        # closed pools don't hand out connections
+        self.closed = False
+
+    def check_fork(self):
+        """
+            drop connections opened by the parent after a fork
+        """
+        if self.pid != os.getpid():
+            # the parent keeps using them: don't touch them
+            self.inherited.extend(conn for conn, released_at in self.idle)
+            self.reset()
+            # log
+            logger.info("connection pool reset after fork")
+
+    def take(self):
+        """
+            take an idle connection or reserve a slot for a new one
+            (waits while the pool is full)
+
+            returns:
+                - (connection, release time) or (None, None) if a new
+                  connection should be opened
+        """
+        # give up waiting at
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        # connections to close
+        expired = []
+        try:
+            with self.lock:
+                while True:
+                    if self.closed:
+                        raise ConnectionError("connection pool is closed")
+                    # close connections idle for too long
+                    expired.extend(self.expire_idle())
+                    # reuse most recently used connection
+                    if self.idle:
+                        return self.idle.pop()
+                    # room for a new connection
+                    if self.size < self.max_size:
+                        self.size += 1
+                        return None, None
+                    # wait for a release
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise TimeoutError(
+                            "no db connection available after %s seconds (max_size: %s)" % (self.timeout, self.max_size)
+                        )
+                    self.lock.wait(remaining)
+        finally:
+            # close outside of lock
+            for expired_conn in expired:
+                self.close_connection(expired_conn)
+
+    def expire_idle(self):
+        """
+            remove connections idle for longer than idle_timeout
+            (keeping min_size). must be called holding the lock
+
+            returns:
+                - list of removed connections (to be closed)
+        """
+        expired = []
+        now = time.monotonic()
+        # oldest first
+        while len(self.idle) > self.min_size and now - self.idle[0][1] > self.idle_timeout:
+            expired.append(self.idle.pop(0)[0])
+        self.size -= len(expired)
+        return expired
+
+    def acquire(self):
+        """
+            get a connection (release it once done)
+        """
+        # never hand out the parent's connections
+        self.check_fork()
+        while True:
+            conn, released_at = self.take()
+            # open a new connection
+            if conn is None:
+                try:
+                    conn = self.connect()
+                except BaseException:
+                    self.discard(None)
+                    raise
+                if conn is None:
+                    self.discard(None)
+                    raise ConnectionError("connecting to db failed")
+                return conn
+            # recently used connections are assumed to work
+            if time.monotonic() - released_at < self.check_interval or self.check(conn):
+                return conn
+            # replace broken connection
+            logger.warning("replacing broken db connection")
+            self.discard(conn)
+
+    def release(self, conn, discard=False):
+        """
+            hand a connection back (must be outside of a transaction)
+
+            params:
+                - conn: connection returned by acquire
+                - discard: close the connection instead of reusing it
+        """
+        # connection of the parent process
+        if self.pid != os.getpid():
+            self.inherited.append(conn)
+            return
+        if discard or self.closed:
+            self.discard(conn)
+            return
+        with self.lock:
+            self.idle.append((conn, time.monotonic()))
+            # close connections idle for too long
+            expired = self.expire_idle()
+            # wake up a waiting thread
+            self.lock.notify()
+        # close outside of lock
+        for expired_conn in expired:
+            self.close_connection(expired_conn)
+
+    def discard(self, conn):
+        """
+            close a connection & free its slot
+
+            params:
+                - conn: connection (None if it failed to open)
+        """
+        with self.lock:
+            self.size -= 1
+            self.lock.notify()
+        if conn is not None:
+            self.close_connection(conn)
+
+    def close_connection(self, conn):
+        """
+            close a connection ignoring errors (e.g. already dropped)
+
+            params:
+                - conn: connection to close
+        """
+        try:
+            conn.close()
+        except Exception as err:
+            logger.warning("closing db connection failed w/ err: %s" % str(err))
+
+    def close(self):
+        """
+            close idle connections & stop handing out new ones
+            (connections in use are closed once released)
+        """
+        self.check_fork()
+        with self.lock:
+            self.closed = True
+            idle, self.idle = self.idle, []
+            self.size -= len(idle)
+            self.lock.notify_all()
+        for conn, released_at in idle:
+            self.close_connection(conn)
+
+
+def get_pool(key, connect, check, **pool_options):
+    """
+        get the pool of a db (created on first use) so all connectors
+        of a process share one set of connections per db
+
+        params:
+            - key: hashable identifying the db & pool options
+            - connect: function opening a connection
+            - check: function returning whether a connection works
+            - pool_options: ConnectionPool init params
+    """
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None or pool.closed:
+            pool = _pools[key] = ConnectionPool(connect, check, **pool_options)
+        return pool
+
+
+def close_pools():
+    """
+        close all pools of the current process
+    """
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
@@ -2,17 +2,179 @@
 import logging
 # postgres dbapi
 import psycopg2
+# postgres binary COPY encoding
+from db2fs.pgbinary import BinaryCopyEncoder, is_binary_encodable
 # mysql dbapi
 import pymysql
-# csv processor
+# file sizes
+import os
+# batching
+import io
+# csv rows (pyarrow < 6)
 import csv
 # progress bars
 from tqdm import tqdm
-# pandas
+# columnar csv parsing
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.json as pa_json
+import pyarrow.parquet as pq
+# json files / nested values
+import json
 import pandas as pd
+# compressed csv files
+from db2fs.compression import COMPRESSION_EXTENSIONS
+# parallel loads
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from db2fs.csvsplit import split_csv, FileRange, StreamReader
+# csv formatting (pyarrow < 12)
+from db2fs.writers import CSVBatchWriter
+# pooled connections
+import functools
+# deprecated api
+import warnings
+from contextlib import contextmanager
+from db2fs.connectors.pool import get_pool
 # configure logger
 logger = logging.getLogger(__name__)
 
+# python types to db types (per engine)
+TYPE_MAPPINGS = {
+    # PostgreSQL types
+    "pg": {
+        "int": "REAL",
+        "int64": "REAL",
+        "str": "TEXT",
+        "datetime": "TIMESTAMP",
+        "date": "TIMESTAMP",
+        "float64": "REAL",
+        "Timestamp": "TIMESTAMP",
+        "dict": "JSON",
+        # arrow types (exact, see get_sql_type)
+        "arrow:bool": "BOOLEAN",
+        "arrow:int8": "SMALLINT",
+        "arrow:int16": "SMALLINT",
+        "arrow:int32": "INTEGER",
+        "arrow:int64": "BIGINT",
+        "arrow:uint8": "SMALLINT",
+        "arrow:uint16": "INTEGER",
+        "arrow:uint32": "BIGINT",
+        "arrow:uint64": "NUMERIC(20)",
+        "arrow:halffloat": "REAL",
+        "arrow:float": "REAL",
+        "arrow:double": "DOUBLE PRECISION",
+        "arrow:decimal": "NUMERIC",
+        "arrow:date": "DATE",
+        "arrow:time": "TIME",
+        "arrow:timestamp": "TIMESTAMP",
+        "arrow:timestamptz": "TIMESTAMPTZ",
+        "arrow:duration": "INTERVAL",
+        "arrow:string": "TEXT",
+        "arrow:binary": "BYTEA",
+        "arrow:nested": "JSONB"
+    },
+    # MySQL types
+    "mysql": {
+        "int": "BIGINT",
+        "int64": "BIGINT",
+        "str": "TEXT",
+        "datetime": "TEXT",
+        # temporary fix for datetime formatting
+        # in MySQL
+        "date": "TEXT",
+        "float64": "FLOAT",
+        "Timestamp": "TEXT",
+        "dict": "JSON",
+        # arrow types (exact, see get_sql_type)
+        "arrow:bool": "BOOLEAN",
+        "arrow:int8": "TINYINT",
+        "arrow:int16": "SMALLINT",
+        "arrow:int32": "INT",
+        "arrow:int64": "BIGINT",
+        "arrow:uint8": "TINYINT UNSIGNED",
+        "arrow:uint16": "SMALLINT UNSIGNED",
+        "arrow:uint32": "INT UNSIGNED",
+        "arrow:uint64": "BIGINT UNSIGNED",
+        "arrow:halffloat": "FLOAT",
+        "arrow:float": "FLOAT",
+        "arrow:double": "DOUBLE",
+        "arrow:decimal": "DECIMAL",
+        "arrow:date": "DATE",
+        "arrow:time": "TIME(6)",
+        "arrow:timestamp": "DATETIME(6)",
+        "arrow:timestamptz": "DATETIME(6)",
+        "arrow:string": "LONGTEXT",
+        "arrow:binary": "LONGBLOB",
+        "arrow:nested": "JSON"
+    }
+}
+
+# bytes of csv parsed per block (blocks are parsed on several threads)
+CSV_BLOCK_SIZE = 16 << 20
+
+# csv features of newer pyarrow releases (older ones use a slower path)
+PYARROW_VERSION = tuple(int(part) for part in pa.__version__.split(".")[:2])
+# skip rows w/ the wrong number of fields while parsing (pyarrow >= 6)
+CSV_INVALID_ROW_HANDLER = PYARROW_VERSION >= (6, 0)
+# quote only values that need it when writing (pyarrow >= 12)
+CSV_QUOTING_STYLE = PYARROW_VERSION >= (12, 0)
+
+# sql types to the arrow types csv columns are coerced to (other
+# types, e.g. NUMERIC or TIMESTAMP, are loaded as text / inferred)
+ARROW_TYPES = {
+    "REAL": pa.float64(),
+    "FLOAT": pa.float64(),
+    "DOUBLE": pa.float64(),
+    "DOUBLE PRECISION": pa.float64(),
+    "SMALLINT": pa.int64(),
+    "INT": pa.int64(),
+    "INTEGER": pa.int64(),
+    "BIGINT": pa.int64(),
+    "TEXT": pa.string(),
+    "JSON": pa.string(),
+    "TIMESTAMP": pa.string()
+}
+
+
+def get_arrow_type(sql_type):
+    """
+        get the arrow type a csv column of a given sql type is
+        coerced to
+
+        params:
+            - sql_type: column type (e.g. 'REAL', 'VARCHAR(20)')
+        returns:
+            - arrow type or None (inferred from the data)
+    """
+    # ignore size / precision
+    return ARROW_TYPES.get(sql_type.split("(")[0].strip().upper())
+
+# file types tables can be loaded from
+LOAD_FILE_TYPES = (".csv", ".parquet", ".feather", ".arrow", ".json", ".jsonl", ".ndjson")
+# file types storing an exact schema (loaded w/o text conversion)
+ARROW_FILE_TYPES = (".parquet", ".feather", ".arrow")
+
+
+def get_file_type(file_path):
+    """
+        get the file type of a file to load (compression extensions
+        are ignored e.g. table.csv.gz -> .csv)
+
+        params:
+            - file_path: location of file on disk
+        returns:
+            - (file type e.g. ".csv", whether the file is compressed)
+    """
+    # split off compression extension
+    compressed = False
+    for extension in COMPRESSION_EXTENSIONS.values():
+        if extension and file_path.endswith(extension):
+            file_path, compressed = file_path[:-len(extension)], True
+            break
+    # file type
+    return os.path.splitext(file_path)[1].lower(), compressed
+
 
 def without(d, key):
     """
@@ -30,6 +192,76 @@ def without(d, key):
     return new_d
 
 
+class SQLFunctions:
+    """
+        connection free sql building for the engine in
+        self.connection_info
+    """
+    def quote_identifier(self, name):
+        """
+            quote a table / column name for the current engine
+
+            params:
+                - name: table or column name
+        """
+        # postgres uses "" (embedded quotes are doubled)
+        if self.connection_info["engine"] == "pg":
+            return "\"%s\"" % name.replace("\"", "\"\"")
+        # mysql uses `` (embedded backticks are doubled)
+        elif self.connection_info["engine"] == "mysql":
+            return "`%s`" % name.replace("`", "``")
+
+    def quote_param_identifier(self, name):
+        """
+            quote a table / column name used in a statement run with
+            bind params (literal % signs are escaped as %%)
+
+            params:
+                - name: table or column name
+        """
+        return self.quote_identifier(name).replace("%", "%%")
+
+    def get_tables_query(self):
+        """
+            build query listing the tables in db
+        """
+        if self.connection_info["engine"] == "pg":
+            # table info query
+            sql_get_tbls = "SELECT table_name FROM information_schema.tables where table_schema not in ('pg_catalog', 'information_schema');"
+            #and table_schema not like 'pg_toast%'
+        elif self.connection_info["engine"] == "mysql":
+            # table info query
+            sql_get_tbls = "SELECT table_name FROM information_schema.tables WHERE TABLE_SCHEMA='%s';" % self.connection_info["database"]
+        return sql_get_tbls
+
+    def get_columns_query(self, table_name):
+        """
+            build query listing the columns of a table
+
+            params:
+                - table_name: name of table
+            returns:
+                - (sql, values)
+        """
+        if self.connection_info["engine"] == "pg":
+            # live (not dropped) user columns
+            sql_get_columns = (
+                "SELECT attname FROM pg_attribute "
+                "WHERE attrelid = to_regclass(%s) AND attnum > 0 AND NOT attisdropped "
+                "ORDER BY attnum;"
+            )
+            # regclass lookup needs a quoted name
+            values = (self.quote_identifier(table_name),)
+        elif self.connection_info["engine"] == "mysql":
+            # columns in table order
+            sql_get_columns = (
+                "SELECT COLUMN_NAME FROM information_schema.COLUMNS "
+                "WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s ORDER BY ORDINAL_POSITION;"
+            )
+            values = (self.connection_info["database"], table_name)
+        return sql_get_columns, values
+
+
 class RDBConnector:
     """
         connect to a relational db
@@ -44,6 +276,9 @@ class RDBConnector:
         # python types to db types mapping dict
         # conditionally configured based on engine
         self.mappings = None
+        # ConnectionPool init params (min_size, max_size, idle_timeout,
+        # check_interval, timeout)
+        self.pool_options = {}
         # expected connection info (differs by engine)
         self.expected = {
             "pg": [
@@ -113,16 +348,7 @@ class RDBConnector:
                     )
                     # specify mappings to convert python types
                     # into PostgreSQL types
-                    self.mappings = {
-                        "int": "REAL",
-                        "int64": "REAL",
-                        "str": "TEXT",
-                        "datetime": "TIMESTAMP",
-                        "date": "TIMESTAMP",
-                        "float64": "REAL",
-                        "Timestamp": "TIMESTAMP",
-                        "dict": "JSON"
-                    }
+                    self.mappings = dict(TYPE_MAPPINGS["pg"])
                     # set connection status to active
                     self.rdb_initialized = True
                     self.rdb_connected = True
@@ -145,18 +371,7 @@ class RDBConnector:
                     )
                     # specify mappings to convert python types
                     # into MySQL types
-                    self.mappings = {
-                        "int": "BIGINT",
-                        "int64": "BIGINT",
-                        "str": "TEXT",
-                        "datetime": "TEXT",
-                        # temporary fix for datetime formatting
-                        # in MySQL
-                        "date": "TEXT",
-                        "float64": "FLOAT",
-                        "Timestamp": "TEXT",
-                        "dict": "JSON"
-                    }
+                    self.mappings = dict(TYPE_MAPPINGS["mysql"])
                     # set connection status to active
                     self.rdb_initialized = True
                     self.rdb_connected = True
@@ -172,6 +387,81 @@ class RDBConnector:
                     self.rdb_connected = False
 
 
+    def get_pool(self):
+        """
+            get the connection pool of the db. connectors of a process
+            using the same connection info & pool options share a pool
+        """
+        # pool identity
+        key = (
+            tuple(sorted((name, str(value)) for name, value in self.connection_info.items())),
+            tuple(sorted(self.pool_options.items()))
+        )
+        # connections are opened by a connector of their own so the
+        # pool doesn't keep this one alive
+        return get_pool(
+            key,
+            functools.partial(RDBConnector().connect, dict(self.connection_info)),
+            self.check_connection,
+            **self.pool_options
+        )
+
+    def check_connection(self, conn):
+        """
+            check if a (pooled) connection still works
+
+            params:
+                - conn: db connection
+        """
+        try:
+            # postgres
+            if self.connection_info["engine"] == "pg":
+                if conn.closed:
+                    return False
+                cursor = conn.cursor()
+                cursor.execute("SELECT 1")
+                cursor.close()
+                # end transaction started by the check
+                conn.rollback()
+            # mysql
+            elif self.connection_info["engine"] == "mysql":
+                conn.ping(reconnect=False)
+            return True
+        except Exception as err:
+            # log
+            logger.warning("db connection check failed w/ err: %s" % str(err))
+            return False
+
+    @contextmanager
+    def checkout(self):
+        """
+            check out a pooled connection. the transaction is committed
+            (rolled back on error) & the connection handed back to the
+            pool when the block ends e.g.
+
+                with rdb_middleware.checkout() as conn:
+                    cursor = conn.cursor()
+                    cursor.execute(...)
+        """
+        # get connection
+        pool = self.get_pool()
+        conn = pool.acquire()
+        try:
+            yield conn
+            # save changes / end read
+            conn.commit()
+        except BaseException:
+            try:
+                # end failed transaction
+                conn.rollback()
+            except Exception:
+                # unusable connection
+                pool.release(conn, discard=True)
+                raise
+            pool.release(conn)
+            raise
+        pool.release(conn)
+
     def disconnect(self):
         """
             disconnect from a relational db
@@ -182,7 +472,7 @@ class RDBConnector:
         self.rdb_connected = False
 
 
-class RDBMiddleware(RDBConnector):
+class RDBMiddleware(RDBConnector, SQLFunctions):
     """
         provide basic SQL functionalities using RAW SQL queries.
         inherits RDBConnector and will use it to connect
@@ -196,23 +486,86 @@ class RDBMiddleware(RDBConnector):
                 - dbname: database name
                 - user: username with read/write permissions on dbname
                 - password: password for user
+            - pool_options: ConnectionPool init params e.g. {"max_size": 4}
+                            (see db2fs.connectors.pool)
     """
-    def __init__(self, connection_info):
+    def __init__(self, connection_info, pool_options=None):
         # init rdb connector class
         super().__init__()
-        # connect to rdb
-        self.connect(connection_info=connection_info)
+        # connection pool settings
+        self.pool_options = dict(pool_options or {})
+        # connection info
+        self.connection_info = connection_info
+        try:
+            # connect to rdb (reuses a pooled connection if there is one)
+            with self.checkout():
+                pass
+        except ConnectionError:
+            # connect logged the error
+            self.rdb_connected = False
+        except TimeoutError as err:
+            # pool full
+            logger.error("db connection checkout failed w/ err: %s" % str(err))
+            self.rdb_connected = False
+        else:
+            # set connection status to active
+            self.rdb_connected = True
+            self.mappings = dict(TYPE_MAPPINGS[self.connection_info["engine"]])
+
+    def run_query(self, sql_query_string, values=None):
+        """
+            execute SQL queries on a pooled connection. the statement
+            is committed & the connection handed back to the pool
+            before returning, so only the cursor is returned (results
+            are buffered in it). use checkout() to run several
+            statements on one connection
+
+            params:
+                - sql_query_string: sql statement to execute
+                - values: values to format and add to sql_query_string
+            returns:
+                - cursor holding the results
+        """
+        # get pooled connection
+        with self.checkout() as conn:
+            # get cursor from conn
+            cursor = conn.cursor()
+            if values is not None:
+                # execute statement
+                cursor.execute(
+                    # sql statement
+                    sql_query_string,
+                    # values
+                    values
+                )
+            else:
+                # execute sql statement
+                cursor.execute(sql_query_string)
+        # conn is back in the pool
+        return cursor
 
     def execute_query(self, sql_query_string, values=None):
         """
-            execute SQL queries
+            execute SQL queries on a connection of its own (not pooled,
+            so the caller can keep using & must close it). the
+            statement is committed before returning
+
+            deprecated: use run_query (pooled connection, returns the
+            cursor only) or checkout()
 
             params:
                 - sql_query_string: sql statement to execute
                 - values: values to format and add to sql_query_string
+            returns:
+                - (conn, cursor)
         """
-        # connect to db
-        conn = self.connect(connection_info=self.connection_info)
+        warnings.warn(
+            "execute_query is deprecated, use run_query (returns the cursor only) or checkout()",
+            DeprecationWarning,
+            stacklevel=2
+        )
+        # connect to db (own connector so mappings stay as they are)
+        conn = RDBConnector().connect(dict(self.connection_info))
         # get cursor from conn
         cursor = conn.cursor()
         if values is not None:
@@ -226,22 +579,19 @@ class RDBMiddleware(RDBConnector):
         else:
             # execute sql statement
             cursor.execute(sql_query_string)
-        # return true for success
+        # save changes
+        conn.commit()
+        # return conn & cursor
         return conn, cursor
 
     def get_tables(self):
         """
             get names of all tables in db & return them as list
         """
-        if self.connection_info["engine"] == "pg":
-            # table info query
-            sql_get_tbls = "SELECT table_name FROM information_schema.tables where table_schema not in ('pg_catalog', 'information_schema');"
-            #and table_schema not like 'pg_toast%'
-        elif self.connection_info["engine"] == "mysql":
-            # table info query
-            sql_get_tbls = "SELECT table_name FROM information_schema.tables WHERE TABLE_SCHEMA='%s';" % self.connection_info["database"]
+        # table info query
+        sql_get_tbls = self.get_tables_query()
         # execute table info query
-        conn, cursor = self.execute_query(sql_get_tbls)
+        cursor = self.run_query(sql_get_tbls)
         # get result of query from returned cursor
         tables = cursor.fetchall()
         # var to store existence state
@@ -254,6 +604,51 @@ class RDBMiddleware(RDBConnector):
             table_names.append(table[0])
         return table_names
 
+    def get_table_sizes(self):
+        """
+            get estimated row count & size (in bytes) of all tables
+            in db from the catalog (no table scans)
+
+            returns:
+                - table_sizes: dict of table name -> (rows, bytes)
+        """
+        if self.connection_info["engine"] == "pg":
+            # planner estimates + on disk size (incl. toast & indexes)
+            sql_get_sizes = (
+                "SELECT c.relname, GREATEST(c.reltuples, 0)::bigint, pg_total_relation_size(c.oid) "
+                "FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace "
+                "WHERE c.relkind IN ('r', 'p') AND n.nspname NOT IN ('pg_catalog', 'information_schema');"
+            )
+        elif self.connection_info["engine"] == "mysql":
+            # storage engine estimates
+            sql_get_sizes = (
+                "SELECT table_name, COALESCE(table_rows, 0), COALESCE(data_length, 0) "
+                "FROM information_schema.tables WHERE TABLE_SCHEMA='%s';" % self.connection_info["database"]
+            )
+        # execute size query
+        cursor = self.run_query(sql_get_sizes)
+        # map table name to (rows, bytes)
+        return {
+            table_name: (int(num_rows), int(num_bytes))
+            for table_name, num_rows, num_bytes in cursor.fetchall()
+        }
+
+    def get_columns(self, table_name):
+        """
+            get column names of a table from the catalog
+
+            params:
+                - table_name: name of table
+            returns:
+                - list of column names (in table order)
+        """
+        # column query
+        sql_get_columns, values = self.get_columns_query(table_name)
+        # execute column query
+        cursor = self.run_query(sql_get_columns, values)
+        # return names
+        return [column[0] for column in cursor.fetchall()]
+
     def table_exists(self, table_name):
         """
             check if a given table exists in db
@@ -299,21 +694,478 @@ class RDBMiddleware(RDBConnector):
                 sql_create_table = "CREATE TABLE \"" + table_name + "\" ("
                 # add column info from metadata
                 sql_create_table += ", ".join('\"{0}\" {1}'.format(key.replace('"', ''), val) for key, val in metadata) + ");"
-            # execute create statement
-            conn, cursor = self.execute_query(sql_create_table)
-            # save changes in db
-            conn.commit()
+            # execute create statement (committed by run_query)
+            cursor = self.run_query(sql_create_table)
 
-    def populate_table(self, file_path, table_name, metadata):
+    def read_csv_batches(self, file_path, table_name, metadata, batch_size=10000, byte_range=None):
         """
-            populates a SQL table by iteratively reading a CSV file.
-            iterative because large CSV will cause memory overflow
+            read a csv file (header skipped) in large blocks on several
+            threads. every column is coerced once per block to the arrow
+            type of its sql type in metadata (columns of other types are
+            inferred from the first block) & quotes are removed from text
+            values. rows without one value per column are skipped
 
             params:
                 - file_path: location on disk to a CSV file
+                - table_name: table being loaded (progress bar)
+                - metadata: column (name, type) list of table
+                - batch_size: max rows per batch
+                - byte_range: only read the records in this (start, end)
+                              range (see db2fs.csvsplit.split_csv)
+            yields:
+                - pyarrow record batches
+        """
+        if byte_range is not None:
+            # records of range only (no header)
+            source, skip_rows = FileRange(file_path, *byte_range), 0
+        elif os.path.getsize(file_path) == 0:
+            # empty files have no header (or rows)
+            return
+        else:
+            source, skip_rows = file_path, 1
+        # positional column names (header names may not be unique)
+        column_names = ["column_%s" % i for i in range(len(metadata))]
+        # column types from metadata
+        column_types = {}
+        for column_name, (key, val) in zip(column_names, metadata):
+            arrow_type = get_arrow_type(val)
+            if arrow_type is not None:
+                column_types[column_name] = arrow_type
+        # rows not matching metadata
+        skipped_rows = []
+        # coercion
+        convert_options = pa_csv.ConvertOptions(
+            column_types=column_types,
+            # empty fields are nulls (except in text columns)
+            strings_can_be_null=False
+        )
+        if CSV_INVALID_ROW_HANDLER:
+            def skip_row(row):
+                skipped_rows.append(row.number)
+                return "skip"
+            # open csv file
+            reader = pa_csv.open_csv(
+                source,
+                read_options=pa_csv.ReadOptions(
+                    column_names=column_names,
+                    skip_rows=skip_rows,
+                    use_threads=True,
+                    block_size=CSV_BLOCK_SIZE
+                ),
+                parse_options=pa_csv.ParseOptions(
+                    delimiter=',',
+                    quote_char='"',
+                    invalid_row_handler=skip_row
+                ),
+                convert_options=convert_options
+            )
+        else:
+            # drop rows not matching metadata before parsing
+            reader = self.read_matching_csv_blocks(source, skip_rows, column_names, convert_options, skipped_rows)
+        # initialize with tqdm to show progress
+        pbar = tqdm(unit=" rows")
+        pbar.set_description("generating table: %s" % table_name)
+        for block in reader:
+            # split blocks into batches (quoted values are unescaped
+            # by the csv parser)
+            for offset in range(0, block.num_rows, batch_size):
+                batch = block.slice(offset, batch_size)
+                pbar.update(batch.num_rows)
+                yield batch
+        pbar.close()
+        reader.close()
+        # log
+        if skipped_rows:
+            logger.warning("skipped %s row(s) of: %s not matching metadata" % (len(skipped_rows), file_path))
+
+    def read_matching_csv_blocks(self, source, skip_rows, column_names, convert_options, skipped_rows):
+        """
+            parse a csv file in blocks w/o the rows that don't have one
+            value per column (pyarrow < 6 can't skip them while parsing).
+            rows are checked with the csv module & the matching ones are
+            parsed & coerced by pyarrow a block at a time
+
+            params:
+                - source: file path or binary file object
+                - skip_rows: number of rows to skip (header)
+                - column_names: names of the columns
+                - convert_options: pyarrow csv ConvertOptions
+                - skipped_rows: list the skipped rows are added to
+            yields:
+                - pyarrow record batches
+        """
+        # text stream (compressed files are decompressed by pyarrow)
+        if isinstance(source, str):
+            source = StreamReader(pa.input_stream(source))
+        text_file = io.TextIOWrapper(io.BufferedReader(source), encoding="utf-8", newline="")
+
+        def parse_block(block):
+            return pa_csv.read_csv(
+                pa.BufferReader(block.getvalue().encode("utf-8")),
+                read_options=pa_csv.ReadOptions(column_names=column_names, use_threads=True),
+                convert_options=convert_options
+            ).to_batches()
+        try:
+            # read csv
+            reader = csv.reader(text_file, delimiter=',', quotechar='"')
+            # skip header
+            for _ in range(skip_rows):
+                next(reader, None)
+            # matching rows of current block
+            block = io.StringIO()
+            writer = csv.writer(block, lineterminator="\n")
+            for row in reader:
+                # check metadata
+                if len(row) != len(column_names):
+                    skipped_rows.append(reader.line_num)
+                    continue
+                writer.writerow(row)
+                # parse full block
+                if block.tell() >= CSV_BLOCK_SIZE:
+                    yield from parse_block(block)
+                    block.seek(0)
+                    block.truncate()
+            # last block
+            if block.tell():
+                yield from parse_block(block)
+        finally:
+            text_file.close()
+
+    def load_rows(self, cursor, table_name, metadata, batch):
+        """
+            bulk load a batch of rows in one round trip. postgres
+            streams them with COPY ... FROM STDIN, mysql sends
+            multi row INSERTs (pymysql batches executemany)
+
+            params:
+                - cursor: cursor of a checked out connection
+                - table_name: table to load
+                - metadata: column (name, type) list of table
+                - batch: pyarrow record batch (one column per metadata entry)
+        """
+        # postgres
+        if self.connection_info["engine"] == "pg":
+            # batch as csv (nulls are empty, empty strings quoted)
+            if CSV_QUOTING_STYLE:
+                csv_buffer = io.BytesIO()
+                pa_csv.write_csv(
+                    batch,
+                    csv_buffer,
+                    write_options=pa_csv.WriteOptions(include_header=False, quoting_style="needed")
+                )
+            else:
+                # same format as COPY ... TO
+                csv_buffer = io.StringIO()
+                CSVBatchWriter(csv_buffer).write_rows(list(zip(*(column.to_pylist() for column in batch.columns))))
+            csv_buffer.seek(0)
+            # stream csv into table
+            cursor.copy_expert(
+                "COPY %s FROM STDIN WITH (FORMAT csv)" % self.quote_identifier(table_name),
+                csv_buffer
+            )
+        # mysql
+        elif self.connection_info["engine"] == "mysql":
+            # insert statement (executemany rewrites it into multi row inserts)
+            sql_populate_table = "INSERT INTO %s VALUES (%s);" % (
+                self.quote_param_identifier(table_name),
+                ", ".join("%s" for key, val in metadata)
+            )
+            # columns to rows
+            rows = list(zip(*(column.to_pylist() for column in batch.columns)))
+            cursor.executemany(sql_populate_table, rows)
+
+    def get_binary_encoder(self, cursor, table_name):
+        """
+            get a binary COPY encoder for the columns of a postgres table
+
+            params:
+                - cursor: cursor of a checked out connection
+                - table_name: table to load
+            returns:
+                - BinaryCopyEncoder or None if a column type can't be
+                  sent in binary
+        """
+        # column types
+        cursor.execute("SELECT * FROM %s LIMIT 0;" % self.quote_identifier(table_name))
+        description = cursor.description
+        # types w/o binary encoding
+        unsupported = [column[0] for column in description if not is_binary_encodable(column[1])]
+        if unsupported:
+            logger.warning("loading table: %s as text (no binary encoding for columns: %s)" % (table_name, unsupported))
+            return None
+        return BinaryCopyEncoder(description)
+
+    def load_binary_rows(self, cursor, table_name, encoder, batch):
+        """
+            bulk load a record batch with postgres binary COPY ... FROM
+            STDIN (values keep their exact types, no text conversion)
+
+            params:
+                - cursor: cursor of a checked out connection
+                - table_name: table to load
+                - encoder: BinaryCopyEncoder of table
+                - batch: pyarrow record batch (one column per table column)
+        """
+        # batch as binary COPY stream
+        copy_buffer = io.BytesIO(encoder.get_header() + encoder.encode(batch) + encoder.get_trailer())
+        # stream into table
+        cursor.copy_expert(
+            "COPY %s FROM STDIN WITH (FORMAT binary)" % self.quote_identifier(table_name),
+            copy_buffer
+        )
+
+    def load_batches(self, conn, table_name, metadata, batches, commit_every=None, binary=False):
+        """
+            load record batches over a checked out connection
+
+            params:
+                - conn: checked out connection
+                - table_name: table to load
+                - metadata: column (name, type) list of table
+                - batches: iterable of record batches
+                - commit_every: commit after this many rows (default: one
+                                transaction for all batches)
+                - binary: load typed batches with binary COPY on postgres
+                          (see load_binary_rows). mysql always uses
+                          batched inserts
+            returns:
+                - number of rows loaded
+        """
+        # rows loaded (since last commit)
+        num_rows, num_uncommitted = 0, 0
+        cursor = conn.cursor()
+        # binary COPY (postgres)
+        encoder = None
+        if binary and self.connection_info["engine"] == "pg":
+            encoder = self.get_binary_encoder(cursor, table_name)
+        # load batch after batch
+        for batch in batches:
+            if encoder is not None:
+                self.load_binary_rows(cursor, table_name, encoder, batch)
+            else:
+                self.load_rows(cursor, table_name, metadata, batch)
+            num_rows += batch.num_rows
+            num_uncommitted += batch.num_rows
+            # save changes
+            if commit_every is not None and num_uncommitted >= commit_every:
+                conn.commit()
+                num_uncommitted = 0
+        cursor.close()
+        return num_rows
+
+    def get_arrow_type_name(self, arrow_type):
+        """
+            get the mappings key of an arrow type e.g. arrow:int32
+
+            params:
+                - arrow_type: pyarrow data type
+        """
+        # dictionary encoded values
+        if pa.types.is_dictionary(arrow_type):
+            arrow_type = arrow_type.value_type
+        # type families
+        if pa.types.is_decimal(arrow_type):
+            type_name = "decimal"
+        elif pa.types.is_timestamp(arrow_type):
+            type_name = "timestamptz" if arrow_type.tz is not None else "timestamp"
+        elif pa.types.is_date(arrow_type):
+            type_name = "date"
+        elif pa.types.is_time(arrow_type):
+            type_name = "time"
+        elif pa.types.is_duration(arrow_type):
+            type_name = "duration"
+        elif pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type):
+            type_name = "string"
+        elif pa.types.is_binary(arrow_type) or pa.types.is_large_binary(arrow_type) or pa.types.is_fixed_size_binary(arrow_type):
+            type_name = "binary"
+        elif pa.types.is_nested(arrow_type):
+            type_name = "nested"
+        else:
+            # e.g. bool, int32, double
+            type_name = str(arrow_type)
+        return "arrow:" + type_name
+
+    def get_sql_type(self, arrow_type, exact=False):
+        """
+            get the column type of an arrow type. by default the python
+            type mappings of the engine are used (loose types that fit
+            values inferred from text). exact uses the arrow type
+            mappings (for files storing their schema e.g. parquet)
+
+            params:
+                - arrow_type: pyarrow data type
+                - exact: keep the exact type (size, precision, time zone)
+            returns:
+                - sql type e.g. 'REAL'
+        """
+        # exact type
+        if exact:
+            sql_type = self.mappings.get(self.get_arrow_type_name(arrow_type))
+            if sql_type is not None:
+                # keep precision of decimals
+                if pa.types.is_decimal(arrow_type):
+                    sql_type += "(%s, %s)" % (arrow_type.precision, arrow_type.scale)
+                return sql_type
+        # python type of values
+        if pa.types.is_integer(arrow_type):
+            python_type = "int64"
+        elif pa.types.is_floating(arrow_type) or pa.types.is_decimal(arrow_type):
+            python_type = "float64"
+        elif pa.types.is_timestamp(arrow_type):
+            python_type = "datetime"
+        elif pa.types.is_date(arrow_type):
+            python_type = "date"
+        elif pa.types.is_nested(arrow_type):
+            python_type = "dict"
+        else:
+            python_type = "str"
+        # engine type (text if not mapped)
+        return self.mappings.get(python_type, self.mappings["str"])
+
+    def get_file_schema(self, file_path):
+        """
+            get the arrow schema of a file to load. csv types are
+            inferred from the first block of the file
+
+            params:
+                - file_path: location of a .csv, .parquet, .feather,
+                             .json or .jsonl / .ndjson file
+            returns:
+                - pyarrow schema
+        """
+        # file type
+        file_type, compressed = get_file_type(file_path)
+        if file_type == ".csv":
+            # column names from header, types from first block
+            return pa_csv.open_csv(
+                file_path,
+                read_options=pa_csv.ReadOptions(use_threads=True, block_size=CSV_BLOCK_SIZE)
+            ).schema
+        elif file_type == ".parquet":
+            # schema stored in footer
+            return pq.read_schema(file_path)
+        elif file_type in (".feather", ".arrow"):
+            # schema stored in file
+            return pa.ipc.open_file(pa.memory_map(file_path)).schema
+        elif file_type in (".jsonl", ".ndjson"):
+            # types from first block (compressed files are decompressed)
+            with pa.input_stream(file_path) as stream:
+                sample = stream.read(CSV_BLOCK_SIZE)
+            # complete lines only
+            last_newline = sample.rfind(b"\n")
+            if last_newline != -1:
+                sample = sample[:last_newline + 1]
+            return pa_json.read_json(pa.BufferReader(sample)).schema
+        elif file_type == ".json":
+            # whole file (one json document)
+            return pa.Schema.from_pandas(pd.read_json(file_path), preserve_index=False)
+        raise ValueError("unsupported file type: %s (expected one of: %s)" % (file_type, LOAD_FILE_TYPES))
+
+    def infer_metadata(self, file_path):
+        """
+            infer table metadata (column name & type list, see
+            create_table) from a file to load. parquet / feather
+            schemas are mapped to exact types
+
+            params:
+                - file_path: location of a .csv, .parquet, .feather,
+                             .json or .jsonl / .ndjson file
+            returns:
+                - metadata e.g. [('col_1', 'REAL'), ('col_2', 'TEXT')]
+        """
+        # columns of file
+        schema = self.get_file_schema(file_path)
+        # exact types of stored schemas
+        exact = get_file_type(file_path)[0] in ARROW_FILE_TYPES
+        # map types
+        return [(field.name, self.get_sql_type(field.type, exact=exact)) for field in schema]
+
+    def read_file_batches(self, file_path, table_name, metadata, batch_size=10000):
+        """
+            read a .parquet, .feather, .json or .jsonl / .ndjson file
+            as record batches ready for load_rows (nested values are
+            encoded as json text)
+
+            params:
+                - file_path: location of file on disk
+                - table_name: table being loaded (progress bar)
+                - metadata: column (name, type) list of table
+                - batch_size: max rows per batch
+            yields:
+                - pyarrow record batches
+        """
+        # file type
+        file_type, compressed = get_file_type(file_path)
+        if file_type == ".parquet":
+            # stream row groups
+            batches = pq.ParquetFile(file_path).iter_batches(batch_size=batch_size)
+        elif file_type in (".feather", ".arrow"):
+            # stream record batches (memory mapped)
+            reader = pa.ipc.open_file(pa.memory_map(file_path))
+            batches = (reader.get_batch(index) for index in range(reader.num_record_batches))
+        elif file_type in (".jsonl", ".ndjson"):
+            # whole file (parsed in blocks on several threads)
+            batches = pa_json.read_json(
+                file_path,
+                read_options=pa_json.ReadOptions(use_threads=True, block_size=CSV_BLOCK_SIZE)
+            ).to_batches(batch_size)
+        elif file_type == ".json":
+            # whole file (one json document)
+            batches = pa.Table.from_pandas(pd.read_json(file_path), preserve_index=False).to_batches(batch_size)
+        else:
+            raise ValueError("unsupported file type: %s (expected one of: %s)" % (file_type, LOAD_FILE_TYPES))
+        # initialize with tqdm to show progress
+        pbar = tqdm(unit=" rows")
+        pbar.set_description("generating table: %s" % table_name)
+        for block in batches:
+            # nested values as json text
+            columns = [
+                pa.array([None if value is None else json.dumps(value, default=str) for value in column.to_pylist()], pa.string())
+                if pa.types.is_nested(column.type) else column
+                for column in block.columns
+            ]
+            block = pa.RecordBatch.from_arrays(columns, names=block.schema.names)
+            # split blocks into batches
+            for offset in range(0, block.num_rows, batch_size):
+                batch = block.slice(offset, batch_size)
+                pbar.update(batch.num_rows)
+                yield batch
+        pbar.close()
+
+    def populate_table(self, file_path, table_name, metadata=None, batch_size=10000, commit_every=None, workers=1, staging=False):
+        """
+            populates a SQL table by iteratively reading a CSV file
+            (or a .parquet, .feather, .json or .jsonl / .ndjson file,
+            see read_file_batches). iterative because large CSV will
+            cause memory overflow.
+            the file is parsed in blocks & coerced column by column
+            (see read_csv_batches), then bulk loaded batch_size rows at
+            a time over one pooled connection (see load_rows).
+
+            with workers > 1 an (uncompressed) csv file is split into
+            byte ranges ending on record boundaries & every range is
+            loaded over its own pooled connection in a transaction of
+            its own (see populate_table_parallel).
+
+            parquet / feather batches keep their types: postgres loads
+            them with binary COPY, mysql with batched inserts
+
+            params:
+                - file_path: location on disk to a CSV (or other) file
                 - table_name: table we are inserting SQL into
                 - metadata: the information about the table used to generate
-                            SQL statements
+                            SQL statements. if None it is inferred from
+                            the file (see infer_metadata) & the table is
+                            created if it doesn't exist
+                - batch_size: rows sent per round trip
+                - commit_every: commit after this many rows (default: one
+                                transaction for the whole file / range)
+                - workers: number of connections loading the file
+                - staging: (workers > 1) load into a staging table copied
+                           into table_name in one transaction at the end,
+                           so a failed load leaves the table untouched
+            returns:
+                - number of rows loaded
         """
         # log
         logger.info(
@@ -322,60 +1174,43 @@ class RDBMiddleware(RDBConnector):
                 file_path
             )
         )
-        # postgres
-        if self.connection_info["engine"] == "pg":
-            # insert statement for postgres (notice the \")
-            sql_populate_table = "INSERT INTO \"" + table_name + "\" VALUES (" + ", ".join("%s" for key, val in metadata) + ");"
-        elif self.connection_info["engine"] == "mysql":
-            # insert statement for mysq (notice the ``)
-            sql_populate_table = "INSERT INTO `" + table_name + "` VALUES (" + ", ".join("%s" for key, val in metadata) + ");"
+        # commits happen between batches
+        if commit_every is not None:
+            batch_size = min(batch_size, commit_every)
+        # file type
+        file_type, compressed = get_file_type(file_path)
         try:
-            # open csv file
-            with open(file_path, 'r') as f:
-                # read csv
-                reader = csv.reader(
-                    f,
-                    delimiter=',',
-                    quotechar='"',
-                    skipinitialspace=True
+            # create table from file schema
+            if metadata is None:
+                metadata = self.infer_metadata(file_path)
+                self.create_table(table_name, metadata)
+            if workers > 1 and file_type == ".csv" and not compressed:
+                # load ranges in parallel
+                num_rows = self.populate_table_parallel(
+                    file_path,
+                    table_name,
+                    metadata,
+                    batch_size=batch_size,
+                    commit_every=commit_every,
+                    workers=workers,
+                    staging=staging
                 )
-                # skip header
-                next(reader)
-                # initialize with tqdm to show progress
-                pbar = tqdm(reader)
-                # insert each row (use tqdm to show progress)
-                for row in pbar:
-                    pbar.set_description("generating table: %s" % table_name)
-                    # convert numeric types
-                    converted_row = pd.DataFrame(
-                        pd.to_numeric(
-                            row,
-                            errors='coerce'
-                        )
-                    )
-                    original_row = pd.DataFrame(
-                        pd.to_numeric(
-                            row,
-                            errors='ignore'
-                        )
+            else:
+                # converted batches
+                if file_type == ".csv":
+                    batches = self.read_csv_batches(file_path, table_name, metadata, batch_size)
+                else:
+                    batches = self.read_file_batches(file_path, table_name, metadata, batch_size)
+                # load rows on one pooled connection
+                with self.checkout() as conn:
+                    num_rows = self.load_batches(
+                        conn,
+                        table_name,
+                        metadata,
+                        batches,
+                        commit_every,
+                        binary=file_type in ARROW_FILE_TYPES
                     )
-                    # merge converted rows
-                    merged_row = converted_row.fillna(original_row).T.convert_dtypes()
-                    # remove quotes
-                    merged_row.replace('"', '', regex=True, inplace=True)
-                    # convert to list
-                    converted_row = merged_row.values.tolist()[0]
-                    # check metadata
-                    if len(metadata) == len(converted_row):
-                        # execute insert
-                        conn, cursor = self.execute_query(
-                            # insert statement
-                            sql_populate_table,
-                            # values
-                            converted_row
-                            )
-            # save changes
-            conn.commit()
         except OSError as err:
             # log
             logger.error(
@@ -384,4 +1219,97 @@ class RDBMiddleware(RDBConnector):
                     str(err)
                 )
             )
-            raise err
\ No newline at end of file
+            raise err
+        # log
+        logger.info("loaded %s rows into table: %s" % (num_rows, table_name))
+        return num_rows
+
+    def populate_table_parallel(self, file_path, table_name, metadata, batch_size=10000, commit_every=None, workers=4, staging=False):
+        """
+            load a CSV file over several pooled connections. the file
+            is split into byte ranges ending on record boundaries
+            (quotes are tracked so quoted newlines are never split)
+            & every range is loaded by a thread of its own in its own
+            transaction.
+
+            without staging ranges are committed as they finish (a failed
+            load leaves the other ranges loaded). with staging ranges
+            are loaded into a staging table (UNLOGGED on postgres)
+            which is copied into table_name in one transaction once
+            every range is loaded & dropped afterwards
+
+            params:
+                - file_path: location on disk to a CSV file
+                - table_name: table to load
+                - metadata: column (name, type) list of table
+                - batch_size: rows sent per round trip
+                - commit_every: commit after this many rows (default: one
+                                transaction per range)
+                - workers: number of connections loading the file (at
+                           most the pool max_size)
+                - staging: load through a staging table
+            returns:
+                - number of rows loaded
+        """
+        # one connection per worker (waiting on the pool could time out)
+        workers = max(1, min(workers, self.get_pool().max_size))
+        # ranges to load
+        byte_ranges = split_csv(file_path, workers)
+        if not byte_ranges:
+            return 0
+        # table ranges are loaded into
+        load_table_name = table_name
+        if staging:
+            load_table_name = self.create_staging_table(table_name)
+
+        def load_range(byte_range):
+            # converted batches of range
+            batches = self.read_csv_batches(file_path, table_name, metadata, batch_size, byte_range=byte_range)
+            # load range on a connection of its own
+            with self.checkout() as conn:
+                return self.load_batches(conn, load_table_name, metadata, batches, commit_every)
+        try:
+            # load ranges
+            with ThreadPoolExecutor(max_workers=len(byte_ranges)) as executor:
+                num_rows = sum(executor.map(load_range, byte_ranges))
+            # swap staged rows in
+            if staging:
+                cursor = self.run_query(
+                    "INSERT INTO %s SELECT * FROM %s;" % (
+                        self.quote_identifier(table_name),
+                        self.quote_identifier(load_table_name)
+                    )
+                )
+        finally:
+            if staging:
+                # remove staging table (also after errors)
+                cursor = self.run_query("DROP TABLE %s;" % self.quote_identifier(load_table_name))
+        # log
+        logger.info("loaded %s range(s) of: %s in parallel" % (len(byte_ranges), file_path))
+        return num_rows
+
+    def create_staging_table(self, table_name):
+        """
+            create an empty copy of a table to load into (UNLOGGED on
+            postgres, so the load writes no WAL)
+
+            params:
+                - table_name: table being loaded
+            returns:
+                - name of staging table
+        """
+        # unique name (identifiers are at most 64 characters)
+        staging_table_name = "%s_staging_%s" % (table_name[:40], uuid.uuid4().hex[:8])
+        # log
+        logger.info("creating staging table: %s for table: %s" % (staging_table_name, table_name))
+        if self.connection_info["engine"] == "pg":
+            sql_create_table = "CREATE UNLOGGED TABLE %s (LIKE %s INCLUDING DEFAULTS);"
+        elif self.connection_info["engine"] == "mysql":
+            sql_create_table = "CREATE TABLE %s LIKE %s;"
+        cursor = self.run_query(
+            sql_create_table % (
+                self.quote_identifier(staging_table_name),
+                self.quote_identifier(table_name)
+            )
+        )
+        return staging_table_name
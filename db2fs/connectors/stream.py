@@ -0,0 +1,241 @@
+# io
+import io
+# abstract base class
+import abc
+# parallel part uploads
+import threading
+from concurrent.futures import ThreadPoolExecutor
+# logging
+import logging
+# config logger
+logger = logging.getLogger(__name__)
+
+
+class UploadStream(io.RawIOBase, abc.ABC):
+    """
+        writable binary stream uploading everything written to it
+        to object storage without touching local disk. data is cut
+        into parts of part_size bytes which are uploaded by a pool of
+        max_in_flight threads. once max_in_flight parts are uploading
+        writers block, so at most (max_in_flight + 1) * part_size
+        bytes are held in memory. stores limiting the number of parts
+        (max_parts) get part_size doubled every max_parts // 10 parts
+        (up to max_part_size) so large streams never run out of parts.
+        streams smaller than one part are
+        uploaded with a single request. closing the stream completes
+        the upload, abort() (or an error inside a with block) cancels
+        it so a partial object is never published
+
+        subclasses implement:
+            - upload_whole(data): upload a small object in one request
+            - start_upload(): start a multipart / resumable upload
+            - upload_part(part_number, offset, data, last): upload a
+              part & return what complete_upload needs to know about it
+            - complete_upload(parts): publish the object
+            - abort_upload(): cancel the upload
+
+        init params:
+            - part_size: bytes per uploaded part
+            - max_in_flight: parts uploading at a time
+            - max_parts: parts allowed per object (None = no limit)
+            - max_part_size: largest part allowed
+    """
+    def __new__(cls, *args, **kwargs):
+        # io base classes skip the abstract method check of abc
+        if cls.__abstractmethods__:
+            raise TypeError(
+                "can't instantiate abstract class %s w/ abstract methods %s"
+                % (cls.__name__, ", ".join(sorted(cls.__abstractmethods__)))
+            )
+        return super().__new__(cls)
+
+    def __init__(self, part_size, max_in_flight=4, max_parts=None, max_part_size=None):
+        # part size
+        self.part_size = part_size
+        # part limits of the store
+        self.max_parts = max_parts
+        self.max_part_size = max_part_size
+        # bytes not handed over yet
+        self.buffer = bytearray()
+        # upload state
+        self.started = False
+        self.part_number = 0
+        self.offset = 0
+        # part futures (in part order)
+        self.futures = []
+        # parts in flight
+        self.max_in_flight = max_in_flight
+        self.slots = threading.BoundedSemaphore(max_in_flight)
+        self.executor = None
+        # error raised in an upload thread
+        self.error = None
+        # total bytes written
+        self.num_bytes = 0
+
+    @abc.abstractmethod
+    def upload_whole(self, data):
+        pass
+
+    @abc.abstractmethod
+    def start_upload(self):
+        pass
+
+    @abc.abstractmethod
+    def upload_part(self, part_number, offset, data, last):
+        pass
+
+    @abc.abstractmethod
+    def complete_upload(self, parts):
+        pass
+
+    @abc.abstractmethod
+    def abort_upload(self):
+        pass
+
+    def check_error(self):
+        """
+            re-raise errors of the upload threads
+        """
+        if self.error is not None:
+            raise self.error
+
+    def writable(self):
+        return True
+
+    def run_part(self, part_number, offset, data, last):
+        """
+            upload a part (runs in an upload thread)
+        """
+        try:
+            # skip parts after an error
+            if self.error is not None:
+                return None
+            return self.upload_part(part_number, offset, data, last)
+        except Exception as err:
+            # raised in writer thread
+            self.error = err
+        finally:
+            # let the writer hand over the next part
+            self.slots.release()
+
+    def submit_part(self, data, last=False):
+        """
+            hand a part over to the upload threads (blocks while
+            max_in_flight parts are uploading)
+
+            params:
+                - data: part bytes
+                - last: whether this is the final part
+        """
+        # start upload with the first part
+        if not self.started:
+            self.start_upload()
+            self.executor = ThreadPoolExecutor(max_workers=self.max_in_flight)
+            self.started = True
+        # wait for a free slot
+        self.slots.acquire()
+        # upload part
+        self.part_number += 1
+        self.futures.append(self.executor.submit(self.run_part, self.part_number, self.offset, data, last))
+        self.offset += len(data)
+        # keep enough parts for the rest of the stream
+        self.grow_part_size()
+
+    def grow_part_size(self):
+        """
+            double part_size every max_parts // 10 parts so a stream
+            can grow to 1023 * (max_parts // 10) * initial part_size
+            bytes before hitting max_parts (e.g. ~8 TB for S3 w/ 8 MiB
+            parts) while small streams keep small parts
+        """
+        if self.max_parts is None:
+            return
+        # parts per step
+        step = max(self.max_parts // 10, 1)
+        if self.part_number % step == 0:
+            part_size = self.part_size * 2
+            if self.max_part_size is not None:
+                part_size = min(part_size, self.max_part_size)
+            if part_size != self.part_size:
+                # log
+                logger.debug("part size: %s -> %s bytes after %s parts" % (self.part_size, part_size, self.part_number))
+                self.part_size = part_size
+
+    def write(self, data):
+        """
+            add data to be uploaded
+
+            params:
+                - data: bytes (like) object
+        """
+        # fail early
+        self.check_error()
+        # bytes written by caller
+        num_bytes = memoryview(data).nbytes
+        # collect data
+        self.buffer += data
+        self.num_bytes += num_bytes
+        # hand full parts over
+        while len(self.buffer) >= self.part_size:
+            # part_size may grow once the part is submitted
+            part = bytes(self.buffer[:self.part_size])
+            del self.buffer[:len(part)]
+            self.submit_part(part)
+        return num_bytes
+
+    def close(self):
+        """
+            upload remaining data, wait for all parts & publish object
+        """
+        if self.closed:
+            return
+        try:
+            # small object
+            if not self.started:
+                self.upload_whole(bytes(self.buffer))
+            else:
+                # last part
+                if self.buffer:
+                    self.submit_part(bytes(self.buffer), last=True)
+                # wait for uploads
+                parts = [future.result() for future in self.futures]
+                self.executor.shutdown()
+                try:
+                    # a part failed
+                    self.check_error()
+                    # publish object
+                    self.complete_upload(parts)
+                except Exception:
+                    # don't leave the upload (& its parts) behind
+                    self.abort_upload()
+                    raise
+            self.buffer = bytearray()
+            # log
+            logger.info("uploaded %s bytes in %s parts" % (self.num_bytes, max(self.part_number, 1)))
+        finally:
+            super().close()
+
+    def abort(self):
+        """
+            cancel the upload (nothing is published)
+        """
+        if self.closed:
+            return
+        try:
+            if self.started:
+                # skip queued parts & wait for running ones
+                for future in self.futures:
+                    future.cancel()
+                self.executor.shutdown()
+                # cancel upload
+                self.abort_upload()
+            self.buffer = bytearray()
+        finally:
+            super().close()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # only publish the object if no error occurred
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
@@ -0,0 +1,174 @@
+# io
+import io
+import os
+# logging
+import logging
+# config logger
+logger = logging.getLogger(__name__)
+
+# bytes read at a time while looking for record boundaries
+SCAN_CHUNK_SIZE = 16 << 20
+
+
+def find_record_boundaries(file_path, targets, chunk_size=SCAN_CHUNK_SIZE):
+    """
+        find the first record boundary (offset right after a newline
+        that is not inside a quoted value) at or after each target
+        offset. quotes are tracked from the start of the file, so
+        quoted values spanning lines (or blocks) never get split. the
+        file is read sequentially once, up to the last boundary found
+
+        params:
+            - file_path: location on disk to a CSV file
+            - targets: sorted byte offsets
+            - chunk_size: bytes read at a time
+        returns:
+            - sorted list of unique boundaries (targets past the last
+              record are dropped)
+    """
+    boundaries = []
+    # targets not matched yet
+    pending = list(targets)
+    with open(file_path, "rb") as f:
+        # offset of chunk in file
+        chunk_start = 0
+        # inside a quoted value at the scan position
+        in_quotes = False
+        while pending:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            # scan position in chunk
+            pos = 0
+            while pending:
+                # boundaries >= target follow a newline at >= target - 1
+                search_from = max(pos, pending[0] - chunk_start - 1)
+                if search_from >= len(chunk):
+                    break
+                # next newline
+                newline = chunk.find(b"\n", search_from)
+                if newline == -1:
+                    break
+                # escaped quotes ("") don't change the quote state
+                in_quotes ^= chunk.count(b'"', pos, newline) % 2 == 1
+                pos = newline + 1
+                if not in_quotes:
+                    boundary = chunk_start + pos
+                    boundaries.append(boundary)
+                    # drop targets this boundary satisfies
+                    while pending and pending[0] <= boundary:
+                        pending.pop(0)
+            # quote state at end of chunk
+            in_quotes ^= chunk.count(b'"', pos) % 2 == 1
+            chunk_start += len(chunk)
+    return boundaries
+
+
+def split_csv(file_path, num_ranges, header=True, chunk_size=SCAN_CHUNK_SIZE):
+    """
+        split a csv file into (about) num_ranges byte ranges of
+        (about) equal size. ranges start & end on record boundaries
+        so every range can be parsed on its own
+
+        params:
+            - file_path: location on disk to a CSV file
+            - num_ranges: number of ranges wanted
+            - header: whether the first record is a header (left out
+                      of the ranges)
+            - chunk_size: bytes read at a time
+        returns:
+            - list of (start, end) byte offsets (fewer than num_ranges
+              for small files, empty if there are no records)
+    """
+    # file size
+    file_size = os.path.getsize(file_path)
+    # evenly spaced split points
+    targets = [file_size * i // num_ranges for i in range(1, num_ranges)]
+    # end of header (first boundary past offset 0)
+    if header:
+        targets = [1] + targets
+    boundaries = find_record_boundaries(file_path, sorted(targets), chunk_size=chunk_size)
+    # header only file (w/o a trailing newline)
+    if header and not boundaries:
+        return []
+    # first record
+    start = boundaries.pop(0) if header else 0
+    # cut at boundaries
+    ranges = []
+    for end in boundaries + [file_size]:
+        if end > start:
+            ranges.append((start, end))
+            start = end
+    # log
+    logger.info("split: %s into %s range(s)" % (file_path, len(ranges)))
+    return ranges
+
+
+class FileRange(io.RawIOBase):
+    """
+        read only file object over a byte range of a file
+
+        init params:
+            - file_path: location on disk of the file
+            - start: first byte of the range
+            - end: byte right after the range
+    """
+    def __init__(self, file_path, start, end):
+        # open file at start of range
+        self.file = open(file_path, "rb")
+        self.file.seek(start)
+        # bytes left to read
+        self.remaining = end - start
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        """
+            read up to len(buffer) bytes (stops at the end of the range)
+
+            params:
+                - buffer: writable bytes like object
+        """
+        # limit to range
+        view = memoryview(buffer)[:self.remaining]
+        num_bytes = self.file.readinto(view)
+        self.remaining -= num_bytes
+        return num_bytes
+
+    def close(self):
+        if not self.closed:
+            self.file.close()
+        super().close()
+
+
+class StreamReader(io.RawIOBase):
+    """
+        raw file object reading from any stream with a read method
+        (e.g. a pyarrow input stream) so it can be wrapped in
+        io.BufferedReader / io.TextIOWrapper
+
+        init params:
+            - stream: object with read(num_bytes) & close()
+    """
+    def __init__(self, stream):
+        self.stream = stream
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        """
+            read up to len(buffer) bytes
+
+            params:
+                - buffer: writable bytes like object
+        """
+        data = self.stream.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self.stream.close()
+        super().close()
@@ -0,0 +1,217 @@
+# io
+import os
+import shutil
+# ordered (lru) writers
+from collections import OrderedDict
+# path escaping
+from urllib.parse import quote
+# arrow
+import numpy as np
+import pyarrow as pa
+# db value formatting
+from db2fs.writers import format_csv_value
+# logging
+import logging
+# config logger
+logger = logging.getLogger(__name__)
+
+# directory name of NULL / empty partition values (hive / spark convention)
+HIVE_DEFAULT_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+
+
+def to_partition_text(value):
+    """
+        format a partition value as a (escaped) directory name
+
+        params:
+            - value: value of a partition column
+    """
+    # NULL & empty strings
+    if value is None or value == "":
+        return HIVE_DEFAULT_PARTITION
+    # text as is, everything else as db literal
+    if not isinstance(value, str):
+        value = format_csv_value(value)
+    # escape path separators, "=", "%" ... (readers uri decode names)
+    return quote(value, safe="")
+
+
+class PartitionedDatasetWriter:
+    """
+        write arrow record batches to a hive style partitioned dataset
+        (dir/col=value/.../part-00000.parquet). rows are split by the
+        values of the partition columns, which are stored in the
+        directory names instead of the files. at most max_open_files
+        partition files are open at a time: the least recently used
+        one is closed when another partition shows up & a new part
+        file is started if that partition is seen again. the dataset
+        is written next to local_dir_path & swapped in once complete
+
+        init params:
+            - local_dir_path: location on disk of the dataset
+            - converter: object with get_schema() (& convert(rows)
+                         if write_rows is used) e.g. ArrowBatchConverter
+            - partition_by: list of partition column names
+            - writer_cls: ParquetBatchWriter or FeatherBatchWriter
+            - extension: file extension of part files
+            - max_open_files: max partition files open at a time
+            - writer_kwargs: extra kwargs of writer_cls (e.g. a small
+                             row_group_size to bound buffered rows)
+    """
+    def __init__(self, local_dir_path, converter, partition_by, writer_cls, extension=".parquet", max_open_files=64, writer_kwargs=None):
+        # output info
+        self.local_dir_path = local_dir_path
+        self.tmp_dir_path = local_dir_path + ".tmp"
+        self.extension = extension
+        # rows -> arrow
+        self.converter = converter
+        # partition columns
+        self.partition_by = list(partition_by)
+        # file writers
+        self.writer_cls = writer_cls
+        self.writer_kwargs = writer_kwargs or {}
+        self.max_open_files = max_open_files
+        # partition key -> open writer (least recently used first)
+        self.open_writers = OrderedDict()
+        # partition key -> number of part files started
+        self.part_counts = {}
+        # written part files
+        self.files = []
+        # number of rows written
+        self.num_rows = 0
+        # start from an empty temp dir
+        shutil.rmtree(self.tmp_dir_path, ignore_errors=True)
+        os.makedirs(self.tmp_dir_path)
+
+    def get_schema(self):
+        """
+            get schema of part files (partition columns removed)
+        """
+        return pa.schema([
+            field for field in self.converter.get_schema()
+            if field.name not in self.partition_by
+        ])
+
+    def check_schema(self, schema):
+        """
+            make sure partition columns are selected & at least one
+            column is left for the files (raises ValueError)
+
+            params:
+                - schema: arrow schema of the query
+        """
+        # partition columns not in query
+        missing_columns = [column for column in self.partition_by if column not in schema.names]
+        if missing_columns:
+            raise ValueError(
+                "partition column(s): %s not selected (columns: %s)" % (missing_columns, schema.names)
+            )
+        # nothing left to write
+        if len(schema.names) == len(self.partition_by):
+            raise ValueError("at least one column must not be a partition column")
+
+    def get_partition_path(self, key):
+        """
+            get directory of a partition
+
+            params:
+                - key: tuple of partition values
+        """
+        return os.path.join(self.tmp_dir_path, *[
+            "%s=%s" % (quote(column, safe=""), to_partition_text(value))
+            for column, value in zip(self.partition_by, key)
+        ])
+
+    def get_writer(self, key):
+        """
+            get (or open) the file writer of a partition
+
+            params:
+                - key: tuple of partition values
+        """
+        # mark as most recently used
+        file_writer = self.open_writers.pop(key, None)
+        if file_writer is None:
+            # close least recently used file
+            if len(self.open_writers) >= self.max_open_files:
+                _, lru_writer = self.open_writers.popitem(last=False)
+                lru_writer.close()
+            # next part file of partition
+            part_index = self.part_counts.get(key, 0)
+            self.part_counts[key] = part_index + 1
+            # open file
+            partition_path = self.get_partition_path(key)
+            os.makedirs(partition_path, exist_ok=True)
+            part_path = os.path.join(partition_path, "part-%05d%s" % (part_index, self.extension))
+            file_writer = self.writer_cls(part_path, self, **self.writer_kwargs)
+            self.files.append(part_path)
+        self.open_writers[key] = file_writer
+        return file_writer
+
+    def write_batch(self, record_batch):
+        """
+            split an arrow record batch by partition & write the parts
+
+            params:
+                - record_batch: arrow record batch
+        """
+        # check partition columns once
+        if self.num_rows == 0:
+            self.check_schema(record_batch.schema)
+        # nothing to split
+        if record_batch.num_rows == 0:
+            return
+        # number rows by partition (dense codes so they never overflow)
+        codes = np.zeros(record_batch.num_rows, dtype=np.int64)
+        for column in self.partition_by:
+            encoded = record_batch.column(column).dictionary_encode(null_encoding="encode")
+            indices = encoded.indices.to_numpy(zero_copy_only=False).astype(np.int64)
+            _, codes = np.unique(codes * len(encoded.dictionary) + indices, return_inverse=True)
+        # group rows of each partition together (keeps row order)
+        order = np.argsort(codes, kind="stable")
+        sorted_codes = codes[order]
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(sorted_codes)) + 1))
+        ends = np.append(starts[1:], len(order))
+        # drop partition columns & reorder rows
+        data = record_batch.select(self.get_schema().names).take(pa.array(order))
+        # write every partition
+        for start, end in zip(starts, ends):
+            # partition values (from first row of partition)
+            row_index = order[start]
+            key = tuple(
+                record_batch.column(column)[row_index].as_py()
+                for column in self.partition_by
+            )
+            # write rows (zero copy slice)
+            self.get_writer(key).write_batch(data.slice(start, end - start))
+        # count rows
+        self.num_rows += record_batch.num_rows
+
+    def write_rows(self, rows):
+        """
+            add a batch of rows
+
+            params:
+                - rows: list of tuples returned by fetchmany
+        """
+        # convert rows & add batch
+        self.write_batch(self.converter.convert(rows))
+
+    def close(self):
+        """
+            close all files & replace the previous dataset
+        """
+        # close open files
+        while self.open_writers:
+            _, file_writer = self.open_writers.popitem(last=False)
+            file_writer.close()
+        # part paths once published
+        self.files = [
+            os.path.join(self.local_dir_path, os.path.relpath(part_path, self.tmp_dir_path))
+            for part_path in self.files
+        ]
+        # swap datasets
+        shutil.rmtree(self.local_dir_path, ignore_errors=True)
+        os.replace(self.tmp_dir_path, self.local_dir_path)
+        # log
+        logger.info("wrote %s rows to %s files in: %s" % (self.num_rows, len(self.files), self.local_dir_path))
@@ -0,0 +1,650 @@
+# binary parsing
+import struct
+# types
+import decimal
+import uuid
+# arrow
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+# arrow types of db columns
+from db2fs.writers import get_arrow_type
+
+# header every binary COPY stream starts with
+PGCOPY_SIGNATURE = b"PGCOPY\n\xff\r\n\x00"
+# postgres epoch (2000-01-01) relative to unix epoch
+PG_EPOCH_DAYS = 10957
+PG_EPOCH_MICROS = 946684800000000
+
+# fixed width types: oid -> big endian numpy dtype
+FIXED_WIDTH_DTYPES = {
+    16: np.dtype("?"),
+    20: np.dtype(">i8"),
+    21: np.dtype(">i2"),
+    23: np.dtype(">i4"),
+    26: np.dtype(">u4"),
+    700: np.dtype(">f4"),
+    701: np.dtype(">f8"),
+    1082: np.dtype(">i4"),
+    1083: np.dtype(">i8"),
+    1114: np.dtype(">i8"),
+    1184: np.dtype(">i8"),
+}
+# text like types sent as raw utf-8
+TEXT_TYPES = {18, 19, 25, 114, 1042, 1043}
+# other types decoded here (bytea, uuid, numeric, jsonb)
+VARIABLE_WIDTH_TYPES = TEXT_TYPES | {17, 1700, 2950, 3802}
+
+# struct readers
+read_int16 = struct.Struct(">h").unpack_from
+read_int32 = struct.Struct(">i").unpack_from
+# numeric signs
+NUMERIC_NEGATIVE = 0x4000
+NUMERIC_NAN = 0xC000
+# decimal context big enough for any postgres numeric
+NUMERIC_CONTEXT = decimal.Context(prec=1000)
+
+
+def decode_numeric(data):
+    """
+        decode a binary postgres numeric into a Decimal
+
+        params:
+            - data: bytes of a numeric value
+    """
+    # header: number of digits, weight, sign, display scale
+    num_digits, weight, sign, scale = struct.unpack_from(">hhHh", data)
+    # special values
+    if sign == NUMERIC_NAN:
+        return decimal.Decimal("NaN")
+    if sign > NUMERIC_NAN:
+        return decimal.Decimal("Infinity" if sign == 0xD000 else "-Infinity")
+    # base 10000 digits
+    digits = struct.unpack_from(">%dh" % num_digits, data, 8)
+    # combine digits into an integer
+    value = 0
+    for digit in digits:
+        value = value * 10000 + digit
+    # shift by weight of the last digit
+    result = decimal.Decimal(value).scaleb(4 * (weight - num_digits + 1), NUMERIC_CONTEXT)
+    # apply display scale
+    result = result.quantize(decimal.Decimal(1).scaleb(-scale), context=NUMERIC_CONTEXT)
+    # apply sign
+    return -result if sign == NUMERIC_NEGATIVE else result
+
+
+def is_binary_supported(type_code):
+    """
+        check if a postgres type can be decoded from binary COPY
+        (other types are cast to text in the query)
+
+        params:
+            - type_code: postgres type oid
+    """
+    return type_code in FIXED_WIDTH_DTYPES or type_code in VARIABLE_WIDTH_TYPES
+
+
+class BinaryCopyDecoder:
+    """
+        decode a postgres COPY ... TO STDOUT WITH (FORMAT binary)
+        stream into arrow record batches. used as the file object
+        passed to cursor.copy_expert: every write gets a chunk of the
+        stream (libpq hands over one tuple per chunk). chunks are
+        buffered & every batch_rows tuples (or max_batch_bytes of
+        buffered tuples, whichever comes first) the fields are located &
+        gathered per column with numpy, so there is no python work per
+        value for fixed width & text columns. the batch is handed to
+        on_batch as an arrow record batch
+
+        init params:
+            - description: cursor.description of the copied query
+                           (types not supported must be cast to text)
+            - on_batch: function called with each record batch
+            - batch_rows: max rows per record batch
+            - max_batch_bytes: max bytes of tuple data per record batch
+    """
+    def __init__(self, description, on_batch, batch_rows=65536, max_batch_bytes=None):
+        # column names & type oids
+        self.names = [column[0] for column in description]
+        self.type_codes = [column[1] for column in description]
+        # arrow schema
+        self.schema = pa.schema([
+            (column[0], get_arrow_type("pg", column) or pa.string())
+            for column in description
+        ])
+        # batch handling
+        self.on_batch = on_batch
+        self.batch_rows = batch_rows
+        self.max_batch_bytes = max_batch_bytes
+        # tuple bytes not converted yet
+        self.buffer = bytearray()
+        # offset of every chunk written to the buffer
+        self.chunk_starts = []
+        # stream header (until fully read)
+        self.header = bytearray()
+        self.header_read = False
+        # number of rows decoded
+        self.num_rows = 0
+        # number of record batches
+        self.num_batches = 0
+
+    def get_schema(self):
+        """
+            get arrow schema of the decoded batches
+        """
+        return self.schema
+
+    def read_header(self, data):
+        """
+            read stream header (signature, flags & extension area)
+
+            params:
+                - data: bytes written by copy_expert
+            returns:
+                - bytes following the header (None if incomplete)
+        """
+        # collect header bytes
+        self.header += data
+        # signature (11) + flags (4) + extension length (4)
+        if len(self.header) < 19:
+            return None
+        # check signature
+        if bytes(self.header[:11]) != PGCOPY_SIGNATURE:
+            raise ValueError("invalid binary COPY signature")
+        # skip header extension
+        header_length = 19 + read_int32(self.header, 15)[0]
+        # wait for extension area
+        if len(self.header) < header_length:
+            return None
+        # header done
+        self.header_read = True
+        return bytes(self.header[header_length:])
+
+    def write(self, data):
+        """
+            buffer a chunk of the COPY stream
+
+            params:
+                - data: bytes written by copy_expert
+        """
+        # strip header from first chunk(s)
+        if not self.header_read:
+            data = self.read_header(data)
+            # header incomplete or header only chunk
+            if not data:
+                return
+        # remember where chunk starts & buffer it
+        self.chunk_starts.append(len(self.buffer))
+        self.buffer += data
+        # convert batch
+        if len(self.chunk_starts) >= self.batch_rows:
+            self.flush()
+        # convert batch early if rows are wide
+        elif self.max_batch_bytes is not None and len(self.buffer) >= self.max_batch_bytes:
+            self.flush()
+
+    def locate_fields(self, data):
+        """
+            locate fields assuming every chunk is one tuple (what
+            libpq does): all rows are walked column by column with
+            numpy
+
+            params:
+                - data: numpy uint8 view of the buffer
+            returns:
+                - (starts, lengths) as (rows, columns) arrays or None
+                  if chunks don't line up with tuples
+        """
+        # chunk positions
+        row_starts = np.array(self.chunk_starts, dtype=np.int64)
+        row_ends = np.append(row_starts[1:], len(data))
+        # ignore end of stream marker (-1 field count)
+        if row_ends[-1] - row_starts[-1] == 2 and read_int16(self.buffer, int(row_starts[-1]))[0] == -1:
+            row_starts, row_ends = row_starts[:-1], row_ends[:-1]
+        # every chunk must be large enough for its field count
+        if (row_ends - row_starts < 2).any():
+            return None
+        # field counts must match columns
+        field_counts = data[row_starts[:, None] + np.arange(2)].view(">i2").ravel()
+        if (field_counts != len(self.names)).any():
+            return None
+        # walk columns for all rows at once
+        starts = np.empty((len(row_starts), len(self.names)), dtype=np.int64)
+        lengths = np.empty_like(starts)
+        positions = row_starts + 2
+        for index in range(len(self.names)):
+            # length field must be inside the chunk
+            if (positions + 4 > row_ends).any():
+                return None
+            # read lengths (-1 = NULL)
+            lengths[:, index] = data[positions[:, None] + np.arange(4)].view(">i4").ravel()
+            starts[:, index] = positions + 4
+            positions = starts[:, index] + np.maximum(lengths[:, index], 0)
+        # tuples must end exactly where chunks end
+        if (positions != row_ends).any():
+            return None
+        return starts, lengths
+
+    def scan_fields(self):
+        """
+            locate fields by scanning tuple by tuple (used when chunks
+            don't line up with tuples)
+
+            returns:
+                - (starts, lengths) as (rows, columns) arrays & the
+                  number of bytes holding complete tuples
+        """
+        buf = self.buffer
+        buf_len = len(buf)
+        starts, lengths = [], []
+        pos = tuple_end = 0
+        # scan complete tuples
+        while pos + 2 <= buf_len:
+            # number of fields (-1 = end of stream)
+            field_count = read_int16(buf, pos)[0]
+            if field_count == -1:
+                tuple_end = buf_len
+                break
+            # fields scanned so far (to undo incomplete tuples)
+            mark = len(starts)
+            field_pos = pos + 2
+            for field_index in range(field_count):
+                # incomplete length
+                if field_pos + 4 > buf_len:
+                    field_pos = buf_len + 1
+                    break
+                # field length (-1 = NULL)
+                length = read_int32(buf, field_pos)[0]
+                field_pos += 4
+                starts.append(field_pos)
+                lengths.append(length)
+                if length > 0:
+                    field_pos += length
+            # tuple not complete: keep for next batch
+            if field_pos > buf_len:
+                del starts[mark:], lengths[mark:]
+                break
+            # tuple done
+            pos = tuple_end = field_pos
+        # positions as (rows, columns)
+        num_columns = len(self.names)
+        return (
+            np.array(starts, dtype=np.int64).reshape(-1, num_columns),
+            np.array(lengths, dtype=np.int64).reshape(-1, num_columns),
+            tuple_end
+        )
+
+    def gather_fixed(self, data, starts, nulls, dtype):
+        """
+            gather fixed width values of a column into a numpy array
+
+            params:
+                - data: numpy uint8 view of the buffer
+                - starts: start of each value
+                - nulls: boolean mask of NULL values
+                - dtype: big endian numpy dtype of values
+        """
+        # NULLs read the first bytes of the buffer (masked later)
+        starts = np.where(nulls, 0, starts)
+        # byte positions of each value
+        positions = starts[:, None] + np.arange(dtype.itemsize)
+        # gather & reinterpret bytes
+        return data[positions].view(dtype).ravel().astype(dtype.newbyteorder("="))
+
+    def gather_variable(self, data, starts, lengths, nulls):
+        """
+            gather variable width values of a column into an arrow
+            binary array without creating python objects
+
+            params:
+                - data: numpy uint8 view of the buffer
+                - starts: start of each value
+                - lengths: length of each value
+                - nulls: boolean mask of NULL values
+        """
+        # NULLs are empty
+        lengths = np.where(nulls, 0, lengths)
+        # arrow offsets
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        # byte positions of all values laid end to end
+        positions = np.repeat(starts - offsets[:-1], lengths) + np.arange(offsets[-1])
+        # validity bitmap
+        validity = pa.py_buffer(np.packbits(~nulls, bitorder="little")) if nulls.any() else None
+        # build array from buffers
+        return pa.Array.from_buffers(
+            pa.large_binary(),
+            len(lengths),
+            [validity, pa.py_buffer(offsets), pa.py_buffer(data[positions])]
+        ).cast(pa.binary())
+
+    def python_values(self, starts, lengths, nulls, decode):
+        """
+            decode values of a column one by one (rare types)
+
+            params:
+                - starts: start of each value
+                - lengths: length of each value
+                - nulls: boolean mask of NULL values
+                - decode: function converting bytes into a python value
+        """
+        buf = self.buffer
+        return [
+            None if null else decode(bytes(buf[start:start + length]))
+            for start, length, null in zip(starts.tolist(), lengths.tolist(), nulls.tolist())
+        ]
+
+    def convert_column(self, data, starts, lengths, type_code, arrow_type):
+        """
+            convert binary values of a column into an arrow array
+
+            params:
+                - data: numpy uint8 view of the buffer
+                - starts: start of each value
+                - lengths: length of each value (-1 = NULL)
+                - type_code: postgres type oid
+                - arrow_type: arrow type of column
+        """
+        # NULL mask
+        nulls = lengths == -1
+        mask = nulls if nulls.any() else None
+        # fixed width: decode whole column with numpy
+        if type_code in FIXED_WIDTH_DTYPES:
+            values = self.gather_fixed(data, starts, nulls, FIXED_WIDTH_DTYPES[type_code])
+            # infinity / -infinity dates & timestamps (int max / min)
+            # have no arrow value so they are converted to NULL
+            if type_code in (1082, 1114, 1184):
+                limits = np.iinfo(values.dtype)
+                infinite = (values == limits.max) | (values == limits.min)
+                if infinite.any():
+                    nulls = nulls | infinite
+                    mask = nulls
+                    values = np.where(infinite, 0, values)
+            # dates: days since 2000-01-01
+            if type_code == 1082:
+                return pa.array(values + PG_EPOCH_DAYS, mask=mask, type=pa.int32()).cast(arrow_type)
+            # timestamps: microseconds since 2000-01-01
+            if type_code in (1114, 1184):
+                return pa.array(values + PG_EPOCH_MICROS, mask=mask, type=pa.int64()).cast(arrow_type)
+            # time: microseconds since midnight
+            if type_code == 1083:
+                return pa.array(values, mask=mask, type=pa.int64()).cast(arrow_type)
+            return pa.array(values, mask=mask, type=arrow_type)
+        # jsonb: skip version byte
+        if type_code == 3802:
+            starts, lengths = starts + 1, lengths - 1
+        # bytea
+        if type_code == 17:
+            return self.gather_variable(data, starts, lengths, nulls)
+        # uuid
+        if type_code == 2950:
+            return pa.array(
+                self.python_values(starts, lengths, nulls, lambda value: str(uuid.UUID(bytes=value))),
+                type=arrow_type
+            )
+        # numeric
+        if type_code == 1700:
+            numbers = self.python_values(starts, lengths, nulls, decode_numeric)
+            # exact decimals (NaN / infinity can't be stored)
+            if pa.types.is_decimal(arrow_type):
+                return pa.array([
+                    None if number is None or not number.is_finite() else number
+                    for number in numbers
+                ], type=arrow_type)
+            # unbounded numerics as text
+            return pa.array([None if number is None else str(number) for number in numbers], type=arrow_type)
+        # text (incl. values cast to text): validated & decoded by arrow
+        return self.gather_variable(data, starts, lengths, nulls).cast(pa.string())
+
+    def flush(self):
+        """
+            convert buffered tuples into a record batch
+        """
+        # nothing to convert
+        if not self.chunk_starts:
+            return
+        # numpy view of buffered bytes
+        data = np.frombuffer(self.buffer, dtype=np.uint8)
+        # fast path: one tuple per chunk
+        located = self.locate_fields(data)
+        if located is not None:
+            starts, lengths = located
+            used_bytes = len(self.buffer)
+        # slow path: scan tuples
+        else:
+            starts, lengths, used_bytes = self.scan_fields()
+        # convert columns
+        arrays = [
+            self.convert_column(data, starts[:, index], lengths[:, index], type_code, arrow_type)
+            for index, (type_code, arrow_type) in enumerate(zip(self.type_codes, self.schema.types))
+        ]
+        # release view so the buffer can be trimmed
+        del data
+        # hand batch over
+        if len(starts):
+            self.on_batch(pa.RecordBatch.from_arrays(arrays, schema=self.schema))
+            self.num_batches += 1
+        # drop converted bytes (incomplete tuples stay)
+        del self.buffer[:used_bytes]
+        self.chunk_starts = [0] if self.buffer else []
+        # count rows
+        self.num_rows += len(starts)
+
+
+def encode_numeric(value):
+    """
+        encode a Decimal into a binary postgres numeric
+
+        params:
+            - value: Decimal
+    """
+    # special values
+    if value.is_nan():
+        return struct.pack(">hhHh", 0, 0, NUMERIC_NAN, 0)
+    if value.is_infinite():
+        return struct.pack(">hhHh", 0, 0, 0xF000 if value < 0 else 0xD000, 0)
+    # sign, decimal digits & exponent
+    sign, digits, exponent = value.as_tuple()
+    # display scale
+    scale = max(0, -exponent)
+    # all digits as an integer (value = number * 10 ** exponent)
+    number = int("".join(map(str, digits)) or "0")
+    # align exponent to base 10000 digits
+    padding = exponent % 4
+    number, exponent = number * 10 ** padding, exponent - padding
+    # base 10000 digits (most significant first)
+    groups = []
+    while number:
+        number, group = divmod(number, 10000)
+        groups.append(group)
+    groups.reverse()
+    # weight of the first digit
+    weight = len(groups) - 1 + exponent // 4 if groups else 0
+    # trailing zero digits are implied
+    while groups and groups[-1] == 0:
+        groups.pop()
+    return struct.pack(
+        ">hhHh%dh" % len(groups),
+        len(groups),
+        weight,
+        NUMERIC_NEGATIVE if sign else 0,
+        scale,
+        *groups
+    )
+
+
+# types encoded for binary COPY FROM (interval sent as micros, days, months)
+INTERVAL_DTYPE = np.dtype([("micros", ">i8"), ("days", ">i4"), ("months", ">i4")])
+ENCODED_TYPES = set(FIXED_WIDTH_DTYPES) | VARIABLE_WIDTH_TYPES | {1186}
+# column types cast without checks (precision / sub microseconds are lost
+# like with text input)
+UNSAFE_CAST_TYPES = {700, 701, 1083, 1114, 1184, 1186}
+
+
+def is_binary_encodable(type_code):
+    """
+        check if values of a postgres type can be sent with binary
+        COPY FROM (see BinaryCopyEncoder)
+
+        params:
+            - type_code: postgres type oid
+    """
+    return type_code in ENCODED_TYPES
+
+
+class BinaryCopyEncoder:
+    """
+        encode arrow record batches into a postgres COPY ... FROM
+        STDIN WITH (FORMAT binary) stream. binary input must match
+        the table column types exactly, so every column is first cast
+        to the arrow type of the table column it is loaded into. the
+        tuples are then laid out for all rows at once with numpy, so
+        there is no python work per value (except for numeric & uuid
+        columns)
+
+        init params:
+            - description: cursor.description of the table columns
+                           (e.g. of SELECT * FROM table LIMIT 0). all
+                           types must be binary encodable
+    """
+    def __init__(self, description):
+        # column type oids
+        self.type_codes = [column[1] for column in description]
+        # arrow types of table columns
+        self.arrow_types = [get_arrow_type("pg", column) or pa.string() for column in description]
+
+    def get_header(self):
+        """
+            get stream header (signature, flags & empty extension area)
+        """
+        return PGCOPY_SIGNATURE + struct.pack(">ii", 0, 0)
+
+    def get_trailer(self):
+        """
+            get end of stream marker
+        """
+        return struct.pack(">h", -1)
+
+    def encode_values(self, values, nulls, encode):
+        """
+            encode values of a column one by one (rare types)
+
+            params:
+                - values: python values
+                - nulls: boolean mask of NULL values
+                - encode: function converting a value into bytes
+            returns:
+                - (lengths, data, starts) see encode_column
+        """
+        # encoded values (NULLs are empty)
+        encoded = [b"" if null else encode(value) for value, null in zip(values, nulls.tolist())]
+        lengths = np.array([len(value) for value in encoded], dtype=np.int64)
+        # values laid end to end
+        starts = np.zeros(len(encoded), dtype=np.int64)
+        np.cumsum(lengths[:-1], out=starts[1:])
+        return np.where(nulls, -1, lengths), np.frombuffer(b"".join(encoded), dtype=np.uint8), starts
+
+    def encode_column(self, column, type_code, arrow_type):
+        """
+            encode the values of a column
+
+            params:
+                - column: arrow array
+                - type_code: postgres type oid of table column
+                - arrow_type: arrow type of table column
+            returns:
+                - (lengths, data, starts): field lengths (-1 = NULL) &
+                  either a (rows, width) uint8 array of fixed width
+                  values (starts None) or a uint8 array of values laid
+                  end to end & the start of each value
+        """
+        # NULL mask
+        nulls = column.is_null().to_numpy(zero_copy_only=False)
+        # numeric: exact decimals
+        if type_code == 1700:
+            return self.encode_values(
+                column.to_pylist(),
+                nulls,
+                lambda value: encode_numeric(value if isinstance(value, decimal.Decimal) else decimal.Decimal(repr(value) if isinstance(value, float) else str(value)))
+            )
+        # cast to type of table column
+        column = column.cast(arrow_type, safe=type_code not in UNSAFE_CAST_TYPES)
+        # uuid: 16 bytes
+        if type_code == 2950:
+            return self.encode_values(column.to_pylist(), nulls, lambda value: uuid.UUID(value).bytes)
+        # interval: microseconds (days & months are 0)
+        if type_code == 1186:
+            values = np.zeros(len(column), dtype=INTERVAL_DTYPE)
+            values["micros"] = column.cast(pa.int64()).fill_null(0).to_numpy()
+            return np.where(nulls, -1, INTERVAL_DTYPE.itemsize), values.view(np.uint8).reshape(-1, INTERVAL_DTYPE.itemsize), None
+        # fixed width: convert whole column with numpy
+        if type_code in FIXED_WIDTH_DTYPES:
+            dtype = FIXED_WIDTH_DTYPES[type_code]
+            # dates: days since 2000-01-01
+            if type_code == 1082:
+                values = column.cast(pa.int32()).fill_null(0).to_numpy() - PG_EPOCH_DAYS
+            # timestamps: microseconds since 2000-01-01
+            elif type_code in (1114, 1184):
+                values = column.cast(pa.int64()).fill_null(0).to_numpy() - PG_EPOCH_MICROS
+            # time: microseconds since midnight
+            elif type_code == 1083:
+                values = column.cast(pa.int64()).fill_null(0).to_numpy()
+            else:
+                values = column.fill_null(False if type_code == 16 else 0).to_numpy(zero_copy_only=False)
+            return np.where(nulls, -1, dtype.itemsize), values.astype(dtype).view(np.uint8).reshape(-1, dtype.itemsize), None
+        # jsonb: version byte
+        if type_code == 3802:
+            column = pc.binary_join_element_wise("\x01", column, "")
+        # text & bytea: raw bytes from arrow buffers
+        column = column.cast(pa.large_binary())
+        validity, offsets, data = column.buffers()
+        offsets = np.frombuffer(offsets, dtype=np.int64)[column.offset:column.offset + len(column) + 1]
+        data = np.frombuffer(data, dtype=np.uint8) if data is not None else np.zeros(0, dtype=np.uint8)
+        return np.where(nulls, -1, np.diff(offsets)), data, offsets[:-1]
+
+    def encode(self, batch):
+        """
+            encode the tuples of a record batch (w/o header or trailer)
+
+            params:
+                - batch: arrow record batch (one column per table column)
+            returns:
+                - bytes
+        """
+        # check columns
+        if batch.num_columns != len(self.type_codes):
+            raise ValueError("batch has %s columns, table has %s" % (batch.num_columns, len(self.type_codes)))
+        # encode columns
+        fields = [
+            self.encode_column(column, type_code, arrow_type)
+            for column, type_code, arrow_type in zip(batch.columns, self.type_codes, self.arrow_types)
+        ]
+        # tuple sizes: field count + (length + value) per field
+        row_sizes = np.full(batch.num_rows, 2 + 4 * len(fields), dtype=np.int64)
+        for lengths, data, starts in fields:
+            row_sizes += np.maximum(lengths, 0)
+        row_starts = np.zeros(batch.num_rows, dtype=np.int64)
+        np.cumsum(row_sizes[:-1], out=row_starts[1:])
+        # output buffer
+        out = np.empty(int(row_sizes.sum()), dtype=np.uint8)
+        # field count
+        out[row_starts[:, None] + np.arange(2)] = np.array([len(fields)], dtype=">i2").view(np.uint8)
+        positions = row_starts + 2
+        for lengths, data, starts in fields:
+            # field lengths
+            out[positions[:, None] + np.arange(4)] = lengths.astype(">i4").view(np.uint8).reshape(-1, 4)
+            positions = positions + 4
+            # NULLs have no value
+            value_lengths = np.maximum(lengths, 0)
+            if starts is None:
+                # fixed width values
+                present = lengths >= 0
+                out[positions[present][:, None] + np.arange(data.shape[1])] = data[present]
+            else:
+                # variable width values: copy all bytes at once
+                value_offsets = np.zeros(len(value_lengths), dtype=np.int64)
+                np.cumsum(value_lengths[:-1], out=value_offsets[1:])
+                byte_index = np.arange(int(value_lengths.sum()))
+                out[np.repeat(positions - value_offsets, value_lengths) + byte_index] = data[np.repeat(starts - value_offsets, value_lengths) + byte_index]
+            positions = positions + value_lengths
+        return out.tobytes()
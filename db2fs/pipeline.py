@@ -0,0 +1,164 @@
+# io
+import os
+# upload threads
+import queue
+import threading
+# logging
+import logging
+# config logger
+logger = logging.getLogger(__name__)
+
+
+class UploadPipeline:
+    """
+        upload files to cloud storage on a pool of threads while
+        more files are being extracted. files are queued with submit
+        as soon as they are written. once max_queued files wait for
+        an upload submit blocks, which stops new extraction tasks
+        from starting (see run_tasks max_ahead). every upload is
+        verified by comparing the size of the uploaded object with
+        the local file before the file is (optionally) deleted
+
+        init params:
+            - middleware: AWSS3Middleware, GCPStorageMiddleware or
+                          AzureStorageMiddleware
+            - bucket_name: bucket / container to upload to
+            - base_dir_path: object keys are file paths relative to
+                             this dir (e.g. the download dir)
+            - prefix: prefix added to object keys
+            - workers: number of upload threads
+            - max_queued: files waiting for an upload before submit blocks
+            - delete_after_upload: remove local files once uploaded
+    """
+    def __init__(self, middleware, bucket_name, base_dir_path, prefix=None, workers=4, max_queued=8, delete_after_upload=False):
+        # aws / gcp buckets
+        if hasattr(middleware, "upload_bucket_file"):
+            self.upload_file = middleware.upload_bucket_file
+            self.get_file_size = middleware.get_bucket_file_size
+        # azure containers
+        else:
+            self.upload_file = middleware.upload_container_file
+            self.get_file_size = middleware.get_container_file_size
+        # destination
+        self.bucket_name = bucket_name
+        self.base_dir_path = base_dir_path
+        self.prefix = prefix
+        # local files
+        self.delete_after_upload = delete_after_upload
+        # files waiting for an upload (None = stop)
+        self.pending = queue.Queue(maxsize=max_queued)
+        # uploaded keys & failed files (path, error)
+        self.uploaded = []
+        self.failed = []
+        self.lock = threading.Lock()
+        # start upload threads
+        self.threads = [threading.Thread(target=self.run, daemon=True) for _ in range(workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def get_key(self, local_file_path):
+        """
+            get object key of a local file
+
+            params:
+                - local_file_path: location of file on disk
+        """
+        # path relative to base dir (keeps dataset dirs)
+        key = os.path.relpath(local_file_path, self.base_dir_path).replace(os.sep, "/")
+        # add prefix
+        if self.prefix is not None:
+            key = self.prefix.rstrip("/") + "/" + key
+        return key
+
+    def upload(self, local_file_path):
+        """
+            upload a file & verify the uploaded size
+
+            params:
+                - local_file_path: location of file on disk
+        """
+        # object key
+        key = self.get_key(local_file_path)
+        # local size (before the file could be removed)
+        file_size = os.path.getsize(local_file_path)
+        # upload (middlewares log errors instead of raising some)
+        self.upload_file(self.bucket_name, local_file_path, key=key)
+        # verify upload
+        uploaded_size = self.get_file_size(self.bucket_name, key)
+        if uploaded_size != file_size:
+            raise IOError(
+                "upload of: %s to: %s failed (size: %s, uploaded: %s)" % (
+                    local_file_path,
+                    key,
+                    file_size,
+                    uploaded_size
+                )
+            )
+        # free local disk
+        if self.delete_after_upload:
+            os.remove(local_file_path)
+        # log
+        logger.info("uploaded: %s to: %s" % (local_file_path, key))
+        return key
+
+    def run(self):
+        """
+            upload files until None is received
+        """
+        while True:
+            # next file
+            local_file_path = self.pending.get()
+            # done
+            if local_file_path is None:
+                return
+            try:
+                key = self.upload(local_file_path)
+            except Exception as err:
+                # log (file is kept)
+                logger.error("upload of: %s failed w/ err: %s" % (local_file_path, str(err)))
+                with self.lock:
+                    self.failed.append((local_file_path, err))
+            else:
+                with self.lock:
+                    self.uploaded.append(key)
+
+    def submit(self, local_file_path):
+        """
+            queue a file for upload (blocks while max_queued files
+            are waiting)
+
+            params:
+                - local_file_path: location of file on disk
+        """
+        self.pending.put(local_file_path)
+
+    def close(self):
+        """
+            wait for queued uploads to finish (raises IOError if
+            any upload failed)
+        """
+        # stop threads once queue is drained
+        for _ in self.threads:
+            self.pending.put(None)
+        for thread in self.threads:
+            thread.join()
+        # report failed uploads
+        if self.failed:
+            raise IOError(
+                "%s upload(s) failed: %s" % (
+                    len(self.failed),
+                    [local_file_path for local_file_path, err in self.failed]
+                )
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # finish uploads of files extracted before an error too
+        try:
+            self.close()
+        except IOError:
+            # don't hide the original error
+            if exc_type is None:
+                raise
@@ -0,0 +1,180 @@
+# io
+import io
+import os
+# compressed output
+from db2fs.compression import open_compressed, wrap_compressed
+# logging
+import logging
+# config logger
+logger = logging.getLogger(__name__)
+
+
+class RollingFileWriter(io.RawIOBase):
+    """
+        binary file object spreading a row stream over several part
+        files. every write must be exactly one row (what postgres
+        COPY & CSVBatchWriter with row_writes=True do) so parts are
+        only ever cut between rows. a part is written under a temp
+        name & renamed once complete, so readers (or uploads) can
+        start on finished parts while later ones are being written
+
+        init params:
+            - get_part_path: function returning the path of part n
+            - compression: None, "gzip", "bz2", "zstd" or "lz4"
+            - max_rows: max rows per part
+            - max_bytes: max (uncompressed) bytes per part
+            - header: whether the first write is a header repeated
+                      at the top of every part
+            - on_part_complete: function called with the path, rows
+                                & bytes of every finished part
+            - sink: function returning a writable stream for a file
+                    name (e.g. an upload stream). parts are streamed
+                    there instead of to disk & named by file name
+    """
+    def __init__(self, get_part_path, compression=None, max_rows=None, max_bytes=None, header=False, on_part_complete=None, sink=None):
+        # part naming
+        self.get_part_path = get_part_path
+        self.compression = compression
+        # part limits
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        # header handling
+        self.header = None
+        self.expect_header = header
+        # finished part callback
+        self.on_part_complete = on_part_complete
+        # streamed output
+        self.sink = sink
+        # finished parts (dicts of path, rows, bytes)
+        self.parts = []
+        # current part
+        self.part_file = None
+        self.part_rows = 0
+        self.part_bytes = 0
+        # total rows written
+        self.num_rows = 0
+
+    def writable(self):
+        return True
+
+    def open_part(self):
+        """
+            start next part (under a temp name) & repeat header
+        """
+        # part path
+        part_path = self.get_part_path(len(self.parts))
+        if self.sink is not None:
+            # stream part
+            self.part_file = wrap_compressed(self.sink(os.path.basename(part_path)), self.compression)
+        else:
+            # temp location of part
+            self.part_file = open_compressed(part_path + ".tmp", self.compression)
+        self.part_rows = 0
+        self.part_bytes = 0
+        # every part is readable on its own
+        if self.header is not None:
+            self.part_file.write(self.header)
+            self.part_bytes += len(self.header)
+
+    def close_part(self):
+        """
+            finish current part & make it visible
+        """
+        # part path
+        part_path = self.get_part_path(len(self.parts))
+        # flush & close (waits for compression / completes upload)
+        self.part_file.close()
+        self.part_file = None
+        if self.sink is not None:
+            # streamed parts are named by file name
+            part_path = os.path.basename(part_path)
+        else:
+            # publish part
+            os.replace(part_path + ".tmp", part_path)
+        # record part
+        part = {"path": part_path, "rows": self.part_rows, "bytes": self.part_bytes}
+        self.parts.append(part)
+        # log
+        logger.info("finished part: %s" % part)
+        # report part
+        if self.on_part_complete is not None:
+            self.on_part_complete(part_path, self.part_rows, self.part_bytes)
+
+    def write(self, data):
+        """
+            write one row (or the header)
+
+            params:
+                - data: bytes (like) object
+        """
+        # keep header to repeat on every part
+        if self.expect_header:
+            self.expect_header = False
+            self.header = bytes(data)
+            if self.part_file is None:
+                self.open_part()
+            else:
+                self.part_file.write(self.header)
+                self.part_bytes += len(self.header)
+            return len(data)
+        # first part
+        if self.part_file is None:
+            self.open_part()
+        # roll over when the row doesn't fit (parts have at least one row)
+        elif self.part_rows > 0 and (
+            (self.max_rows is not None and self.part_rows >= self.max_rows) or
+            (self.max_bytes is not None and self.part_bytes + len(data) > self.max_bytes)
+        ):
+            self.close_part()
+            self.open_part()
+        # write row
+        self.part_file.write(data)
+        self.part_rows += 1
+        self.part_bytes += len(data)
+        self.num_rows += 1
+        return len(data)
+
+    def close(self):
+        """
+            finish last part (an empty result still gets one part)
+        """
+        if self.closed:
+            return
+        try:
+            # empty result
+            if self.part_file is None:
+                self.open_part()
+            self.close_part()
+        finally:
+            super().close()
+
+    def abort(self):
+        """
+            drop the unfinished part (finished parts are kept)
+        """
+        if self.closed:
+            return
+        try:
+            # cancel streamed part
+            if self.part_file is not None and self.sink is not None:
+                if hasattr(self.part_file, "abort"):
+                    self.part_file.abort()
+                else:
+                    self.part_file.close()
+                self.part_file = None
+            elif self.part_file is not None:
+                # part path
+                part_path = self.get_part_path(len(self.parts))
+                # close & remove temp file
+                self.part_file.close()
+                self.part_file = None
+                os.remove(part_path + ".tmp")
+        finally:
+            super().close()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # only publish the last part if no error occurred
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
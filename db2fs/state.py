@@ -0,0 +1,95 @@
+# io
+import os
+# json
+import json
+# db value formatting
+from db2fs.writers import format_csv_value
+# logging
+import logging
+# config logger
+logger = logging.getLogger(__name__)
+
+
+def to_state_value(value):
+    """
+        convert a query parameter (e.g. a watermark or chunk bound)
+        into a json value the db parses back into the same value
+        (dates, timestamps, decimals, ... are stored as db literals)
+
+        params:
+            - value: value returned by the db driver
+    """
+    # json native types
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    # db text representation
+    return format_csv_value(value)
+
+
+class StateStore:
+    """
+        small json file keeping per table extraction state (e.g.
+        the watermark reached by the last incremental export).
+        every update rewrites the file through a temp file so a
+        crash never leaves a half written state behind. values json
+        can't represent (dates, decimals, ...) are stored as db literals
+
+        init params:
+            - file_path: location on disk of the state file
+    """
+    def __init__(self, file_path):
+        # location of state file
+        self.file_path = file_path
+        # table name -> state
+        self.state = self.load()
+
+    def load(self):
+        """
+            read state file (empty state if it doesn't exist yet)
+        """
+        # nothing recorded yet
+        if not os.path.exists(self.file_path):
+            return {}
+        # read state
+        with open(self.file_path, "r") as state_file:
+            return json.load(state_file)
+
+    def save(self):
+        """
+            atomically write state to disk
+        """
+        # write to temp file next to state file
+        tmp_file_path = self.file_path + ".tmp"
+        with open(tmp_file_path, "w") as state_file:
+            json.dump(self.state, state_file, indent=2, sort_keys=True, default=to_state_value)
+            # make sure data is on disk before swapping files
+            state_file.flush()
+            os.fsync(state_file.fileno())
+        # replace old state
+        os.replace(tmp_file_path, self.file_path)
+
+    def get(self, table_name):
+        """
+            get recorded state of a table
+
+            params:
+                - table_name: name of table
+            returns:
+                - state dict or None
+        """
+        return self.state.get(table_name)
+
+    def set(self, table_name, table_state):
+        """
+            record state of a table & save it
+
+            params:
+                - table_name: name of table
+                - table_state: json serializable dict
+        """
+        # update state
+        self.state[table_name] = table_state
+        # persist
+        self.save()
+        # log
+        logger.info("saved state of table: %s state: %s" % (table_name, table_state))
@@ -0,0 +1,74 @@
+# logging
+import logging
+# config logger
+logger = logging.getLogger(__name__)
+
+# extractor owned by the current worker process. created once
+# by the pool initializer so each worker keeps a single db
+# connection for all the tables it exports
+_extractor = None
+
+
+def init_worker(extractor_cls, init_kwargs, snapshot_id=None, barrier=None):
+    """
+        pool initializer: build one extractor per worker process
+
+        params:
+            - extractor_cls: class to instantiate (e.g. DatabaseExtractor)
+            - init_kwargs: keyword arguments used to init extractor_cls
+            - snapshot_id: postgres snapshot to share (pg_export_snapshot)
+            - barrier: if set the worker starts a snapshot transaction &
+                       waits on the barrier so the process holding the
+                       snapshot knows when every worker joined it
+    """
+    global _extractor
+    # init extractor (connects to db once per process)
+    _extractor = extractor_cls(**init_kwargs)
+    # consistent snapshot mode
+    if barrier is not None:
+        try:
+            # start transaction on the shared snapshot
+            _extractor.start_snapshot(snapshot_id)
+        except Exception:
+            # don't leave the other processes waiting
+            barrier.abort()
+            raise
+        # wait for the other workers
+        barrier.wait()
+
+
+def run_task(method_name, args=(), kwargs=None):
+    """
+        run an extractor method inside a worker process
+
+        params:
+            - method_name: name of extractor method e.g. table2csv
+            - args: positional arguments for the method
+            - kwargs: keyword arguments for the method
+        returns:
+            - (return value of the method, run stats recorded by it)
+    """
+    # forget stats of previous tasks
+    _extractor.stats = {}
+    # call method on the worker's extractor
+    result = getattr(_extractor, method_name)(*args, **(kwargs or {}))
+    # send stats back with the result (worker state isn't shared)
+    return result, _extractor.stats
+
+
+def run_indexed_task(indexed_task):
+    """
+        run_task for (task index, (method name, args, kwargs)) so
+        results arriving in completion order can be matched to
+        their task
+
+        params:
+            - indexed_task: (task index, task)
+        returns:
+            - (task index, return value of the method, run stats)
+    """
+    task_index, (method_name, args, kwargs) = indexed_task
+    # run task
+    result, stats = run_task(method_name, args, kwargs)
+    # return result with its index
+    return task_index, result, stats
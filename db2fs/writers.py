@@ -0,0 +1,603 @@
+# regex
+import re
+# json
+import json
+import base64
+# math
+import math
+# types
+import datetime
+import decimal
+import uuid
+# arrow / parquet
+import pyarrow as pa
+import pyarrow.parquet as pq
+# mysql type codes
+from pymysql.constants import FIELD_TYPE
+
+# values that have to be quoted in csv (same rules as postgres
+# COPY ... WITH CSV: delimiter, quote, line breaks)
+CSV_QUOTE_PATTERN = re.compile(r'[,"\r\n]')
+
+
+def quote_csv_text(value):
+    """
+        quote a text value the way postgres COPY CSV does. empty
+        strings are quoted so they can't be confused with NULL
+
+        params:
+            - value: string to quote
+    """
+    # quote if needed
+    if not value or CSV_QUOTE_PATTERN.search(value):
+        # double embedded quotes
+        return '"' + value.replace('"', '""') + '"'
+    # plain value
+    return value
+
+
+def format_float(value):
+    """
+        format float like postgres (shortest round trip digits,
+        no trailing .0, exponent from 1e15)
+
+        params:
+            - value: float to format
+    """
+    # special values
+    if value != value:
+        return "NaN"
+    if value in (float("inf"), float("-inf")):
+        return "Infinity" if value > 0 else "-Infinity"
+    # shortest repr
+    text = repr(value)
+    # postgres uses exponent notation a digit earlier than python
+    if "e" not in text and abs(value) >= 1e15:
+        # normalize digits into exponent notation
+        text = str(decimal.Decimal(text).normalize()).lower()
+        # python omits the sign / leading zero of exponents
+        mantissa, exponent = text.split("e")
+        text = "%se%s%02d" % (mantissa, "-" if exponent.startswith("-") else "+", abs(int(exponent)))
+    # drop trailing .0 of integral values
+    if text.endswith(".0"):
+        text = text[:-2]
+    return text
+
+
+def format_microseconds(text):
+    """
+        strip trailing zeros of fractional seconds (postgres style)
+
+        params:
+            - text: iso formatted time / timestamp
+    """
+    # no fractional part
+    if "." not in text:
+        return text
+    # strip zeros & dangling dot
+    return text.rstrip("0").rstrip(".")
+
+
+def format_datetime(value):
+    """
+        format timestamp like postgres (space separator, trimmed
+        fraction, +HH offset)
+
+        params:
+            - value: datetime to format
+    """
+    # naive timestamp
+    if value.tzinfo is None:
+        return format_microseconds(value.isoformat(sep=" "))
+    # split offset off
+    text = value.replace(tzinfo=None).isoformat(sep=" ")
+    offset = value.isoformat()[-6:]
+    # postgres drops zero minutes of offsets
+    if offset.endswith(":00"):
+        offset = offset[:-3]
+    return format_microseconds(text) + offset
+
+
+def format_timedelta(value):
+    """
+        format duration as [-]HH:MM:SS[.ffffff] (mysql TIME columns)
+
+        params:
+            - value: timedelta to format
+    """
+    # total microseconds
+    micros = (value.days * 86400 + value.seconds) * 1000000 + value.microseconds
+    # sign
+    sign = "-" if micros < 0 else ""
+    micros = abs(micros)
+    # split into parts
+    seconds, micros = divmod(micros, 1000000)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    # build text
+    text = "%s%02d:%02d:%02d" % (sign, hours, minutes, seconds)
+    # add fraction
+    if micros:
+        text = format_microseconds(text + ".%06d" % micros)
+    return text
+
+
+# formatter per python type (values of other types use str)
+CSV_FORMATTERS = {
+    str: quote_csv_text,
+    int: str,
+    bool: lambda value: "t" if value else "f",
+    float: format_float,
+    decimal.Decimal: str,
+    datetime.datetime: format_datetime,
+    datetime.date: lambda value: value.isoformat(),
+    datetime.time: lambda value: format_microseconds(value.isoformat()),
+    datetime.timedelta: format_timedelta,
+    bytes: lambda value: "\\x" + value.hex(),
+    bytearray: lambda value: "\\x" + bytes(value).hex(),
+    memoryview: lambda value: "\\x" + value.hex(),
+    uuid.UUID: str,
+    dict: lambda value: quote_csv_text(json.dumps(value)),
+    list: lambda value: quote_csv_text(json.dumps(value)),
+}
+
+
+def format_csv_value(value):
+    """
+        format a single value for csv (NULL is an empty field)
+
+        params:
+            - value: value returned by a db cursor
+    """
+    # NULL
+    if value is None:
+        return ""
+    # formatter for type
+    formatter = CSV_FORMATTERS.get(type(value))
+    # unknown type
+    if formatter is None:
+        return quote_csv_text(str(value))
+    return formatter(value)
+
+
+class CSVBatchWriter:
+    """
+        write batches of cursor rows (tuples) straight to a csv
+        file. output follows postgres COPY ... WITH CSV HEADER so
+        files look the same whichever engine they came from
+
+        init params:
+            - out_file: text file object to write to
+            - columns: column names (header written if specified)
+            - row_writes: write every row with its own write call
+                          (needed by RollingFileWriter) instead of one
+                          write per batch
+    """
+    def __init__(self, out_file, columns=None, row_writes=False):
+        # file to write to
+        self.out_file = out_file
+        self.row_writes = row_writes
+        # number of rows written
+        self.num_rows = 0
+        # write header
+        if columns is not None:
+            self.out_file.write(",".join(quote_csv_text(column) for column in columns) + "\n")
+
+    def write_rows(self, rows):
+        """
+            write a batch of rows
+
+            params:
+                - rows: list of tuples returned by fetchmany
+        """
+        # format rows
+        lines = (
+            ",".join(map(format_csv_value, row)) + "\n"
+            for row in rows
+        )
+        if self.row_writes:
+            # one write per row
+            for line in lines:
+                self.out_file.write(line)
+        else:
+            # write batch at once
+            self.out_file.write("".join(lines))
+        # count rows
+        self.num_rows += len(rows)
+
+
+# postgres type oid -> arrow type (None = infer from values)
+PG_ARROW_TYPES = {
+    16: pa.bool_(),
+    17: pa.binary(),
+    18: pa.string(),
+    19: pa.string(),
+    20: pa.int64(),
+    21: pa.int16(),
+    23: pa.int32(),
+    25: pa.string(),
+    26: pa.int64(),
+    114: pa.string(),
+    700: pa.float32(),
+    701: pa.float64(),
+    1042: pa.string(),
+    1043: pa.string(),
+    1082: pa.date32(),
+    1083: pa.time64("us"),
+    1114: pa.timestamp("us"),
+    1184: pa.timestamp("us", tz="UTC"),
+    1186: pa.duration("us"),
+    2950: pa.string(),
+    3802: pa.string(),
+}
+
+# mysql field type -> arrow type (None = infer from values since
+# text & binary columns share field types)
+MYSQL_ARROW_TYPES = {
+    FIELD_TYPE.TINY: pa.int16(),
+    FIELD_TYPE.SHORT: pa.int32(),
+    FIELD_TYPE.INT24: pa.int32(),
+    FIELD_TYPE.LONG: pa.int64(),
+    FIELD_TYPE.LONGLONG: pa.int64(),
+    FIELD_TYPE.YEAR: pa.int16(),
+    FIELD_TYPE.FLOAT: pa.float32(),
+    FIELD_TYPE.DOUBLE: pa.float64(),
+    FIELD_TYPE.DATE: pa.date32(),
+    FIELD_TYPE.NEWDATE: pa.date32(),
+    FIELD_TYPE.DATETIME: pa.timestamp("us"),
+    FIELD_TYPE.TIMESTAMP: pa.timestamp("us"),
+    FIELD_TYPE.TIME: pa.duration("us"),
+    FIELD_TYPE.JSON: pa.string(),
+    FIELD_TYPE.ENUM: pa.string(),
+    FIELD_TYPE.SET: pa.string(),
+    FIELD_TYPE.BIT: pa.binary(),
+}
+
+
+def get_arrow_type(engine, column):
+    """
+        get arrow type of a cursor description column
+
+        params:
+            - engine: "pg" or "mysql"
+            - column: entry of cursor.description
+        returns:
+            - arrow type or None if it has to be inferred
+    """
+    # name, type code, display size, internal size, precision, scale
+    type_code, precision, scale = column[1], column[4], column[5]
+    # postgres numeric / mysql decimal
+    if (engine == "pg" and type_code == 1700) or (
+        engine == "mysql" and type_code in (FIELD_TYPE.DECIMAL, FIELD_TYPE.NEWDECIMAL)
+    ):
+        # exact decimals if precision is known & fits
+        if precision and scale is not None and 0 < precision <= 38 and scale <= precision:
+            return pa.decimal128(precision, scale)
+        # unbounded numeric: keep exact digits as text
+        return pa.string()
+    # lookup type
+    if engine == "pg":
+        return PG_ARROW_TYPES.get(type_code)
+    elif engine == "mysql":
+        return MYSQL_ARROW_TYPES.get(type_code)
+
+
+def to_arrow_text(value):
+    """
+        convert a value to text for string arrow columns
+
+        params:
+            - value: value returned by a db cursor
+    """
+    # json columns
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return str(value)
+
+
+class ArrowBatchConverter:
+    """
+        convert batches of cursor rows into arrow record batches.
+        types come from the cursor description. columns whose type
+        can't be mapped are inferred from the first batch & fixed
+        after that so every batch has the same schema
+
+        init params:
+            - engine: "pg" or "mysql"
+            - description: cursor.description of the query
+    """
+    def __init__(self, engine, description):
+        # column names
+        self.names = [column[0] for column in description]
+        # mapped types (None = infer)
+        self.types = [get_arrow_type(engine, column) for column in description]
+        # schema (set once all types are known)
+        self.schema = None
+
+    def get_schema(self):
+        """
+            get schema (unknown types default to string)
+        """
+        # schema already fixed
+        if self.schema is not None:
+            return self.schema
+        # unknown types as text
+        return pa.schema([
+            (name, arrow_type or pa.string())
+            for name, arrow_type in zip(self.names, self.types)
+        ])
+
+    def convert_column(self, values, arrow_type):
+        """
+            convert column values into an arrow array
+
+            params:
+                - values: column values
+                - arrow_type: arrow type of column
+        """
+        # text columns may get non str values (uuid, json ...)
+        if arrow_type == pa.string():
+            values = [
+                value if value is None or isinstance(value, str) else to_arrow_text(value)
+                for value in values
+            ]
+        # psycopg2 returns memoryview for bytea
+        elif arrow_type == pa.binary():
+            values = [
+                bytes(value) if isinstance(value, memoryview) else value
+                for value in values
+            ]
+        # build array
+        return pa.array(values, type=arrow_type)
+
+    def convert(self, rows):
+        """
+            convert a batch of rows into a record batch
+
+            params:
+                - rows: list of tuples returned by fetchmany
+        """
+        # rows -> columns
+        columns = list(zip(*rows)) if rows else [[] for name in self.names]
+        # infer missing types from first batch
+        if self.schema is None:
+            for index, arrow_type in enumerate(self.types):
+                if arrow_type is None:
+                    # infer type from values
+                    inferred_type = pa.array([
+                        bytes(value) if isinstance(value, memoryview) else value
+                        for value in columns[index]
+                    ]).type
+                    # all NULL columns are stored as text
+                    self.types[index] = pa.string() if inferred_type == pa.null() else inferred_type
+            # fix schema
+            self.schema = self.get_schema()
+        # convert columns
+        arrays = [
+            self.convert_column(values, arrow_type)
+            for values, arrow_type in zip(columns, self.schema.types)
+        ]
+        # build record batch
+        return pa.RecordBatch.from_arrays(arrays, schema=self.schema)
+
+
+class ParquetBatchWriter:
+    """
+        write batches of cursor rows to a parquet file, one row
+        group at a time, without holding the table in memory
+
+        init params:
+            - local_file_path: location on disk to write parquet to
+            - converter: object with get_schema() (& convert(rows)
+                         if write_rows is used) e.g. ArrowBatchConverter
+            - row_group_size: rows buffered before a row group is written
+            - compression: parquet compression codec
+    """
+    def __init__(self, local_file_path, converter, row_group_size=131072, compression="snappy"):
+        # output info
+        self.local_file_path = local_file_path
+        self.compression = compression
+        # rows -> arrow
+        self.converter = converter
+        # row group size
+        self.row_group_size = row_group_size
+        # record batches not written yet
+        self.pending_batches = []
+        self.pending_rows = 0
+        # parquet writer (created once schema is known)
+        self.writer = None
+        # number of rows written
+        self.num_rows = 0
+
+    def write_batch(self, record_batch):
+        """
+            add an arrow record batch
+
+            params:
+                - record_batch: arrow record batch
+        """
+        # buffer batch
+        self.pending_batches.append(record_batch)
+        self.pending_rows += record_batch.num_rows
+        self.num_rows += record_batch.num_rows
+        # write row group when large enough
+        if self.pending_rows >= self.row_group_size:
+            self.flush()
+
+    def write_rows(self, rows):
+        """
+            add a batch of rows
+
+            params:
+                - rows: list of tuples returned by fetchmany
+        """
+        # convert rows & add batch
+        self.write_batch(self.converter.convert(rows))
+
+    def flush(self):
+        """
+            write buffered batches as a row group
+        """
+        # open writer with (now known) schema
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(
+                self.local_file_path,
+                self.converter.get_schema(),
+                compression=self.compression
+            )
+        # write row group
+        if self.pending_batches:
+            self.writer.write_table(pa.Table.from_batches(self.pending_batches))
+        # clear buffer
+        self.pending_batches = []
+        self.pending_rows = 0
+
+    def close(self):
+        """
+            write remaining rows & close file
+        """
+        # write remaining rows (creates file for empty tables)
+        self.flush()
+        # close writer
+        self.writer.close()
+
+
+def to_json_value(value):
+    """
+        convert values json can't serialize (used as json default)
+
+        params:
+            - value: value returned by a db cursor
+    """
+    # dates & times as iso strings
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    # durations as [-]HH:MM:SS
+    if isinstance(value, datetime.timedelta):
+        return format_timedelta(value)
+    # binary as base64 (what bigquery / spark expect)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return base64.b64encode(bytes(value)).decode("ascii")
+    # decimals as strings (keep exact digits)
+    if isinstance(value, (decimal.Decimal, uuid.UUID)):
+        return str(value)
+    # anything else
+    return str(value)
+
+
+class NDJSONBatchWriter:
+    """
+        write batches of cursor rows as newline delimited json (one
+        object per line) so the output can be split & loaded in
+        parallel
+
+        init params:
+            - out_file: binary file object to write to
+            - columns: column names (keys of every object)
+    """
+    def __init__(self, out_file, columns):
+        # file to write to
+        self.out_file = out_file
+        # object keys
+        self.columns = columns
+        # json encoder (no spaces, keep unicode, strict json)
+        self.encoder = json.JSONEncoder(
+            default=to_json_value,
+            ensure_ascii=False,
+            separators=(",", ":"),
+            allow_nan=False
+        )
+        # number of rows written
+        self.num_rows = 0
+
+    def write_rows(self, rows):
+        """
+            write a batch of rows
+
+            params:
+                - rows: list of tuples returned by fetchmany
+        """
+        # encode all rows & write batch at once
+        self.out_file.write("".join(
+            self.encode_row(row) + "\n"
+            for row in rows
+        ).encode("utf-8"))
+        # count rows
+        self.num_rows += len(rows)
+
+    def encode_row(self, row):
+        """
+            encode a row as a json object
+
+            params:
+                - row: tuple returned by a db cursor
+        """
+        try:
+            # encode row
+            return self.encoder.encode(dict(zip(self.columns, row)))
+        except ValueError:
+            # NaN / Infinity aren't valid json: write them as strings
+            return self.encoder.encode({
+                column: format_float(value) if isinstance(value, float) and not math.isfinite(value) else value
+                for column, value in zip(self.columns, row)
+            })
+
+
+class FeatherBatchWriter:
+    """
+        write arrow record batches to a feather (arrow ipc) file
+        as they arrive
+
+        init params:
+            - local_file_path: location on disk to write feather to
+            - converter: object with get_schema() (& convert(rows)
+                         if write_rows is used) e.g. ArrowBatchConverter
+    """
+    def __init__(self, local_file_path, converter):
+        # output info
+        self.local_file_path = local_file_path
+        # rows -> arrow
+        self.converter = converter
+        # ipc writer (created once schema is known)
+        self.writer = None
+        # number of rows written
+        self.num_rows = 0
+
+    def open(self):
+        """
+            open ipc writer with the (now known) schema
+        """
+        if self.writer is None:
+            self.writer = pa.ipc.new_file(self.local_file_path, self.converter.get_schema())
+
+    def write_batch(self, record_batch):
+        """
+            add an arrow record batch
+
+            params:
+                - record_batch: arrow record batch
+        """
+        # open file
+        self.open()
+        # write batch
+        self.writer.write_batch(record_batch)
+        self.num_rows += record_batch.num_rows
+
+    def write_rows(self, rows):
+        """
+            add a batch of rows
+
+            params:
+                - rows: list of tuples returned by fetchmany
+        """
+        # convert rows & add batch
+        self.write_batch(self.converter.convert(rows))
+
+    def close(self):
+        """
+            close file (creates it for empty tables)
+        """
+        # open file
+        self.open()
+        # close writer
+        self.writer.close()
@@ -49,5 +49,13 @@ setup(
           "mock @ https://github.com/abmamo/mock/archive/v0.0.1.tar.gz",
           "fastdb @ https://github.com/abmamo/fastdb/archive/v0.0.1.tar.gz"
           ],
+      extras_require={
+          # async extractor (db2fs.aio) drivers
+          "asyncpg": ["asyncpg==0.21.0"],
+          "aiomysql": ["aiomysql==0.0.21"],
+          # compression codecs (db2fs.compression)
+          "zstd": ["zstandard==0.15.1"],
+          "lz4": ["lz4==3.1.1"]
+      },
       zip_safe=False
 )
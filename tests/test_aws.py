@@ -62,4 +62,24 @@ def test_download_bucket_file(test_dir, download_dir, test_aws_middleware, test_
         # assert file exists
         assert os.path.exists(os.path.join(download_dir, file_names[0]))
     else:
-        pass 
\ No newline at end of file
+        pass 
+def test_open_bucket_stream(download_dir, test_aws_middleware, test_s3_bucket_name, test_s3_bucket):
+    if test_aws_middleware is not None:
+        # stream 2 multipart upload parts + a small last part
+        with test_aws_middleware.open_bucket_stream(
+            bucket_name=test_s3_bucket_name,
+            key="test_aws_stream_file",
+            part_size=5 << 20
+        ) as upload_stream:
+            # uploaded bytes differ per position (catches reordered parts)
+            data = bytes(range(256)) * (11 << 12)
+            assert upload_stream.write(data) == len(data)
+        # assert object exists in bucket
+        assert "test_aws_stream_file" in test_aws_middleware.get_bucket_files(bucket_name=test_s3_bucket_name)
+        # assert object holds the written bytes
+        assert test_aws_middleware.get_bucket_file_size(test_s3_bucket_name, "test_aws_stream_file") == len(data)
+        test_aws_middleware.download_bucket_file(test_s3_bucket_name, "test_aws_stream_file", download_dir)
+        with open(os.path.join(download_dir, "test_aws_stream_file"), "rb") as downloaded_file:
+            assert downloaded_file.read() == data
+    else:
+        pass
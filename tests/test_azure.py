@@ -76,4 +76,24 @@ def test_upload_container_file(test_dir, test_azure_middleware, test_azure_conta
         # assert file exists in container
         assert "test_azure_upload_file" in test_azure_middleware.get_container_files(container_name=test_azure_container_name)
     else:
-        pass 
\ No newline at end of file
+        pass 
+def test_open_container_stream(download_dir, test_azure_middleware, test_azure_container_name, test_azure_container):
+    if test_azure_middleware is not None:
+        # stream 2 staged blocks + a small last block
+        with test_azure_middleware.open_container_stream(
+            container_name=test_azure_container_name,
+            key="test_azure_stream_file",
+            block_size=1 << 20
+        ) as upload_stream:
+            # uploaded bytes differ per position (catches reordered blocks)
+            data = bytes(range(256)) * (5 << 11)
+            assert upload_stream.write(data) == len(data)
+        # assert blob exists in container
+        assert "test_azure_stream_file" in test_azure_middleware.get_container_files(container_name=test_azure_container_name)
+        # assert blob holds the written bytes
+        assert test_azure_middleware.get_container_file_size(test_azure_container_name, "test_azure_stream_file") == len(data)
+        test_azure_middleware.download_container_file(test_azure_container_name, "test_azure_stream_file", download_dir)
+        with open(os.path.join(download_dir, "test_azure_stream_file"), "rb") as downloaded_file:
+            assert downloaded_file.read() == data
+    else:
+        pass
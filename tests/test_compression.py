@@ -0,0 +1,37 @@
+# testing
+import pytest
+# codecs
+import gzip
+import bz2
+# classes being tested
+from db2fs.compression import open_compressed, get_compressor, COMPRESSION_EXTENSIONS
+
+
+@pytest.mark.parametrize("compression, decompress", [
+    ("gzip", gzip.decompress),
+    ("bz2", bz2.decompress),
+])
+def test_open_compressed_roundtrip(tmp_path, compression, decompress):
+    # data spanning several compressor chunks
+    data = b"id,name\n" + b"".join(b"%d,name %d\n" % (i, i) for i in range(200000))
+    # write in small pieces
+    file_path = tmp_path.joinpath("out.csv" + COMPRESSION_EXTENSIONS[compression])
+    with open_compressed(str(file_path), compression) as out_file:
+        for start in range(0, len(data), 4096):
+            out_file.write(data[start:start + 4096])
+    # decompressed output matches input
+    assert decompress(file_path.read_bytes()) == data
+
+
+def test_open_compressed_none(tmp_path):
+    # no compression writes plain bytes
+    file_path = tmp_path.joinpath("out.csv")
+    with open_compressed(str(file_path)) as out_file:
+        out_file.write(b"a,b\n")
+    assert file_path.read_bytes() == b"a,b\n"
+
+
+def test_get_compressor_unknown():
+    # unknown codecs are rejected
+    with pytest.raises(ValueError):
+        get_compressor("rar")
@@ -0,0 +1,32 @@
+# classes being tested
+from db2fs.csvsplit import split_csv, FileRange
+
+
+def test_split_csv_quoted_newlines(tmp_path):
+    # csv file w/ newlines in quoted values
+    file_path = tmp_path.joinpath("table.csv")
+    file_path.write_bytes(b"id,note\n" + b"".join(b'%d,"a\n""b""\nc"\n' % row_index for row_index in range(100)))
+    # split into 4 ranges (scanning 16 bytes at a time)
+    byte_ranges = split_csv(str(file_path), 4, chunk_size=16)
+    # assert ranges cover all records without gaps
+    assert len(byte_ranges) == 4
+    assert byte_ranges[0][0] == len(b"id,note\n")
+    assert byte_ranges[-1][1] == file_path.stat().st_size
+    assert all(byte_ranges[i][1] == byte_ranges[i + 1][0] for i in range(3))
+    # assert every range starts at a record
+    for start, end in byte_ranges:
+        with FileRange(str(file_path), start, end) as range_file:
+            data = range_file.read()
+        assert data.split(b",")[0].isdigit()
+        assert data.endswith(b'c"\n')
+
+
+def test_split_csv_small_file(tmp_path):
+    # header & one record
+    file_path = tmp_path.joinpath("table.csv")
+    file_path.write_bytes(b"id\n1\n")
+    # assert small files give fewer ranges
+    assert split_csv(str(file_path), 4) == [(3, 5)]
+    # assert header only files give none
+    file_path.write_bytes(b"id")
+    assert split_csv(str(file_path), 4) == []
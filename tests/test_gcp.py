@@ -61,4 +61,24 @@ def test_download_bucket_file(test_dir, download_dir, test_gcp_middleware, test_
         # assert file exists
         assert os.path.exists(os.path.join(download_dir, file_names[0]))
     else:
-        pass 
\ No newline at end of file
+        pass 
+def test_open_bucket_stream(download_dir, test_gcp_middleware, test_gcp_bucket_name, test_gcp_bucket):
+    if test_gcp_middleware is not None:
+        # stream 2 resumable upload chunks + a small last chunk
+        with test_gcp_middleware.open_bucket_stream(
+            bucket_name=test_gcp_bucket_name,
+            key="test_gcp_stream_file",
+            chunk_size=256 << 10
+        ) as upload_stream:
+            # uploaded bytes differ per position (catches reordered chunks)
+            data = bytes(range(256)) * (600 << 2)
+            assert upload_stream.write(data) == len(data)
+        # assert blob exists in bucket
+        assert "test_gcp_stream_file" in test_gcp_middleware.get_bucket_files(bucket_name=test_gcp_bucket_name)
+        # assert blob holds the written bytes
+        assert test_gcp_middleware.get_bucket_file_size(test_gcp_bucket_name, "test_gcp_stream_file") == len(data)
+        test_gcp_middleware.download_bucket_file(test_gcp_bucket_name, "test_gcp_stream_file", download_dir)
+        with open(os.path.join(download_dir, "test_gcp_stream_file"), "rb") as downloaded_file:
+            assert downloaded_file.read() == data
+    else:
+        pass
@@ -0,0 +1,43 @@
+# arrow
+import pyarrow.dataset as ds
+# classes being tested
+from db2fs.writers import ArrowBatchConverter, ParquetBatchWriter
+from db2fs.partitioned import PartitionedDatasetWriter, HIVE_DEFAULT_PARTITION
+
+# postgres description of (id integer, region text)
+DESCRIPTION = [("id", 23, None, None, None, None, None), ("region", 25, None, None, None, None, None)]
+
+
+def test_partitioned_dataset_writer(tmp_path):
+    # dataset dir
+    local_dir_path = str(tmp_path.joinpath("table"))
+    # at most 2 open files for 4 partitions
+    dataset_writer = PartitionedDatasetWriter(
+        local_dir_path,
+        ArrowBatchConverter("pg", DESCRIPTION),
+        partition_by=["region"],
+        writer_cls=ParquetBatchWriter,
+        max_open_files=2
+    )
+    # write rows in 2 batches
+    regions = ["us", "eu", "a/b", None]
+    rows = [(row_index, regions[row_index % 4]) for row_index in range(20)]
+    dataset_writer.write_rows(rows[:10])
+    dataset_writer.write_rows(rows[10:])
+    dataset_writer.close()
+    # assert one dir per partition (escaped, NULL as default partition)
+    assert sorted(path.name for path in tmp_path.joinpath("table").iterdir()) == [
+        "region=" + HIVE_DEFAULT_PARTITION,
+        "region=a%2Fb",
+        "region=eu",
+        "region=us"
+    ]
+    # assert partition columns aren't stored in the files
+    assert dataset_writer.get_schema().names == ["id"]
+    # assert rows are read back with their partition values
+    table = ds.dataset(local_dir_path, format="parquet", partitioning="hive").to_table()
+    assert sorted(
+        (row["id"], row["region"]) for row in table.to_pylist()
+    ) == rows
+    # assert no temp dir is left behind
+    assert [path.name for path in tmp_path.iterdir()] == ["table"]
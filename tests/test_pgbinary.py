@@ -0,0 +1,149 @@
+# binary encoding
+import struct
+# types
+import datetime
+import decimal
+# arrow
+import pyarrow as pa
+# classes being tested
+from db2fs.pgbinary import BinaryCopyDecoder, BinaryCopyEncoder, decode_numeric, encode_numeric, PGCOPY_SIGNATURE
+
+# description of test stream: int4, text, timestamp, float8
+TEST_DESCRIPTION = [
+    ("id", 23, None, 4, None, None, None),
+    ("name", 25, None, -1, None, None, None),
+    ("created", 1114, None, 8, None, None, None),
+    ("score", 701, None, 8, None, None, None)
+]
+# microseconds between unix & postgres epoch
+PG_EPOCH = datetime.datetime(2000, 1, 1)
+
+
+def encode_field(value):
+    # NULL
+    if value is None:
+        return struct.pack(">i", -1)
+    # raw bytes with length
+    return struct.pack(">i", len(value)) + value
+
+
+def encode_row(row_id, name, created, score):
+    # field values in binary format
+    fields = [
+        struct.pack(">i", row_id),
+        None if name is None else name.encode("utf-8"),
+        struct.pack(">q", (created - PG_EPOCH) // datetime.timedelta(microseconds=1)),
+        None if score is None else struct.pack(">d", score)
+    ]
+    # field count + fields
+    return struct.pack(">h", len(fields)) + b"".join(encode_field(field) for field in fields)
+
+
+def build_chunks():
+    # rows in test stream
+    rows = [
+        (1, "a", datetime.datetime(2020, 1, 2, 3, 4, 5), 1.5),
+        (2, None, datetime.datetime(1999, 12, 31), None),
+        (3, "ünïcode", datetime.datetime(2000, 1, 1), -2.0)
+    ]
+    # header + one chunk per tuple + trailer (what libpq produces)
+    header = PGCOPY_SIGNATURE + struct.pack(">ii", 0, 0)
+    chunks = [encode_row(*row) for row in rows]
+    chunks[0] = header + chunks[0]
+    chunks.append(struct.pack(">h", -1))
+    return rows, chunks
+
+
+def decode(chunks, batch_rows, max_batch_bytes=None):
+    # collect decoded batches
+    batches = []
+    decoder = BinaryCopyDecoder(
+        TEST_DESCRIPTION,
+        on_batch=batches.append,
+        batch_rows=batch_rows,
+        max_batch_bytes=max_batch_bytes
+    )
+    for chunk in chunks:
+        decoder.write(chunk)
+    decoder.flush()
+    # return decoded rows
+    return [
+        tuple(row.values())
+        for batch in batches
+        for row in batch.to_pylist()
+    ]
+
+
+def test_decode_numeric():
+    # 1234.5600 -> digits [1234, 5600], weight 0, scale 4
+    data = struct.pack(">hhHh", 2, 0, 0, 4) + struct.pack(">hh", 1234, 5600)
+    assert decode_numeric(data) == decimal.Decimal("1234.5600")
+    # -0.05 -> digits [500], weight -1, scale 2
+    data = struct.pack(">hhHh", 1, -1, 0x4000, 2) + struct.pack(">h", 500)
+    assert decode_numeric(data) == decimal.Decimal("-0.05")
+
+
+def test_binary_copy_decoder_tuple_chunks():
+    # one tuple per write (fast path)
+    rows, chunks = build_chunks()
+    assert decode(chunks, batch_rows=2) == rows
+
+
+def test_binary_copy_decoder_arbitrary_chunks():
+    # stream split into 5 byte writes (scan path)
+    rows, chunks = build_chunks()
+    stream = b"".join(chunks)
+    assert decode([stream[i:i + 5] for i in range(0, len(stream), 5)], batch_rows=2) == rows
+
+
+def test_binary_copy_decoder_max_batch_bytes():
+    # batches cut by buffered bytes
+    rows, chunks = build_chunks()
+    assert decode(chunks, batch_rows=100, max_batch_bytes=1) == rows
+
+
+def test_binary_copy_decoder_infinity():
+    # dates & timestamps: infinity, -infinity & 2000-01-01
+    description = [
+        ("day", 1082, None, 4, None, None, None),
+        ("created", 1114, None, 8, None, None, None)
+    ]
+    stream = PGCOPY_SIGNATURE + struct.pack(">ii", 0, 0)
+    for day, created in ((2 ** 31 - 1, 2 ** 63 - 1), (-2 ** 31, -2 ** 63), (0, 0)):
+        stream += struct.pack(">h", 2) + encode_field(struct.pack(">i", day)) + encode_field(struct.pack(">q", created))
+    stream += struct.pack(">h", -1)
+    # decode stream
+    batches = []
+    decoder = BinaryCopyDecoder(description, on_batch=batches.append)
+    decoder.write(stream)
+    decoder.flush()
+    # assert infinite values are NULL
+    assert batches[0].to_pylist() == [
+        {"day": None, "created": None},
+        {"day": None, "created": None},
+        {"day": datetime.date(2000, 1, 1), "created": PG_EPOCH}
+    ]
+
+
+def test_encode_numeric():
+    # assert numerics decode to the encoded value & scale
+    for value in ["0", "1234.5600", "-0.05", "100000000", "0.000001"]:
+        assert str(decode_numeric(encode_numeric(decimal.Decimal(value)))) == value
+    # assert special values are kept
+    assert decode_numeric(encode_numeric(decimal.Decimal("NaN"))).is_nan()
+
+
+def test_binary_copy_encoder():
+    # rows of test stream as a record batch (int64 ids are cast to int4)
+    rows, chunks = build_chunks()
+    batch = pa.RecordBatch.from_arrays(
+        [pa.array(column) for column in zip(*rows)],
+        names=[column[0] for column in TEST_DESCRIPTION]
+    )
+    # encode stream
+    encoder = BinaryCopyEncoder(TEST_DESCRIPTION)
+    stream = encoder.get_header() + encoder.encode(batch) + encoder.get_trailer()
+    # assert stream matches the one postgres sends
+    assert stream == b"".join(chunks)
+    # assert decoded rows match
+    assert decode([stream], batch_rows=2) == rows
@@ -0,0 +1,71 @@
+# testing
+import pytest
+# os
+import os
+import shutil
+# classes being tested
+from db2fs.pipeline import UploadPipeline
+
+
+class LocalBucketMiddleware:
+    """
+        storage middleware using a local dir as bucket
+    """
+    def __init__(self, root_dir_path, truncate=False):
+        self.root_dir_path = root_dir_path
+        # upload one byte less (broken upload)
+        self.truncate = truncate
+
+    def upload_bucket_file(self, bucket_name, local_file_path, key=None, prefix=None):
+        # object location
+        object_path = os.path.join(self.root_dir_path, bucket_name, key)
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        # copy file
+        shutil.copyfile(local_file_path, object_path)
+        if self.truncate:
+            os.truncate(object_path, os.path.getsize(object_path) - 1)
+
+    def get_bucket_file_size(self, bucket_name, key):
+        # object location
+        object_path = os.path.join(self.root_dir_path, bucket_name, key)
+        return os.path.getsize(object_path) if os.path.exists(object_path) else None
+
+
+def write_files(dir_path, num_files):
+    # write small files
+    file_paths = []
+    for file_index in range(num_files):
+        file_path = dir_path.joinpath("table_%s.csv" % file_index)
+        file_path.write_text("id\n%s\n" % file_index)
+        file_paths.append(str(file_path))
+    return file_paths
+
+
+def test_upload_pipeline(tmp_path):
+    # local files
+    local_dir_path = tmp_path.joinpath("local")
+    local_dir_path.mkdir()
+    file_paths = write_files(local_dir_path, 5)
+    # upload all files (queue smaller than number of files)
+    middleware = LocalBucketMiddleware(str(tmp_path.joinpath("buckets")))
+    with UploadPipeline(middleware, "bucket", str(local_dir_path), prefix="export", workers=2, max_queued=1, delete_after_upload=True) as upload_pipeline:
+        for file_path in file_paths:
+            upload_pipeline.submit(file_path)
+    # assert every file is uploaded under its key
+    assert sorted(upload_pipeline.uploaded) == ["export/table_%s.csv" % file_index for file_index in range(5)]
+    assert tmp_path.joinpath("buckets", "bucket", "export", "table_0.csv").read_text() == "id\n0\n"
+    # assert uploaded files are deleted
+    assert not list(local_dir_path.iterdir())
+
+
+def test_upload_pipeline_verify(tmp_path):
+    # local files
+    file_paths = write_files(tmp_path, 2)
+    # broken uploads
+    middleware = LocalBucketMiddleware(str(tmp_path.joinpath("buckets")), truncate=True)
+    with pytest.raises(IOError):
+        with UploadPipeline(middleware, "bucket", str(tmp_path), delete_after_upload=True) as upload_pipeline:
+            for file_path in file_paths:
+                upload_pipeline.submit(file_path)
+    # assert files that failed verification are kept
+    assert all(os.path.exists(file_path) for file_path in file_paths)
@@ -0,0 +1,81 @@
+# testing
+import pytest
+# classes being tested
+from db2fs.connectors.pool import ConnectionPool
+
+
+class FakeConnection:
+    """
+        connection keeping track of whether it was closed
+    """
+    def __init__(self):
+        self.closed = False
+        self.broken = False
+
+    def close(self):
+        self.closed = True
+
+
+def open_pool(**pool_options):
+    # connections opened by pool
+    opened = []
+
+    def connect():
+        opened.append(FakeConnection())
+        return opened[-1]
+    # pool checking the broken flag
+    pool = ConnectionPool(connect, lambda conn: not conn.broken, **pool_options)
+    return pool, opened
+
+
+def test_pool_reuse():
+    # pool of 2 connections
+    pool, opened = open_pool(max_size=2, timeout=0)
+    # check out & return a connection twice
+    first_conn = pool.acquire()
+    pool.release(first_conn)
+    second_conn = pool.acquire()
+    # assert connection is reused
+    assert first_conn is second_conn
+    assert len(opened) == 1
+    # assert pool stops at max size
+    pool.acquire()
+    with pytest.raises(TimeoutError):
+        pool.acquire()
+
+
+def test_pool_replaces_broken():
+    # pool checking every connection before use
+    pool, opened = open_pool(check_interval=0)
+    # connection dropped while idle
+    conn = pool.acquire()
+    pool.release(conn)
+    conn.broken = True
+    # assert broken connection is closed & replaced
+    assert pool.acquire() is not conn
+    assert conn.closed
+    assert pool.size == 1
+
+
+def test_pool_idle_timeout():
+    # pool closing idle connections right away (keeping 1)
+    pool, opened = open_pool(min_size=1, idle_timeout=0)
+    # return 3 connections
+    conns = [pool.acquire() for _ in range(3)]
+    for conn in conns:
+        pool.release(conn)
+    # assert only min size connections are kept
+    assert len(pool.idle) == 1
+    assert sum(conn.closed for conn in opened) == 2
+
+
+def test_pool_fork():
+    # pool with an idle connection
+    pool, opened = open_pool()
+    pool.release(pool.acquire())
+    # pretend pool was inherited from a parent process
+    pool.pid = -1
+    # assert child opens its own connection & leaves the parent's open
+    assert pool.acquire() is not opened[0]
+    assert not opened[0].closed
+    assert pool.inherited == [opened[0]]
@@ -2,9 +2,20 @@
 import pytest
 # db2fs 
 from db2fs import DatabaseExtractor
+from db2fs.aio import AsyncDatabaseExtractor
+from db2fs.writers import ParquetBatchWriter
+import db2fs.aio
+# event loop
+import asyncio
 # path
 from pathlib import Path
 import shutil
+# compressed output
+import gzip
+# parquet
+import pyarrow.parquet as pq
+# logging
+import logging
 
 
 @pytest.fixture(scope="module")
@@ -24,6 +35,45 @@ def test_download_dir_psql():
     shutil.rmtree(str(test_download_dir_psql))
 
 
+@pytest.fixture
+def chunked_table_psql(mock_psql_dsn):
+    """
+        table w/ an integer primary key (so it can be split into chunks)
+    """
+    # init class
+    db_ext = DatabaseExtractor(connection_info=mock_psql_dsn)
+    # table name
+    table_name = "db2fs_chunked_table"
+    quoted_table_name = db_ext.quote_identifier(table_name)
+    # create table w/ 1000 rows
+    db_ext.run_query("DROP TABLE IF EXISTS %s;" % quoted_table_name)
+    db_ext.run_query("CREATE TABLE %s (id INTEGER PRIMARY KEY, name TEXT);" % quoted_table_name)
+    rows = [(row_id, "name %s" % row_id) for row_id in range(1, 1001)]
+    db_ext.run_query(
+        "INSERT INTO %s VALUES %s;" % (quoted_table_name, ", ".join(["(%s, %s)"] * len(rows))),
+        [value for row in rows for value in row]
+    )
+    # yield table name
+    yield table_name
+    # drop table after test (other tests count tables)
+    db_ext.run_query("DROP TABLE %s;" % quoted_table_name)
+
+
+def read_csv_rows(local_file_paths):
+    """
+        read header & sorted rows of one or more csv files
+    """
+    header, rows = None, []
+    for local_file_path in local_file_paths:
+        with open(local_file_path, "r") as in_file:
+            lines = in_file.read().splitlines()
+        # files w/ a header
+        if lines and lines[0].startswith("id"):
+            header, lines = lines[0], lines[1:]
+        rows.extend(lines)
+    return header, sorted(rows)
+
+
 def test_db2fs_table2csv_psql(mock_psql_dsn, test_download_dir_psql, mock_psql_table_names):
     """
         test table 2 csv extractions
@@ -82,6 +132,46 @@ def test_db2fs_table2parquet_psql(mock_psql_dsn, test_download_dir_psql, mock_ps
     assert local_file_path.exists()
 
 
+def test_db2fs_table2parquet_failure_psql(mock_psql_dsn, tmp_path, mock_psql_table_names, monkeypatch):
+    """
+        test a failed parquet extraction keeps the previous file
+    """
+    class FailingParquetBatchWriter(ParquetBatchWriter):
+        def close(self):
+            # fail after the whole file is written
+            super().close()
+            raise RuntimeError("writer failed")
+    # init class
+    db_ext = DatabaseExtractor(
+        connection_info=mock_psql_dsn,
+        download_dir_path=str(tmp_path)
+    )
+    # table name
+    table_name = mock_psql_table_names[0]
+    # previous extraction
+    local_file_path = db_ext.table2other(table_name=table_name, file_type=".parquet")
+    num_rows = pq.read_metadata(local_file_path).num_rows
+    # overwrite previous file w/ a failing writer (no rows)
+    with pytest.raises(RuntimeError):
+        db_ext.query2arrow(
+            db_ext.build_select(table_name) + " WHERE 1 = 0",
+            local_file_path,
+            writer_cls=FailingParquetBatchWriter
+        )
+    # same w/ the async extractor
+    monkeypatch.setattr(db2fs.aio, "ParquetBatchWriter", FailingParquetBatchWriter)
+    async_db_ext = AsyncDatabaseExtractor(connection_info=mock_psql_dsn, download_dir_path=str(tmp_path))
+
+    async def extract():
+        async with async_db_ext:
+            return await async_db_ext.table2other(table_name=table_name, file_type=".parquet", where="1 = 0")
+    with pytest.raises(RuntimeError):
+        asyncio.run(extract())
+    # assert previous file is kept & partial files are removed
+    assert pq.read_metadata(local_file_path).num_rows == num_rows
+    assert not Path(local_file_path + ".tmp").exists()
+
+
 def test_db2fs_db2csv_psql(mock_psql_dsn, test_download_dir_psql, mock_psql_table_names):
     """
         test db 2 csv extractions
@@ -135,3 +225,569 @@ def test_db2fs_db2parquet_psql(mock_psql_dsn, test_download_dir_psql, mock_psql_
         local_file_path = test_download_dir_psql.joinpath(table_name + ".parquet")
         # assert file exists
         assert local_file_path.exists()
+
+
+def test_db2fs_db2csv_workers_psql(mock_psql_dsn, test_download_dir_psql, mock_psql_table_names):
+    """
+        test db 2 csv extractions with a fixed number of workers
+    """
+    # init class
+    db_ext = DatabaseExtractor(
+        connection_info=mock_psql_dsn,
+        download_dir_path=test_download_dir_psql,
+        workers=2
+    )
+    # run extraction to files
+    local_file_paths = db_ext.db2csv()
+    # assert one file per table returned in table order
+    assert len(local_file_paths) == len(db_ext.get_tables())
+    # assert all files exist
+    for table_name in mock_psql_table_names:
+        # build local file path
+        local_file_path = test_download_dir_psql.joinpath(table_name + ".csv")
+        # assert file exists
+        assert local_file_path.exists()
+
+
+def test_db2fs_table2csv_chunks_psql(mock_psql_dsn, test_download_dir_psql, chunked_table_psql):
+    """
+        test chunked table 2 csv extractions
+    """
+    # init class
+    db_ext = DatabaseExtractor(
+        connection_info=mock_psql_dsn,
+        download_dir_path=test_download_dir_psql
+    )
+    # table name
+    table_name = chunked_table_psql
+    # unchunked extraction
+    local_file_path = db_ext.table2csv(table_name=table_name)
+    # run extraction to files (keep parts)
+    part_paths = db_ext.table2csv(table_name=table_name, file_name=table_name + "_chunks", chunks=4, merge_chunks=False)
+    # assert the table is split into parts
+    assert isinstance(part_paths, list)
+    assert len(part_paths) > 1
+    assert all(Path(part_path).exists() for part_path in part_paths)
+    # assert parts hold the same rows as the unchunked file
+    header, rows = read_csv_rows([local_file_path])
+    assert len(rows) == 1000
+    assert read_csv_rows(part_paths) == (header, rows)
+
+
+def test_db2fs_table2ndjson_psql(mock_psql_dsn, test_download_dir_psql, mock_psql_table_names):
+    """
+        test table 2 compressed json lines extractions
+    """
+    # init class
+    db_ext = DatabaseExtractor(
+        connection_info=mock_psql_dsn,
+        download_dir_path=test_download_dir_psql
+    )
+    # table name
+    table_name = mock_psql_table_names[0]
+    # run extraction to files
+    db_ext.table2other(table_name=table_name, file_type=".jsonl", compression="gzip")
+    # build local file path
+    local_file_path = test_download_dir_psql.joinpath(table_name + ".jsonl.gz")
+    # assert file exists in download dir
+    assert local_file_path.exists()
+
+
+def test_db2fs_table2feather_psql(mock_psql_dsn, test_download_dir_psql, mock_psql_table_names):
+    """
+        test table 2 feather extractions (binary COPY)
+    """
+    # init class
+    db_ext = DatabaseExtractor(
+        connection_info=mock_psql_dsn,
+        download_dir_path=test_download_dir_psql
+    )
+    # table name
+    table_name = mock_psql_table_names[0]
+    # run extraction to files
+    db_ext.table2other(table_name=table_name, file_type=".feather")
+    # build local file path
+    local_file_path = test_download_dir_psql.joinpath(table_name + ".feather")
+    # assert file exists in download dir
+    assert local_file_path.exists()
+
+
+def test_db2fs_table2csv_gzip_psql(mock_psql_dsn, test_download_dir_psql, mock_psql_table_names):
+    """
+        test table 2 compressed csv extractions
+    """
+    # init class
+    db_ext = DatabaseExtractor(
+        connection_info=mock_psql_dsn,
+        download_dir_path=test_download_dir_psql
+    )
+    # table name
+    table_name = mock_psql_table_names[0]
+    # run extraction to files
+    local_file_path = db_ext.table2csv(table_name=table_name, compression="gzip")
+    # assert compressed file is written to download dir
+    assert local_file_path == str(test_download_dir_psql.joinpath(table_name + ".csv.gz"))
+    # assert file is valid gzip
+    with gzip.open(local_file_path, "rt") as in_file:
+        assert in_file.readline()
+
+
+def test_db2fs_table2csv_watermark_psql(mock_psql_dsn, test_download_dir_psql, mock_psql_table_names):
+    """
+        test incremental table 2 csv extractions
+    """
+    # init class
+    db_ext = DatabaseExtractor(
+        connection_info=mock_psql_dsn,
+        download_dir_path=test_download_dir_psql
+    )
+    # table name
+    table_name = mock_psql_table_names[0]
+    # use first column as watermark
+    cursor = db_ext.run_query(db_ext.build_select(table_name) + " LIMIT 0")
+    watermark_column = cursor.description[0][0]
+    # first run exports the whole table
+    local_file_path = db_ext.table2csv(table_name=table_name, watermark_column=watermark_column, full_refresh=True)
+    assert local_file_path == str(test_download_dir_psql.joinpath(table_name + ".csv"))
+    # watermark is saved
+    assert db_ext.get_state_store().get(table_name)["column"] == watermark_column
+    # next run only exports new rows into a delta file
+    local_file_path = db_ext.table2csv(table_name=table_name, watermark_column=watermark_column)
+    assert local_file_path == str(test_download_dir_psql.joinpath(table_name + ".delta-00001.csv"))
+    # nothing changed since the last run (header only)
+    with open(local_file_path, "r") as in_file:
+        assert len(in_file.readlines()) == 1
+
+
+def test_db2fs_table2csv_resumable_psql(mock_psql_dsn, test_download_dir_psql, chunked_table_psql):
+    """
+        test checkpointed table 2 csv extractions
+    """
+    # init class
+    db_ext = DatabaseExtractor(
+        connection_info=mock_psql_dsn,
+        download_dir_path=test_download_dir_psql
+    )
+    # table name
+    table_name = chunked_table_psql
+    # run extraction to files
+    db_ext.table2csv(table_name=table_name, chunks=2, resumable=True)
+    # assert file exists in download dir
+    assert test_download_dir_psql.joinpath(table_name + ".csv").exists()
+    # assert checkpoint & temp files are removed once finished
+    assert not test_download_dir_psql.joinpath(table_name + ".csv.checkpoint.json").exists()
+    assert not test_download_dir_psql.joinpath(table_name + ".csv.tmp").exists()
+
+
+def test_db2fs_table2csv_resume_psql(mock_psql_dsn, test_download_dir_psql, chunked_table_psql):
+    """
+        test a failed resumable extraction only re-extracts missing chunks
+    """
+    # init class
+    db_ext = DatabaseExtractor(
+        connection_info=mock_psql_dsn,
+        download_dir_path=test_download_dir_psql,
+        workers=1
+    )
+    table_name = chunked_table_psql
+    # unchunked export to compare with
+    expected_file_path = db_ext.table2csv(table_name=table_name, file_name=table_name + "_full")
+    # resumable exports need chunks
+    with pytest.raises(ValueError):
+        db_ext.table2csv(table_name=table_name, resumable=True)
+    # last chunk can't be written (directory in its place)
+    part_paths = db_ext.plan_table2csv(table_name, chunks=4)[1]
+    assert len(part_paths) == 4
+    Path(part_paths[-1]).mkdir()
+    with pytest.raises(Exception):
+        db_ext.table2csv(table_name=table_name, chunks=4, resumable=True)
+    # assert finished chunks & checkpoint are kept
+    assert all(Path(part_path).exists() for part_path in part_paths[:-1])
+    assert test_download_dir_psql.joinpath(table_name + ".csv.checkpoint.json").exists()
+    # rerun w/ a fresh extractor
+    Path(part_paths[-1]).rmdir()
+    rerun_db_ext = DatabaseExtractor(
+        connection_info=mock_psql_dsn,
+        download_dir_path=test_download_dir_psql,
+        workers=1
+    )
+    local_file_path = rerun_db_ext.table2csv(table_name=table_name, chunks=4, resumable=True)
+    # assert only the missing chunk was extracted
+    assert list(rerun_db_ext.stats) == [part_paths[-1]]
+    # assert merged csv holds every row once
+    assert read_csv_rows([local_file_path]) == read_csv_rows([expected_file_path])
+    assert not test_download_dir_psql.joinpath(table_name + ".csv.checkpoint.json").exists()
+
+def test_db2fs_table2csv_percent_column_psql(mock_psql_dsn, tmp_path):
+    """
+        test chunked, incremental & sampled extractions of a key w/ a % sign
+    """
+    # init class
+    db_ext = DatabaseExtractor(
+        connection_info=mock_psql_dsn,
+        download_dir_path=str(tmp_path)
+    )
+    # table w/ a % sign in its key
+    table_name = "db2fs_percent_table"
+    quoted_table_name = db_ext.quote_identifier(table_name)
+    db_ext.run_query("DROP TABLE IF EXISTS %s;" % quoted_table_name)
+    db_ext.run_query("CREATE TABLE %s (%s INTEGER PRIMARY KEY, name TEXT);" % (quoted_table_name, db_ext.quote_identifier("id%")))
+    db_ext.run_query(
+        "INSERT INTO %s VALUES %s;" % (quoted_table_name, ", ".join(["(%s, %s)"] * 100)),
+        [value for row_id in range(1, 101) for value in (row_id, "name %s" % row_id)]
+    )
+    try:
+        # unchunked extraction
+        header, rows = read_csv_rows([db_ext.table2csv(table_name=table_name)])
+        assert header == "id%,name"
+        assert len(rows) == 100
+        # assert chunks, watermarks & samples select the same rows
+        part_paths = db_ext.table2csv(table_name=table_name, file_name=table_name + "_chunks", chunks=2, merge_chunks=False)
+        assert len(part_paths) == 2
+        assert read_csv_rows(part_paths) == (header, rows)
+        local_file_path = db_ext.table2csv(table_name=table_name, file_name=table_name + "_full", watermark_column="id%", full_refresh=True)
+        assert read_csv_rows([local_file_path]) == (header, rows)
+        local_file_path = db_ext.table2csv(table_name=table_name, file_name=table_name + "_sample", sample=1.0, seed=42)
+        assert read_csv_rows([local_file_path]) == (header, rows)
+    finally:
+        # drop table (other tests count tables)
+        db_ext.run_query("DROP TABLE %s;" % quoted_table_name)
+
+
+def test_db2fs_table2csv_columns_psql(mock_psql_dsn, test_download_dir_psql, mock_psql_table_names):
+    """
+        test table 2 csv extractions of a column subset
+    """
+    # init class
+    db_ext = DatabaseExtractor(
+        connection_info=mock_psql_dsn,
+        download_dir_path=test_download_dir_psql
+    )
+    # table name
+    table_name = mock_psql_table_names[0]
+    # first column
+    column = db_ext.get_columns(table_name)[0]
+    # run extraction to files
+    local_file_path = db_ext.table2csv(
+        table_name=table_name,
+        columns=[column],
+        where=(column, "IS NOT NULL"),
+        order_by=(column, "DESC")
+    )
+    # assert only the selected column is exported
+    with open(local_file_path, "r") as in_file:
+        assert in_file.readline().strip() == column
+    # assert unknown columns are rejected
+    with pytest.raises(ValueError):
+        db_ext.table2csv(table_name=table_name, columns=["no_such_column"])
+
+
+def test_db2fs_table2csv_sample_psql(mock_psql_dsn, test_download_dir_psql, mock_psql_table_names):
+    """
+        test sampled table 2 csv extractions
+    """
+    # init class
+    db_ext = DatabaseExtractor(
+        connection_info=mock_psql_dsn,
+        download_dir_path=test_download_dir_psql
+    )
+    # table name
+    table_name = mock_psql_table_names[0]
+    # sample half of the table
+    local_file_path = db_ext.table2csv(table_name=table_name, sample=0.5, seed=42)
+    with open(local_file_path, "r") as in_file:
+        first_sample = in_file.read()
+    # assert the same seed gives the same sample
+    local_file_path = db_ext.table2csv(table_name=table_name, sample=0.5, seed=42)
+    with open(local_file_path, "r") as in_file:
+        assert in_file.read() == first_sample
+    # assert a row count limits the sample
+    local_file_path = db_ext.table2csv(table_name=table_name, sample=1, seed=42)
+    with open(local_file_path, "r") as in_file:
+        assert len(in_file.readlines()) <= 2
+
+
+def test_db2fs_table2ndjson_max_batch_bytes_psql(mock_psql_dsn, test_download_dir_psql, mock_psql_table_names):
+    # init class (fetch size derived from a memory budget)
+    db_ext = DatabaseExtractor(
+        connection_info=mock_psql_dsn,
+        download_dir_path=test_download_dir_psql,
+        max_batch_bytes=1024
+    )
+    # table name
+    table_name = mock_psql_table_names[0]
+    # run extraction to files
+    local_file_path = db_ext.table2other(table_name=table_name, file_type=".jsonl")
+    # assert chosen fetch sizes are recorded
+    assert all(fetch_size >= 1 for fetch_size in db_ext.stats[local_file_path]["fetch_sizes"])
+
+
+def test_db2fs_db2csv_consistent_psql(mock_psql_dsn, test_download_dir_psql, mock_psql_table_names):
+    """
+        test parallel db 2 csv extractions from a single snapshot
+    """
+    # init class
+    db_ext = DatabaseExtractor(
+        connection_info=mock_psql_dsn,
+        download_dir_path=test_download_dir_psql
+    )
+    # run extraction to files
+    local_file_paths = db_ext.db2csv(workers=2, consistent=True)
+    # assert a file exists for every table
+    for table_name in mock_psql_table_names:
+        assert str(test_download_dir_psql.joinpath(table_name + ".csv")) in local_file_paths
+
+
+def test_db2fs_table2csv_rolling_psql(mock_psql_dsn, test_download_dir_psql, mock_psql_table_names):
+    """
+        test table 2 csv extractions split into part files
+    """
+    # init class
+    db_ext = DatabaseExtractor(
+        connection_info=mock_psql_dsn,
+        download_dir_path=test_download_dir_psql
+    )
+    # table name
+    table_name = mock_psql_table_names[0]
+    # full extraction to compare against
+    local_file_path = db_ext.table2csv(table_name=table_name)
+    with open(local_file_path, "r") as in_file:
+        header, *rows = in_file.readlines()
+    # finished parts
+    finished = []
+    # split table into parts of 2 rows
+    part_paths = db_ext.table2csv(
+        table_name=table_name,
+        max_rows_per_file=2,
+        on_part_complete=lambda *part: finished.append(part)
+    )
+    # assert every part was reported
+    assert [part[0] for part in finished] == part_paths
+    # assert parts repeat the header & hold all rows in order
+    part_rows = []
+    for part_path in part_paths:
+        with open(part_path, "r") as in_file:
+            part_header, *part_lines = in_file.readlines()
+        assert part_header == header
+        assert len(part_lines) <= 2
+        part_rows.extend(part_lines)
+    assert part_rows == rows
+    # assert an index of the parts is written
+    assert Path(local_file_path + ".index.json").exists()
+
+
+def test_db2fs_table2parquet_partitioned_psql(mock_psql_dsn, test_download_dir_psql, mock_psql_table_names):
+    """
+        test table 2 partitioned parquet dataset extractions
+    """
+    # init class
+    db_ext = DatabaseExtractor(
+        connection_info=mock_psql_dsn,
+        download_dir_path=test_download_dir_psql
+    )
+    # table name
+    table_name = mock_psql_table_names[0]
+    # partition on first column
+    column = db_ext.get_columns(table_name)[0]
+    # run extraction to dataset dir
+    local_dir_path = db_ext.table2other(
+        table_name=table_name,
+        file_type=".parquet",
+        partition_by=column,
+        max_open_files=2
+    )
+    # assert partition dirs are named after the column
+    partition_dirs = list(Path(local_dir_path).iterdir())
+    assert partition_dirs
+    assert all(partition_dir.name.startswith(column + "=") for partition_dir in partition_dirs)
+    # assert all rows are written
+    num_rows = sum(
+        pq.read_metadata(str(part_path)).num_rows
+        for part_path in Path(local_dir_path).glob("*/part-*.parquet")
+    )
+    assert num_rows == db_ext.stats[local_dir_path]["rows"]
+    # assert partitioning is limited to arrow based files
+    with pytest.raises(ValueError):
+        db_ext.table2other(table_name=table_name, file_type=".json", partition_by=column)
+
+
+def test_db2fs_db2csv_on_file_psql(mock_psql_dsn, test_download_dir_psql, mock_psql_table_names):
+    """
+        test files are reported as soon as their table is extracted
+    """
+    # init class
+    db_ext = DatabaseExtractor(
+        connection_info=mock_psql_dsn,
+        download_dir_path=test_download_dir_psql
+    )
+    # reported files
+    reported_files = []
+    # run extraction to files
+    local_file_paths = db_ext.db2csv(workers=2, on_file=reported_files.append)
+    # assert every file is reported once
+    assert sorted(reported_files) == sorted(local_file_paths)
+
+def test_db2fs_async_table2csv_psql(mock_psql_dsn, test_download_dir_psql, mock_psql_table_names):
+    """
+        test async table 2 csv extraction matches the sync one
+    """
+    # init classes
+    db_ext = DatabaseExtractor(
+        connection_info=mock_psql_dsn,
+        download_dir_path=test_download_dir_psql
+    )
+    async_db_ext = AsyncDatabaseExtractor(
+        connection_info=mock_psql_dsn,
+        download_dir_path=test_download_dir_psql,
+        concurrency=2
+    )
+    # table name
+    table_name = mock_psql_table_names[0]
+
+    async def extract():
+        async with async_db_ext:
+            return await async_db_ext.table2csv(table_name=table_name, file_name=table_name + "_async")
+    # run extractions to files
+    local_file_path = db_ext.table2csv(table_name=table_name)
+    async_file_path = asyncio.run(extract())
+    # assert both files hold the same rows
+    with open(local_file_path, "rb") as local_file, open(async_file_path, "rb") as async_file:
+        assert local_file.read() == async_file.read()
+
+
+def test_db2fs_async_db2parquet_psql(mock_psql_dsn, test_download_dir_psql, mock_psql_table_names):
+    """
+        test async extraction of all tables to parquet
+    """
+    # init class
+    async_db_ext = AsyncDatabaseExtractor(
+        connection_info=mock_psql_dsn,
+        download_dir_path=test_download_dir_psql,
+        concurrency=2
+    )
+
+    async def extract():
+        async with async_db_ext:
+            return await async_db_ext.db2other(file_type=".parquet")
+    # run extraction to files
+    local_file_paths = asyncio.run(extract())
+    # assert one file per table
+    assert len(local_file_paths) == len(mock_psql_table_names)
+    # assert row counts are recorded
+    for local_file_path in local_file_paths:
+        assert pq.read_table(local_file_path).num_rows == async_db_ext.stats[local_file_path]["rows"]
+
+
+def test_db2fs_async_single_pool_psql(mock_psql_dsn, test_download_dir_psql, mock_psql_table_names):
+    """
+        test concurrent first queries share one connection pool
+    """
+    # init class
+    async_db_ext = AsyncDatabaseExtractor(
+        connection_info=mock_psql_dsn,
+        download_dir_path=test_download_dir_psql,
+        concurrency=2
+    )
+    # count created pools
+    created_pools = []
+    create_pool = async_db_ext.create_pool
+
+    async def count_pools():
+        created_pools.append(await create_pool())
+        return created_pools[-1]
+    async_db_ext.create_pool = count_pools
+
+    async def extract():
+        async with async_db_ext:
+            return await asyncio.gather(*[
+                async_db_ext.table2csv(table_name=table_name, file_name=table_name + "_pool")
+                for table_name in mock_psql_table_names[:2]
+            ])
+    # run extractions on a fresh extractor
+    local_file_paths = asyncio.run(extract())
+    # assert files are written w/ a single pool
+    assert all(Path(local_file_path).exists() for local_file_path in local_file_paths)
+    assert len(created_pools) == 1
+
+def test_db2fs_async_init_offline_psql(mock_psql_dsn, tmp_path):
+    """
+        test the async extractor builds sql & paths w/o a db connection
+    """
+    # unreachable db
+    connection_info = dict(mock_psql_dsn, host="db2fs.invalid")
+    async_db_ext = AsyncDatabaseExtractor(connection_info=connection_info, download_dir_path=str(tmp_path))
+    # assert nothing is connected
+    assert async_db_ext.pool is None
+    # assert sql & paths are built
+    assert async_db_ext.build_select("t\"1") == "SELECT * FROM \"t\"\"1\""
+    assert async_db_ext.get_local_file_path("t") == str(tmp_path / "t.csv")
+
+
+def test_db2fs_dir2db_psql(mock_psql_dsn, tmp_path, mock_psql_table_names):
+    """
+        test loading a directory of extracted files back into tables
+    """
+    # init class
+    db_ext = DatabaseExtractor(
+        connection_info=mock_psql_dsn,
+        download_dir_path=str(tmp_path)
+    )
+    # table name
+    table_name = mock_psql_table_names[0]
+    # extract table to a csv & a parquet file (loaded as new tables)
+    db_ext.table2csv(table_name=table_name, file_name=table_name + "_csv_copy")
+    db_ext.table2other(table_name=table_name, file_type=".parquet", file_name=table_name + "_parquet_copy")
+    # leftover checkpoint (not loaded)
+    tmp_path.joinpath(table_name + "_csv_copy.csv.checkpoint.json").write_text("{}")
+    # reported files
+    reported_files = []
+    # load directory
+    table_rows = db_ext.dir2db(workers=2, on_file=reported_files.append)
+    # assert both files are loaded in full
+    cursor = db_ext.run_query("SELECT COUNT(*) FROM " + db_ext.quote_identifier(table_name))
+    num_rows = cursor.fetchone()[0]
+    assert table_rows == {table_name + "_csv_copy": num_rows, table_name + "_parquet_copy": num_rows}
+    assert len(reported_files) == 2
+    # assert stats are recorded per file
+    for local_file_path in reported_files:
+        assert db_ext.stats[local_file_path]["rows"] == num_rows
+
+
+def test_db2fs_dir2db_deltas_psql(mock_psql_dsn, tmp_path, chunked_table_psql, mock_psql_table_names, caplog):
+    """
+        test deltas are loaded into their base table & datasets are skipped
+    """
+    # init class
+    db_ext = DatabaseExtractor(
+        connection_info=mock_psql_dsn,
+        download_dir_path=str(tmp_path)
+    )
+    # table name
+    table_name = chunked_table_psql
+    quoted_table_name = db_ext.quote_identifier(table_name)
+    # copy of table loaded from the files
+    copy_table_name = table_name + "_copy"
+    # full & incremental extraction w/ 10 new rows
+    db_ext.table2csv(table_name=table_name, file_name=copy_table_name, watermark_column="id", full_refresh=True)
+    db_ext.run_query("INSERT INTO %s SELECT id + 1000, name FROM %s WHERE id <= 10;" % (quoted_table_name, quoted_table_name))
+    delta_file_path = db_ext.table2csv(table_name=table_name, file_name=copy_table_name, watermark_column="id")
+    assert delta_file_path == str(tmp_path / (copy_table_name + ".delta-00001.csv"))
+    # partitioned dataset
+    dataset_dir_path = db_ext.table2other(
+        table_name=mock_psql_table_names[0],
+        file_type=".parquet",
+        partition_by=db_ext.get_columns(mock_psql_table_names[0])[0]
+    )
+    try:
+        # load directory
+        with caplog.at_level(logging.WARNING, logger="db2fs"):
+            table_rows = db_ext.dir2db()
+        # assert base file & delta are loaded into one table
+        assert table_rows == {copy_table_name: 1010}
+        cursor = db_ext.run_query("SELECT COUNT(*) FROM " + db_ext.quote_identifier(copy_table_name))
+        assert cursor.fetchone()[0] == 1010
+        # assert the dataset is skipped w/ a warning
+        assert any(dataset_dir_path in record.getMessage() for record in caplog.records)
+    finally:
+        # drop loaded table (other tests count tables)
+        db_ext.run_query("DROP TABLE IF EXISTS %s;" % db_ext.quote_identifier(copy_table_name))
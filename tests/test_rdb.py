@@ -2,11 +2,15 @@
 import os
 # testing
 import pytest
+# parquet
+import pyarrow as pa
+import pyarrow.parquet as pq
 # dbapis
 import psycopg2
 import pymysql
 # classes being tested
-from db2fs.connectors.rdb import without, RDBConnector, RDBMiddleware
+import db2fs.connectors.rdb as rdb
+from db2fs.connectors.rdb import without, get_arrow_type, RDBConnector, RDBMiddleware
 
 
 def test_without_valid_key():
@@ -20,6 +24,18 @@ def test_without_valid_key():
     assert rm_key not in list(new_dict.keys())
 
 
+def test_get_arrow_type():
+    # numeric columns are coerced
+    assert str(get_arrow_type("REAL")) == "double"
+    assert str(get_arrow_type("bigint")) == "int64"
+    # text columns stay text
+    assert str(get_arrow_type("TEXT")) == "string"
+    # size / precision is ignored
+    assert str(get_arrow_type("FLOAT(24)")) == "double"
+    # unknown types are inferred
+    assert get_arrow_type("NUMERIC(10, 2)") is None
+
+
 def test_without_invalid_key():
     # test dict
     test_dict = {"a": 1, "b": 2}
@@ -277,6 +293,36 @@ def test_rdbmiddleware_execute_invalid_query_mysql(mock_mysql_dsn):
         conn, cursor = rdb_middleware.execute_query(info_sql_stmt)
 
 
+def test_rdbmiddleware_run_query_psql(mock_psql_dsn):
+    # init middleware
+    rdb_middleware = RDBMiddleware(connection_info=mock_psql_dsn)
+    # execute query on a pooled connection
+    cursor = rdb_middleware.run_query("SELECT 1;")
+    # assert results are buffered in the cursor
+    assert [tuple(row) for row in cursor.fetchall()] == [(1,)]
+    # deprecated api still returns (conn, cursor)
+    with pytest.deprecated_call():
+        conn, cursor = rdb_middleware.execute_query("SELECT 1;")
+    # assert conn isn't handed out by the pool
+    with rdb_middleware.checkout() as pooled_conn:
+        assert conn is not pooled_conn
+    conn.close()
+
+def test_rdbmiddleware_run_query_mysql(mock_mysql_dsn):
+    # init middleware
+    rdb_middleware = RDBMiddleware(connection_info=mock_mysql_dsn)
+    # execute query on a pooled connection
+    cursor = rdb_middleware.run_query("SELECT 1;")
+    # assert results are buffered in the cursor
+    assert [tuple(row) for row in cursor.fetchall()] == [(1,)]
+    # deprecated api still returns (conn, cursor)
+    with pytest.deprecated_call():
+        conn, cursor = rdb_middleware.execute_query("SELECT 1;")
+    # assert conn isn't handed out by the pool
+    with rdb_middleware.checkout() as pooled_conn:
+        assert conn is not pooled_conn
+    conn.close()
+
 def test_rdbmiddleware_create_table_psql(mock_psql_dsn, test_table_name, test_database_metadata):
     # init middleware
     rdb_middleware = RDBMiddleware(connection_info=mock_psql_dsn)
@@ -349,3 +395,247 @@ def test_rdbmiddleware_populate_table_invalid_file(mock_psql_dsn, test_dir, test
         # execute query w/ middleware
         conn, cursor = rdb_middleware.populate_table(fake_filepath, "unknown.csv", test_database_metadata)
 
+
+
+def test_rdbmiddleware_get_table_sizes_psql(mock_psql_dsn, mock_psql_table_names):
+    # init middleware
+    rdb_middleware = RDBMiddleware(connection_info=mock_psql_dsn)
+    # get estimated table sizes
+    table_sizes = rdb_middleware.get_table_sizes()
+    # assert every table has a (rows, bytes) estimate
+    assert all(table_name in table_sizes for table_name in mock_psql_table_names)
+    assert all(num_rows >= 0 and num_bytes >= 0 for num_rows, num_bytes in table_sizes.values())
+
+
+def test_rdbmiddleware_get_table_sizes_mysql(mock_mysql_dsn, mock_mysql_table_names):
+    # init middleware
+    rdb_middleware = RDBMiddleware(connection_info=mock_mysql_dsn)
+    # get estimated table sizes
+    table_sizes = rdb_middleware.get_table_sizes()
+    # assert every table has a (rows, bytes) estimate
+    assert all(table_name in table_sizes for table_name in mock_mysql_table_names)
+    assert all(num_rows >= 0 and num_bytes >= 0 for num_rows, num_bytes in table_sizes.values())
+
+
+def test_rdbmiddleware_get_columns_psql(mock_psql_dsn, mock_psql_table_names):
+    # init middleware
+    rdb_middleware = RDBMiddleware(connection_info=mock_psql_dsn)
+    # get columns from catalog
+    columns = rdb_middleware.get_columns(mock_psql_table_names[0])
+    # assert columns match a select *
+    cursor = rdb_middleware.run_query(
+        "SELECT * FROM %s LIMIT 0" % rdb_middleware.quote_identifier(mock_psql_table_names[0])
+    )
+    assert columns == [column[0] for column in cursor.description]
+    # unknown tables have no columns
+    assert rdb_middleware.get_columns("no_such_table") == []
+
+
+def test_rdbmiddleware_get_columns_mysql(mock_mysql_dsn, mock_mysql_table_names):
+    # init middleware
+    rdb_middleware = RDBMiddleware(connection_info=mock_mysql_dsn)
+    # get columns from catalog
+    columns = rdb_middleware.get_columns(mock_mysql_table_names[0])
+    # assert columns match a select *
+    cursor = rdb_middleware.run_query(
+        "SELECT * FROM %s LIMIT 0" % rdb_middleware.quote_identifier(mock_mysql_table_names[0])
+    )
+    assert columns == [column[0] for column in cursor.description]
+    # unknown tables have no columns
+    assert rdb_middleware.get_columns("no_such_table") == []
+
+
+def test_rdbmiddleware_checkout_psql(mock_psql_dsn):
+    # init middlewares
+    rdb_middleware = RDBMiddleware(connection_info=mock_psql_dsn)
+    other_rdb_middleware = RDBMiddleware(connection_info=mock_psql_dsn)
+    # check out a connection & hand it back
+    with rdb_middleware.checkout() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1;")
+    # assert connection is reused by middlewares of the same db
+    with other_rdb_middleware.checkout() as other_conn:
+        assert other_conn is conn
+
+
+def test_rdbmiddleware_checkout_mysql(mock_mysql_dsn):
+    # init middlewares
+    rdb_middleware = RDBMiddleware(connection_info=mock_mysql_dsn)
+    other_rdb_middleware = RDBMiddleware(connection_info=mock_mysql_dsn)
+    # check out a connection & hand it back
+    with rdb_middleware.checkout() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1;")
+    # assert connection is reused by middlewares of the same db
+    with other_rdb_middleware.checkout() as other_conn:
+        assert other_conn is conn
+
+
+def test_rdbmiddleware_populate_table_psql(mock_psql_dsn, tmp_path, test_database_metadata):
+    # init middleware
+    rdb_middleware = RDBMiddleware(connection_info=mock_psql_dsn)
+    # csv file (last row doesn't match metadata)
+    file_path = tmp_path.joinpath("bulk_table.csv")
+    file_path.write_text("col_1,col_2\n1.5,a\n2,b\n3,c\n4\n")
+    # create table
+    rdb_middleware.create_table("bulk_table_psql", test_database_metadata)
+    # load file in batches (committing every 2 rows)
+    num_rows = rdb_middleware.populate_table(str(file_path), "bulk_table_psql", test_database_metadata, batch_size=2, commit_every=2)
+    # assert matching rows are loaded
+    assert num_rows == 3
+    cursor = rdb_middleware.run_query("SELECT COUNT(*) FROM " + rdb_middleware.quote_identifier("bulk_table_psql"))
+    assert cursor.fetchone()[0] == 3
+
+
+def test_rdbmiddleware_read_csv_batches_old_pyarrow(mock_psql_dsn, tmp_path, test_database_metadata, monkeypatch):
+    # pyarrow w/o invalid_row_handler
+    monkeypatch.setattr(rdb, "CSV_INVALID_ROW_HANDLER", False)
+    # init middleware
+    rdb_middleware = RDBMiddleware(connection_info=mock_psql_dsn)
+    # csv file (quoted newline, short row)
+    file_path = tmp_path.joinpath("typed_table.csv")
+    file_path.write_text('col_1,col_2\n1.5,"a\nb"\n4\n2,c\n')
+    # read file
+    batches = list(rdb_middleware.read_csv_batches(str(file_path), "typed_table", test_database_metadata))
+    # assert short row is skipped & columns are coerced
+    assert [row for batch in batches for row in zip(*(column.to_pylist() for column in batch.columns))] == [(1.5, "a\nb"), (2.0, "c")]
+
+def test_rdbmiddleware_populate_table_mysql(mock_mysql_dsn, tmp_path, test_database_metadata):
+    # init middleware
+    rdb_middleware = RDBMiddleware(connection_info=mock_mysql_dsn)
+    # csv file (last row doesn't match metadata)
+    file_path = tmp_path.joinpath("bulk_table.csv")
+    file_path.write_text("col_1,col_2\n1.5,a\n2,b\n3,c\n4\n")
+    # create table
+    rdb_middleware.create_table("bulk_table_mysql", test_database_metadata)
+    # load file in batches (committing every 2 rows)
+    num_rows = rdb_middleware.populate_table(str(file_path), "bulk_table_mysql", test_database_metadata, batch_size=2, commit_every=2)
+    # assert matching rows are loaded
+    assert num_rows == 3
+    cursor = rdb_middleware.run_query("SELECT COUNT(*) FROM " + rdb_middleware.quote_identifier("bulk_table_mysql"))
+    assert cursor.fetchone()[0] == 3
+
+
+
+def test_rdbmiddleware_read_csv_batches(mock_psql_dsn, tmp_path, test_database_metadata):
+    # init middleware
+    rdb_middleware = RDBMiddleware(connection_info=mock_psql_dsn)
+    # csv file (numbers in text column, quoted values, short row)
+    file_path = tmp_path.joinpath("typed_table.csv")
+    file_path.write_text('col_1,col_2\n1.5,007\n2,"say ""hi"""\n,\n4\n')
+    # read file in batches of 2 rows
+    batches = list(rdb_middleware.read_csv_batches(str(file_path), "typed_table", test_database_metadata, batch_size=2))
+    # assert matching rows are read
+    assert [batch.num_rows for batch in batches] == [2, 1]
+    # assert columns are coerced to metadata types
+    assert [value for batch in batches for value in batch.column(0).to_pylist()] == [1.5, 2.0, None]
+    assert [value for batch in batches for value in batch.column(1).to_pylist()] == ["007", "say \"hi\"", ""]
+
+
+def test_rdbmiddleware_populate_table_parallel_psql(mock_psql_dsn, tmp_path, test_database_metadata):
+    # init middleware
+    rdb_middleware = RDBMiddleware(connection_info=mock_psql_dsn)
+    # csv file (newlines in quoted values)
+    file_path = tmp_path.joinpath("parallel_table.csv")
+    file_path.write_text("col_1,col_2\n" + "".join('%s,"a\nb"\n' % row_index for row_index in range(1000)))
+    # create table
+    rdb_middleware.create_table("parallel_table_psql", test_database_metadata)
+    # load file over 4 connections (through a staging table)
+    num_rows = rdb_middleware.populate_table(str(file_path), "parallel_table_psql", test_database_metadata, workers=4, staging=True)
+    # assert all rows are loaded once
+    assert num_rows == 1000
+    cursor = rdb_middleware.run_query("SELECT COUNT(*), SUM(col_1) FROM " + rdb_middleware.quote_identifier("parallel_table_psql"))
+    assert tuple(cursor.fetchone()) == (1000, sum(range(1000)))
+    # assert staging table is dropped
+    assert not [table_name for table_name in rdb_middleware.get_tables() if "staging" in table_name]
+
+
+def test_rdbmiddleware_populate_table_parallel_mysql(mock_mysql_dsn, tmp_path, test_database_metadata):
+    # init middleware
+    rdb_middleware = RDBMiddleware(connection_info=mock_mysql_dsn)
+    # csv file (newlines in quoted values)
+    file_path = tmp_path.joinpath("parallel_table.csv")
+    file_path.write_text("col_1,col_2\n" + "".join('%s,"a\nb"\n' % row_index for row_index in range(1000)))
+    # create table
+    rdb_middleware.create_table("parallel_table_mysql", test_database_metadata)
+    # load file over 4 connections (through a staging table)
+    num_rows = rdb_middleware.populate_table(str(file_path), "parallel_table_mysql", test_database_metadata, workers=4, staging=True)
+    # assert all rows are loaded once
+    assert num_rows == 1000
+    cursor = rdb_middleware.run_query("SELECT COUNT(*), SUM(col_1) FROM " + rdb_middleware.quote_identifier("parallel_table_mysql"))
+    assert tuple(cursor.fetchone()) == (1000, sum(range(1000)))
+    # assert staging table is dropped
+    assert not [table_name for table_name in rdb_middleware.get_tables() if "staging" in table_name]
+
+
+def test_rdbmiddleware_populate_table_parquet_psql(mock_psql_dsn, tmp_path):
+    # init middleware
+    rdb_middleware = RDBMiddleware(connection_info=mock_psql_dsn)
+    # parquet file (2 row groups)
+    file_path = tmp_path.joinpath("parquet_table.parquet")
+    pq.write_table(
+        pa.table({"id": pa.array([1, 2, None], pa.int32()), "name": ["a", None, "c"], "score": [0.1, 2.5, None]}),
+        str(file_path),
+        row_group_size=2
+    )
+    # assert exact column types are inferred
+    metadata = rdb_middleware.infer_metadata(str(file_path))
+    assert [val for key, val in metadata] == [
+        rdb_middleware.mappings["arrow:int32"],
+        rdb_middleware.mappings["arrow:string"],
+        rdb_middleware.mappings["arrow:double"]
+    ]
+    # create table from file & load it
+    num_rows = rdb_middleware.populate_table(str(file_path), "parquet_table_psql")
+    # assert values are loaded unchanged
+    assert num_rows == 3
+    cursor = rdb_middleware.run_query("SELECT * FROM " + rdb_middleware.quote_identifier("parquet_table_psql"))
+    assert set(tuple(row) for row in cursor.fetchall()) == {(1, "a", 0.1), (2, None, 2.5), (None, "c", None)}
+
+
+def test_rdbmiddleware_populate_table_parquet_mysql(mock_mysql_dsn, tmp_path):
+    # init middleware
+    rdb_middleware = RDBMiddleware(connection_info=mock_mysql_dsn)
+    # parquet file (2 row groups)
+    file_path = tmp_path.joinpath("parquet_table.parquet")
+    pq.write_table(
+        pa.table({"id": pa.array([1, 2, None], pa.int32()), "name": ["a", None, "c"], "score": [0.1, 2.5, None]}),
+        str(file_path),
+        row_group_size=2
+    )
+    # assert exact column types are inferred
+    metadata = rdb_middleware.infer_metadata(str(file_path))
+    assert [val for key, val in metadata] == [
+        rdb_middleware.mappings["arrow:int32"],
+        rdb_middleware.mappings["arrow:string"],
+        rdb_middleware.mappings["arrow:double"]
+    ]
+    # create table from file & load it
+    num_rows = rdb_middleware.populate_table(str(file_path), "parquet_table_mysql")
+    # assert values are loaded unchanged
+    assert num_rows == 3
+    cursor = rdb_middleware.run_query("SELECT * FROM " + rdb_middleware.quote_identifier("parquet_table_mysql"))
+    assert set(tuple(row) for row in cursor.fetchall()) == {(1, "a", 0.1), (2, None, 2.5), (None, "c", None)}
+
+
+
+def test_rdbmiddleware_pool_timeout_psql(mock_psql_dsn):
+    # single connection pool w/o waiting
+    pool_options = {"max_size": 1, "timeout": 0}
+    rdb_middleware = RDBMiddleware(connection_info=mock_psql_dsn, pool_options=pool_options)
+    # hold the only connection
+    with rdb_middleware.checkout():
+        other_rdb_middleware = RDBMiddleware(connection_info=mock_psql_dsn, pool_options=pool_options)
+    # assert checkout timeout is handled
+    assert not other_rdb_middleware.rdb_connected
+
+
+def test_rdbmiddleware_pool_timeout_mysql(mock_mysql_dsn):
+    # single connection pool w/o waiting
+    pool_options = {"max_size": 1, "timeout": 0}
+    rdb_middleware = RDBMiddleware(connection_info=mock_mysql_dsn, pool_options=pool_options)
+    # hold the only connection
+    with rdb_middleware.checkout():
+        other_rdb_middleware = RDBMiddleware(connection_info=mock_mysql_dsn, pool_options=pool_options)
+    # assert checkout timeout is handled
+    assert not other_rdb_middleware.rdb_connected
@@ -0,0 +1,52 @@
+# classes being tested
+from db2fs.rolling import RollingFileWriter
+
+
+def test_rolling_file_writer_rows(tmp_path):
+    # part naming
+    def get_part_path(part_index):
+        return str(tmp_path.joinpath("table.part-%05d.csv" % part_index))
+    # finished parts
+    finished = []
+    # write header & 5 rows, 2 rows per part
+    with RollingFileWriter(get_part_path, max_rows=2, header=True, on_part_complete=lambda *part: finished.append(part)) as out_file:
+        out_file.write(b"id\n")
+        for row_index in range(5):
+            out_file.write(b"%d\n" % row_index)
+    # assert rows are spread over 3 parts
+    assert [part["rows"] for part in out_file.parts] == [2, 2, 1]
+    assert [part[1] for part in finished] == [2, 2, 1]
+    # assert every part starts with the header
+    with open(get_part_path(1), "rb") as in_file:
+        assert in_file.read() == b"id\n2\n3\n"
+    # no temp files left behind
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_rolling_file_writer_empty(tmp_path):
+    # part naming
+    def get_part_path(part_index):
+        return str(tmp_path.joinpath("table.part-%05d.csv" % part_index))
+    # only a header is written
+    with RollingFileWriter(get_part_path, max_bytes=10, header=True) as out_file:
+        out_file.write(b"id\n")
+    # assert an empty result still gives one part
+    assert len(out_file.parts) == 1
+    with open(get_part_path(0), "rb") as in_file:
+        assert in_file.read() == b"id\n"
+
+
+def test_rolling_file_writer_abort(tmp_path):
+    # part naming
+    def get_part_path(part_index):
+        return str(tmp_path.joinpath("table.part-%05d.csv" % part_index))
+    # fail halfway through the second part
+    try:
+        with RollingFileWriter(get_part_path, max_rows=1) as out_file:
+            out_file.write(b"0\n")
+            out_file.write(b"1\n")
+            raise RuntimeError("extraction failed")
+    except RuntimeError:
+        pass
+    # assert finished parts are kept & the unfinished one removed
+    assert [path.name for path in tmp_path.iterdir()] == ["table.part-00000.csv"]
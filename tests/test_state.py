@@ -0,0 +1,16 @@
+# classes being tested
+from db2fs.state import StateStore
+
+
+def test_state_store_roundtrip(tmp_path):
+    # state file
+    file_path = str(tmp_path.joinpath("state.json"))
+    # nothing recorded yet
+    state_store = StateStore(file_path)
+    assert state_store.get("table") is None
+    # record state
+    state_store.set("table", {"column": "id", "watermark": 10, "deltas": 0})
+    # state is read back by a new store
+    assert StateStore(file_path).get("table") == {"column": "id", "watermark": 10, "deltas": 0}
+    # no temp file left behind
+    assert not tmp_path.joinpath("state.json.tmp").exists()
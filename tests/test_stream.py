@@ -0,0 +1,106 @@
+# testing
+import pytest
+# buffered writes
+import io
+# classes being tested
+from db2fs.connectors.stream import UploadStream
+
+
+class MemoryUploadStream(UploadStream):
+    """
+        upload stream keeping uploaded parts in memory
+    """
+    def __init__(self, part_size, fail_part=None):
+        super().__init__(part_size=part_size, max_in_flight=2)
+        # uploaded object
+        self.data = None
+        self.num_parts = 0
+        self.aborted = False
+        # part upload raising an error
+        self.fail_part = fail_part
+
+    def upload_whole(self, data):
+        self.data = data
+
+    def start_upload(self):
+        pass
+
+    def upload_part(self, part_number, offset, data, last):
+        if part_number == self.fail_part:
+            raise IOError("upload failed")
+        return data
+
+    def complete_upload(self, parts):
+        self.data = b"".join(parts)
+        self.num_parts = len(parts)
+
+    def abort_upload(self):
+        self.aborted = True
+
+
+def test_upload_stream_parts():
+    # write 10 bytes in 4 byte parts
+    with MemoryUploadStream(part_size=4) as upload_stream:
+        for value in range(10):
+            upload_stream.write(b"%d" % value)
+    # assert parts are assembled in order
+    assert upload_stream.data == b"0123456789"
+    assert upload_stream.num_parts == 3
+
+
+def test_upload_stream_write_size():
+    # writes smaller & larger than a part
+    with MemoryUploadStream(part_size=4) as upload_stream:
+        # assert number of bytes passed in is returned
+        assert upload_stream.write(b"def") == 3
+        assert upload_stream.write(b"0123456789") == 10
+    # assert uploaded object
+    assert upload_stream.data == b"def0123456789"
+
+
+def test_upload_stream_buffered_writer():
+    # buffered writer relies on write returning the bytes taken
+    upload_stream = MemoryUploadStream(part_size=4)
+    with io.BufferedWriter(upload_stream, buffer_size=2) as buffered_stream:
+        buffered_stream.write(b"0123456789")
+    # assert uploaded object
+    assert upload_stream.data == b"0123456789"
+
+
+def test_upload_stream_small():
+    # object smaller than a part
+    with MemoryUploadStream(part_size=4) as upload_stream:
+        upload_stream.write(b"01")
+    # assert object is uploaded in one request
+    assert upload_stream.data == b"01"
+    assert upload_stream.num_parts == 0
+
+
+def test_upload_stream_abort():
+    # failing part upload
+    upload_stream = MemoryUploadStream(part_size=4, fail_part=2)
+    with pytest.raises(IOError):
+        with upload_stream:
+            upload_stream.write(b"0123456789")
+    # assert nothing is published
+    assert upload_stream.data is None
+    assert upload_stream.aborted
+
+
+def test_upload_stream_part_size_growth():
+    # store allowing 10 parts (part size doubles every part)
+    upload_stream = MemoryUploadStream(part_size=4)
+    upload_stream.max_parts = 10
+    upload_stream.max_part_size = 16
+    with upload_stream:
+        upload_stream.write(b"x" * 100)
+    # assert parts grow up to max_part_size & stay under the limit
+    assert upload_stream.data == b"x" * 100
+    assert upload_stream.part_size == 16
+    assert upload_stream.num_parts <= 10
+
+
+def test_upload_stream_abstract():
+    # upload methods have to be implemented
+    with pytest.raises(TypeError):
+        UploadStream(part_size=4)
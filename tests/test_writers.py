@@ -0,0 +1,102 @@
+# io
+import io
+# types
+import datetime
+import decimal
+# classes being tested
+from db2fs.writers import format_csv_value, format_float, CSVBatchWriter
+
+
+def test_format_csv_value_null_vs_empty():
+    # NULL is an empty field
+    assert format_csv_value(None) == ""
+    # empty string is quoted
+    assert format_csv_value("") == '""'
+
+
+def test_format_csv_value_quoting():
+    # delimiter, quotes & line breaks are quoted
+    assert format_csv_value("a,b") == '"a,b"'
+    assert format_csv_value('say "hi"') == '"say ""hi"""'
+    assert format_csv_value("multi\nline") == '"multi\nline"'
+    # plain text isn't
+    assert format_csv_value("plain") == "plain"
+
+
+def test_format_csv_value_types():
+    # postgres style formatting
+    assert format_csv_value(True) == "t"
+    assert format_csv_value(decimal.Decimal("1.50")) == "1.50"
+    assert format_csv_value(datetime.datetime(2020, 1, 2, 3, 4, 5, 500000)) == "2020-01-02 03:04:05.5"
+    assert format_csv_value(datetime.date(2020, 1, 2)) == "2020-01-02"
+    assert format_csv_value(datetime.timedelta(hours=-2)) == "-02:00:00"
+    assert format_csv_value(b"\x01\x02") == "\\x0102"
+
+
+def test_format_float():
+    # integral floats have no trailing .0
+    assert format_float(2.0) == "2"
+    assert format_float(2.25) == "2.25"
+    # exponent notation from 1e15
+    assert format_float(1e15) == "1e+15"
+    assert format_float(1e-05) == "1e-05"
+    # special values
+    assert format_float(float("nan")) == "NaN"
+    assert format_float(float("-inf")) == "-Infinity"
+
+
+def test_csv_batch_writer():
+    # in memory file
+    out_file = io.StringIO()
+    # init writer with header
+    csv_writer = CSVBatchWriter(out_file, columns=["id", "name"])
+    # write two batches
+    csv_writer.write_rows([(1, "a"), (2, None)])
+    csv_writer.write_rows([(3, "")])
+    # assert output
+    assert out_file.getvalue() == 'id,name\n1,a\n2,\n3,""\n'
+    assert csv_writer.num_rows == 3
+
+
+def test_parquet_batch_writer(tmp_path):
+    # parquet reader
+    import pyarrow.parquet as pq
+    from db2fs.writers import ArrowBatchConverter, ParquetBatchWriter
+    # postgres description (name, oid, ...) of an int4 & unmapped column
+    description = [("id", 23, None, 4, None, None, None), ("tags", 1009, None, -1, None, None, None)]
+    # init writer (tiny row groups)
+    local_file_path = str(tmp_path.joinpath("test.parquet"))
+    parquet_writer = ParquetBatchWriter(
+        local_file_path,
+        ArrowBatchConverter("pg", description),
+        row_group_size=2
+    )
+    # write two batches
+    parquet_writer.write_rows([(1, ["a"]), (2, None)])
+    parquet_writer.write_rows([(3, ["b", "c"])])
+    parquet_writer.close()
+    # assert rows, types & row groups
+    parquet_file = pq.ParquetFile(local_file_path)
+    assert parquet_file.metadata.num_rows == 3
+    assert parquet_file.metadata.num_row_groups == 2
+    assert str(parquet_file.schema_arrow.field("id").type) == "int32"
+    assert parquet_file.read().column("tags").to_pylist() == [["a"], None, ["b", "c"]]
+
+
+def test_ndjson_batch_writer():
+    # json
+    import json
+    from db2fs.writers import NDJSONBatchWriter
+    # in memory binary file
+    out_file = io.BytesIO()
+    # init writer
+    json_writer = NDJSONBatchWriter(out_file, ["id", "ts", "score"])
+    # write batch
+    json_writer.write_rows([
+        (1, datetime.datetime(2020, 1, 2, 3, 4, 5), decimal.Decimal("1.50")),
+        (2, None, float("nan"))
+    ])
+    # one object per line
+    lines = out_file.getvalue().decode("utf-8").splitlines()
+    assert json.loads(lines[0]) == {"id": 1, "ts": "2020-01-02T03:04:05", "score": "1.50"}
+    assert json.loads(lines[1]) == {"id": 2, "ts": None, "score": "NaN"}